@@ -0,0 +1,211 @@
+"""
+In-process API benchmark behind ``manage.py bench``.
+
+``seed`` fills the database with bulk inserts, ``Benchmark`` drives the real
+URLs through the test client with JWT authentication, timing each request
+and counting its queries, and ``compare`` diffs two reports.
+"""
+import random
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from goals.models import Category, Goal, GoalStat
+from reflections.analysis import reanalyze_user
+from reflections.models import Reflection
+from users.authentication import user_cache
+
+PASSWORD = 'bench-password'
+CATEGORY_NAMES = ('Health', 'Learning', 'Work', 'Family', 'Finance', 'Mindfulness', 'Fitness', 'Creativity')
+WORDS = (
+    'morning', 'run', 'river', 'meeting', 'project', 'deadline', 'family', 'dinner', 'walk', 'park',
+    'book', 'chapter', 'guitar', 'practice', 'budget', 'savings', 'sleep', 'tired', 'energy', 'focus',
+    'meditation', 'breathing', 'garden', 'tomatoes', 'friend', 'call', 'travel', 'weekend', 'coffee',
+    'presentation', 'team', 'feedback', 'workout', 'gym', 'stretching', 'journal', 'gratitude', 'stress',
+    'email', 'inbox', 'cooking', 'recipe', 'piano', 'language', 'spanish', 'lesson', 'swim', 'bike',
+    'painting', 'sketch', 'planning', 'goals', 'progress', 'habit', 'streak', 'calm', 'anxious', 'happy',
+)
+
+
+def sentence(rng, length):
+    return ' '.join(rng.choice(WORDS) for _ in range(length))
+
+
+def transcript(rng):
+    return ' '.join(f'{sentence(rng, rng.randint(6, 14)).capitalize()}.' for _ in range(rng.randint(3, 8)))
+
+
+def seed(users, categories=5, goals=50, reflections=30, seed=0):
+    """
+    Create ``users`` users, each with the given number of categories, goals
+    and transcribed reflections, mostly with bulk inserts. The same seed
+    always produces the same data. Returns the users.
+    """
+    rng = random.Random(seed)
+    User = get_user_model()
+    # Hashing is deliberately slow; every user shares one hash.
+    password = make_password(PASSWORD)
+    created = User.objects.bulk_create([
+        User(email=f'bench{index}@example.com', password=password) for index in range(users)
+    ])
+    # bulk_create() skips the signal that drops stale cached users with these ids.
+    for user in created:
+        user_cache.invalidate(user.pk)
+
+    category_objects = Category.objects.bulk_create([
+        Category(user=user, name=f'{CATEGORY_NAMES[index % len(CATEGORY_NAMES)]} {index // len(CATEGORY_NAMES) + 1}')
+        for user in created
+        for index in range(categories)
+    ], batch_size=1000)
+    user_categories = defaultdict(list)
+    for category in category_objects:
+        user_categories[category.user_id].append(category)
+
+    today = timezone.localdate()
+    goal_objects = []
+    for user in created:
+        for _ in range(goals):
+            goal_objects.append(Goal(
+                user=user,
+                title=sentence(rng, rng.randint(2, 5)).capitalize(),
+                description=sentence(rng, rng.randint(0, 20)),
+                status='completed' if rng.random() < 0.4 else 'in_progress',
+                category=rng.choice(user_categories[user.pk]) if user_categories[user.pk] and rng.random() < 0.8 else None,
+                recurring=rng.random() < 0.2,
+                recurrence=rng.choice(Goal.RECURRENCES)[0],
+                target_date=today + timedelta(days=rng.randint(-60, 60)) if rng.random() < 0.7 else None,
+            ))
+    Goal.objects.bulk_create(goal_objects, batch_size=1000)
+    # bulk_create() skips the signals that maintain goal stats.
+    GoalStat.objects.record(added=[goal.stats_key() for goal in goal_objects])
+
+    Reflection.objects.bulk_create([
+        Reflection(user=user, transcription=transcript(rng), status='done', lease_expires_at=None)
+        for user in created
+        for _ in range(reflections)
+    ], batch_size=1000)
+    for user in created:
+        # Terms, keywords, summaries, search index and vectors.
+        reanalyze_user(user)
+    return created
+
+
+class Benchmark:
+    """Runs one session of API calls per iteration, as a randomly picked user."""
+
+    def __init__(self, users, seed=0):
+        self.users = list(users)
+        self.rng = random.Random(seed)
+        self.goal_ids = defaultdict(list)
+        for user_id, pk in Goal.objects.filter(user__in=self.users).values_list('user_id', 'pk'):
+            self.goal_ids[user_id].append(pk)
+        self.category_ids = defaultdict(list)
+        for user_id, pk in Category.objects.filter(user__in=self.users).values_list('user_id', 'pk'):
+            self.category_ids[user_id].append(pk)
+        self.reflection_ids = defaultdict(list)
+        for user_id, pk in Reflection.objects.filter(user__in=self.users).values_list('user_id', 'pk'):
+            self.reflection_ids[user_id].append(pk)
+        self.recording = False
+        self.methods = {}
+        self.timings = defaultdict(list)
+        self.queries = defaultdict(list)
+
+    def request(self, name, client, method, url, data=None):
+        kwargs = {} if method == 'get' else {'format': 'json'}
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(client, method)(url, data, **kwargs)
+            elapsed = time.perf_counter() - start
+        if response.status_code >= 400:
+            raise RuntimeError(f'{name}: {method.upper()} {url} returned {response.status_code}')
+        if self.recording:
+            self.methods[name] = method.upper()
+            self.timings[name].append(elapsed * 1000)
+            self.queries[name].append(len(queries))
+        return response
+
+    def session(self, user):
+        rng = self.rng
+        client = APIClient()
+        tokens = self.request(
+            'users-login', client, 'post', reverse('token_obtain_pair'), {'email': user.email, 'password': PASSWORD}
+        ).data
+        self.request('users-token-refresh', client, 'post', reverse('token_refresh'), {'refresh': tokens['refresh']})
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+
+        categories = self.category_ids[user.pk]
+        goal_id = rng.choice(self.goal_ids[user.pk])
+        reflection_id = rng.choice(self.reflection_ids[user.pk])
+        self.request('categories-list', client, 'get', reverse('category-list'))
+        self.request('goals-list', client, 'get', reverse('goal-list'))
+        self.request('goals-list-expanded', client, 'get', reverse('goal-list'), {'expand': 'category'})
+        self.request('goals-detail', client, 'get', reverse('goal-detail', args=[goal_id]))
+        self.request('goals-stats', client, 'get', reverse('goal-stats'))
+        created = self.request('goals-create', client, 'post', reverse('goal-list'), {
+            'title': sentence(rng, 3).capitalize(),
+            'category': rng.choice(categories) if categories else None,
+        }).data
+        self.goal_ids[user.pk].append(created['id'])
+        self.request('goals-update', client, 'patch', reverse('goal-detail', args=[goal_id]), {
+            'status': rng.choice(Goal.STATUSES)[0],
+        })
+        self.request('reflections-list', client, 'get', reverse('reflection-list'))
+        self.request('reflections-detail', client, 'get', reverse('reflection-detail', args=[reflection_id]))
+        self.request('reflections-search', client, 'get', reverse('reflection-search'), {'q': rng.choice(WORDS)})
+        self.request('reflections-keywords', client, 'get', reverse('reflection-keywords'))
+        self.request('reflections-related', client, 'get', reverse('reflection-related', args=[reflection_id]))
+
+    def run(self, iterations, warmup=0):
+        """Run ``warmup`` unrecorded sessions, then ``iterations`` recorded ones, and return the report."""
+        for index in range(warmup + iterations):
+            self.recording = index >= warmup
+            self.session(self.rng.choice(self.users))
+        return self.report()
+
+    def report(self):
+        endpoints = {}
+        for name, timings in self.timings.items():
+            p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+            endpoints[name] = {
+                'method': self.methods[name],
+                'requests': len(timings),
+                'mean_ms': round(float(np.mean(timings)), 3),
+                'p50_ms': round(float(p50), 3),
+                'p95_ms': round(float(p95), 3),
+                'p99_ms': round(float(p99), 3),
+                'queries': max(self.queries[name]),
+            }
+        return {'database': connection.vendor, 'endpoints': endpoints}
+
+
+def compare(report, baseline, threshold=0.25):
+    """
+    Per-endpoint changes against a baseline report, as fractions of the
+    baseline latency. An endpoint regressed if its median grew by more than
+    ``threshold`` or it runs more queries than before; the tail percentiles
+    are reported but too noisy over a few dozen runs to gate on.
+    """
+    comparison = {}
+    previous_endpoints = baseline.get('endpoints', {})
+    for name, current in report['endpoints'].items():
+        previous = previous_endpoints.get(name)
+        if previous is None:
+            continue
+        change = {
+            f'{metric}_change': round(current[metric] / previous[metric] - 1, 3) if previous[metric] else None
+            for metric in ('p50_ms', 'p95_ms', 'p99_ms')
+        }
+        change['queries_change'] = current['queries'] - previous['queries']
+        change['regressed'] = change['queries_change'] > 0 or (
+            change['p50_ms_change'] is not None and change['p50_ms_change'] > threshold
+        )
+        comparison[name] = change
+    return comparison
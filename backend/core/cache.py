@@ -0,0 +1,72 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+from .metrics import record_cache_lookup
+
+
+def _version_key(user_id, resource):
+    return f'version:{resource}:{user_id}'
+
+
+def get_version(user_id, resource):
+    key = _version_key(user_id, resource)
+    version = cache.get(key)
+    record_cache_lookup(version is not None)
+    if version is None:
+        # Seed from the clock rather than 1 so an evicted counter can never
+        # come back at a number that still has responses cached under it.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key, time.time_ns())
+    return version
+
+
+def bump_version(user_id, resource):
+    key = _version_key(user_id, resource)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+class CachedListMixin:
+    """
+    Serve ``list`` from a per-user cache entry that is invalidated by bumping
+    the resource's version (see ``core.signals``).
+
+    Responses carry a strong ETag derived from the version and the request,
+    so a matching ``If-None-Match`` is answered with 304 after reading only
+    the version counter. Responses embed absolute URLs, so the fingerprint
+    covers the scheme and host as well as the path.
+    """
+    cache_resource = None
+
+    def cache_epoch(self):
+        """
+        Rolls the ETag and cache key over even while nothing changes. Override
+        when responses hold values that expire, such as signed URLs.
+        """
+        return 0
+
+    def list(self, request, *args, **kwargs):
+        version = get_version(request.user.pk, self.cache_resource)
+        fingerprint = hashlib.sha1(
+            f'{request.accepted_media_type}|{self.cache_epoch()}|{request.build_absolute_uri()}'.encode()
+        ).hexdigest()
+        etag = f'"{self.cache_resource}-{request.user.pk}-{version}-{fingerprint[:16]}"'
+        if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        key = f'response:{self.cache_resource}:{request.user.pk}:{version}:{fingerprint}'
+        data = cache.get(key)
+        record_cache_lookup(data is not None)
+        if data is None:
+            response = super().list(request, *args, **kwargs)
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        return response
@@ -0,0 +1,78 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from core.bench import Benchmark, compare, seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the API in-process against a freshly seeded test database and report '
+        'latency percentiles and query counts per endpoint as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--categories', type=int, default=5, help='Per user')
+        parser.add_argument('--goals', type=int, default=50, help='Per user')
+        parser.add_argument('--reflections', type=int, default=30, help='Per user')
+        parser.add_argument('--iterations', type=int, default=30, help='Recorded sessions')
+        parser.add_argument('--warmup', type=int, default=3, help='Unrecorded sessions run first')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the report to this file instead of stdout')
+        parser.add_argument('--baseline', help='A previous report to compare against')
+        parser.add_argument(
+            '--threshold', type=float, default=0.25,
+            help='Relative growth of the median that counts as a regression (default 0.25)'
+        )
+        parser.add_argument(
+            '--fail-on-regression', action='store_true',
+            help='Exit with an error if any endpoint regressed against the baseline'
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['goals'] < 1 or options['reflections'] < 1 or options['iterations'] < 1:
+            raise CommandError('--users, --goals, --reflections and --iterations must be at least 1.')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as fh:
+                baseline = json.load(fh)
+
+        setup_test_environment()
+        # Like the test runner, work on a throwaway database so runs are
+        # reproducible and never touch real data.
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            users = seed(
+                options['users'],
+                categories=options['categories'],
+                goals=options['goals'],
+                reflections=options['reflections'],
+                seed=options['seed'],
+            )
+            report = Benchmark(users, seed=options['seed']).run(options['iterations'], warmup=options['warmup'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report['options'] = {
+            name: options[name]
+            for name in ('users', 'categories', 'goals', 'reflections', 'iterations', 'warmup', 'seed')
+        }
+        regressed = []
+        if baseline is not None:
+            report['comparison'] = compare(report, baseline, threshold=options['threshold'])
+            regressed = [name for name, change in report['comparison'].items() if change['regressed']]
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(output + '\n')
+        else:
+            self.stdout.write(output)
+        if regressed:
+            message = f'Regressed against the baseline: {", ".join(regressed)}'
+            if options['fail_on_regression']:
+                raise CommandError(message)
+            self.stderr.write(self.style.WARNING(message))
@@ -0,0 +1,76 @@
+import json
+
+from django.core.management.base import BaseCommand
+from core.metrics import histogram_quantile, task_registry
+
+
+def summary(values, name):
+    counts = task_registry.bucket_counts(values, name)
+    count = values.get((name, 'count'), 0)
+    if not count:
+        return None
+
+    def seconds(value):
+        return round(value, 3) if value is not None else None
+    return {
+        'count': int(count),
+        'mean_s': seconds(values.get((name, 'sum'), 0) / count),
+        'p50_s': seconds(histogram_quantile(task_registry.buckets, counts, 0.5)),
+        'p95_s': seconds(histogram_quantile(task_registry.buckets, counts, 0.95)),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Report queue wait and run time percentiles, failures and retries per Celery task, '
+        'from the histograms the workers record'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+        parser.add_argument('--reset', action='store_true', help='Clear the recorded totals after reporting')
+
+    def handle(self, *args, **options):
+        report = []
+        for (task, queue), values in sorted(task_registry.series().items()):
+            report.append({
+                'task': task,
+                'queue': queue,
+                'succeeded': int(values.get(('succeeded',), 0)),
+                'failed': int(values.get(('failed',), 0)),
+                'retried': int(values.get(('retried',), 0)),
+                'wait': summary(values, 'wait'),
+                'runtime': summary(values, 'runtime'),
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        elif not report:
+            self.stdout.write('No task runs recorded.')
+        else:
+            self.stdout.write(self.table(report))
+        if options['reset']:
+            task_registry.reset()
+
+    def table(self, report):
+        def cell(stats, key):
+            return '-' if stats is None else f'{stats[key]:.3f}'
+
+        header = (
+            'task', 'queue', 'runs', 'failed', 'retried',
+            'wait p50', 'wait p95', 'wait mean', 'run p50', 'run p95', 'run mean',
+        )
+        rows = [header]
+        for row in report:
+            runs = row['runtime']['count'] if row['runtime'] else 0
+            rows.append((
+                row['task'], row['queue'], str(runs), str(row['failed']), str(row['retried']),
+                cell(row['wait'], 'p50_s'), cell(row['wait'], 'p95_s'), cell(row['wait'], 'mean_s'),
+                cell(row['runtime'], 'p50_s'), cell(row['runtime'], 'p95_s'), cell(row['runtime'], 'mean_s'),
+            ))
+        widths = [max(len(row[index]) for row in rows) for index in range(len(header))]
+        return '\n'.join(
+            '  '.join(value.ljust(width) if index < 2 else value.rjust(width)
+                      for index, (value, width) in enumerate(zip(row, widths)))
+            for row in rows
+        )
@@ -0,0 +1,273 @@
+"""
+Request and task instrumentation, aggregated into the histograms and
+counters behind ``/metrics``.
+
+``RequestMetricsMiddleware`` (see ``core.middleware``) creates a
+``RequestMetrics`` for each request and adds it to ``registry``; the Celery
+signal handlers in ``core.telemetry`` add task timings to ``task_registry``.
+Each process aggregates into a local buffer that is added to a Redis hash
+every ``REQUEST_METRICS_FLUSH_INTERVAL`` seconds, so ``/metrics`` reports
+totals for all processes. Without a Redis cache the local buffer is reported
+as is.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, as in the Prometheus client libraries
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Tasks take from milliseconds to most of an hour
+TASK_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.serialize_seconds = 0.0
+        self.duration = 0.0
+
+    def execute(self, execute, sql, params, many, context):
+        """Run one query for ``record_query``, counting and timing it."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - start
+            self.queries += 1
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;desc="{self.queries} queries";dur={self.db_seconds * 1000:.3f}',
+            f'cache;desc="hits={self.cache_hits} misses={self.cache_misses}"',
+            f'serialize;dur={self.serialize_seconds * 1000:.3f}',
+            f'total;dur={self.duration * 1000:.3f}',
+        ])
+
+
+def record_query(execute, sql, params, many, context):
+    """An execute wrapper, installed on every connection, that reports queries to the current request."""
+    metrics = current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.execute(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def record_cache_lookup(hit):
+    """Count a cache hit or miss against the current request, if any."""
+    metrics = current.get()
+    if metrics is None:
+        return
+    if hit:
+        metrics.cache_hits += 1
+    else:
+        metrics.cache_misses += 1
+
+
+def _number(value):
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+def _redis():
+    try:
+        return get_redis_connection('default')
+    except NotImplementedError:
+        # Not a django-redis cache.
+        return None
+
+
+def histogram_quantile(buckets, counts, quantile):
+    """
+    Estimate a quantile from per-bucket counts (one more than ``buckets``, the
+    last for values above every bound) by interpolating within the bucket, as
+    Prometheus does. Returns None for an empty histogram.
+    """
+    total = sum(counts)
+    if not total:
+        return None
+    rank = quantile * total
+    seen = 0
+    lower = 0.0
+    for bound, count in zip(buckets, counts):
+        if count and seen + count >= rank:
+            return lower + (bound - lower) * (rank - seen) / count
+        seen += count
+        lower = bound
+    return buckets[-1]
+
+
+class Registry:
+    """
+    Histograms and counters sharing one set of labels. Values are kept as
+    flat fields, ``<labels...>\\t<name>`` for counters and ``\\tbucket<i>``,
+    ``\\tcount`` and ``\\tsum`` below a histogram's name, in the Redis hash
+    ``key``.
+    """
+
+    def __init__(self, key, labels, buckets, histograms, counters, flush_interval=None):
+        self.key = key
+        self.labels = labels
+        self.buckets = buckets
+        # {name: (Prometheus metric, help text)}
+        self.histograms = histograms
+        self.counters = counters
+        # None follows REQUEST_METRICS_FLUSH_INTERVAL
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.pending = defaultdict(float)
+        self.last_flush = time.monotonic()
+
+    def observe(self, labels, histograms=None, counters=None):
+        prefix = '\t'.join(str(label) for label in labels)
+        interval = settings.REQUEST_METRICS_FLUSH_INTERVAL if self.flush_interval is None else self.flush_interval
+        with self.lock:
+            pending = self.pending
+            for name, value in (histograms or {}).items():
+                bucket = next((index for index, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+                pending[f'{prefix}\t{name}\tbucket{bucket}'] += 1
+                pending[f'{prefix}\t{name}\tcount'] += 1
+                pending[f'{prefix}\t{name}\tsum'] += value
+            for name, value in (counters or {}).items():
+                pending[f'{prefix}\t{name}'] += value
+            due = time.monotonic() - self.last_flush >= interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Add this process's buffered counts to the shared totals in Redis."""
+        redis = _redis()
+        with self.lock:
+            self.last_flush = time.monotonic()
+            if redis is None or not self.pending:
+                return
+            pending, self.pending = self.pending, defaultdict(float)
+        try:
+            pipeline = redis.pipeline(transaction=False)
+            for field, value in pending.items():
+                pipeline.hincrbyfloat(self.key, field, value)
+            pipeline.execute()
+        except RedisError as exc:
+            logger.warning('Could not flush %s: %s', self.key, exc)
+            with self.lock:
+                for field, value in pending.items():
+                    self.pending[field] += value
+
+    def totals(self):
+        self.flush()
+        totals = defaultdict(float)
+        redis = _redis()
+        if redis is not None:
+            try:
+                for field, value in redis.hgetall(self.key).items():
+                    totals[field.decode()] += float(value)
+            except RedisError as exc:
+                logger.warning('Could not read %s: %s', self.key, exc)
+        with self.lock:
+            for field, value in self.pending.items():
+                totals[field] += value
+        return totals
+
+    def reset(self):
+        """Drop the shared totals and this process's buffer."""
+        with self.lock:
+            self.pending = defaultdict(float)
+        redis = _redis()
+        if redis is not None:
+            redis.delete(self.key)
+
+    def series(self):
+        """``{labels: {field: value}}``, with each field a tuple such as ``('runtime', 'count')``."""
+        series = defaultdict(dict)
+        for field, value in self.totals().items():
+            parts = field.split('\t')
+            series[tuple(parts[:len(self.labels)])][tuple(parts[len(self.labels):])] = value
+        return series
+
+    def bucket_counts(self, values, name):
+        """Non-cumulative counts of a histogram's buckets, the last one above every bound."""
+        return [values.get((name, f'bucket{index}'), 0) for index in range(len(self.buckets) + 1)]
+
+    def render(self):
+        """All series in the Prometheus text exposition format."""
+        series = self.series()
+
+        def label_text(labels, **extra):
+            pairs = {**dict(zip(self.labels, labels)), **extra}
+            return ','.join(f'{key}="{value}"' for key, value in pairs.items())
+
+        lines = []
+        for name, (metric, help_text) in self.histograms.items():
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} histogram')
+            for labels in sorted(series):
+                values = series[labels]
+                if (name, 'count') not in values:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets, self.bucket_counts(values, name)):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{{label_text(labels, le=bound)}}} {_number(cumulative)}')
+                count = _number(values[(name, 'count')])
+                lines.append(f'{metric}_bucket{{{label_text(labels, le="+Inf")}}} {count}')
+                lines.append(f'{metric}_sum{{{label_text(labels)}}} {_number(values.get((name, "sum"), 0))}')
+                lines.append(f'{metric}_count{{{label_text(labels)}}} {count}')
+        for name, (metric, help_text) in self.counters.items():
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} counter')
+            for labels in sorted(series):
+                lines.append(f'{metric}{{{label_text(labels)}}} {_number(series[labels].get((name,), 0))}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry(
+    'metrics:http',
+    labels=('method', 'view', 'status'),
+    buckets=HTTP_BUCKETS,
+    histograms={
+        'duration': ('http_request_duration_seconds', 'Time to handle requests, by view.'),
+    },
+    counters={
+        'queries': ('http_request_db_queries_total', 'Database queries run while handling requests.'),
+        'db_seconds': ('http_request_db_duration_seconds_total', 'Time spent in database queries.'),
+        'cache_hits': ('http_request_cache_hits_total', 'Cache lookups that found an entry.'),
+        'cache_misses': ('http_request_cache_misses_total', 'Cache lookups that found nothing.'),
+        'serialize_seconds': ('http_request_serialize_duration_seconds_total', 'Time spent rendering response bodies.'),
+    },
+)
+
+# A worker finishes few tasks per second, so each one is flushed right away.
+task_registry = Registry(
+    'metrics:tasks',
+    labels=('task', 'queue'),
+    buckets=TASK_BUCKETS,
+    histograms={
+        'wait': ('celery_task_queue_wait_seconds', 'Time tasks spent in the broker before a worker started them.'),
+        'runtime': ('celery_task_runtime_seconds', 'Time tasks took to run.'),
+    },
+    counters={
+        'succeeded': ('celery_task_succeeded_total', 'Tasks that finished successfully.'),
+        'failed': ('celery_task_failed_total', 'Tasks that raised an exception.'),
+        'retried': ('celery_task_retried_total', 'Tasks that asked to be retried.'),
+    },
+    flush_interval=0,
+)
@@ -0,0 +1,78 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from .metrics import RequestMetrics, current, registry
+
+
+class RequestMetricsMiddleware:
+    """
+    Count database queries and time, cache hits and misses and response
+    rendering time for each request. Reports them in a ``Server-Timing``
+    header and adds the request to the per-view histograms behind ``/metrics``.
+
+    Works in both sync and async stacks. Queries are counted by
+    ``core.metrics.record_query``, installed on every connection, through a
+    context variable that also reaches sync views run in a thread under ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    def finish(self, request, response, metrics, start):
+        metrics.duration = time.perf_counter() - start
+        match = getattr(request, 'resolver_match', None)
+        # Unmatched paths share one label so scanners cannot blow up the series count.
+        view = match.view_name if match is not None else 'unmatched'
+        registry.observe(
+            (request.method, view, response.status_code),
+            histograms={'duration': metrics.duration},
+            counters={
+                'queries': metrics.queries,
+                'db_seconds': metrics.db_seconds,
+                'cache_hits': metrics.cache_hits,
+                'cache_misses': metrics.cache_misses,
+                'serialize_seconds': metrics.serialize_seconds,
+            },
+        )
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = metrics.server_timing()
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that step.
+        metrics = current.get()
+        if metrics is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                metrics.serialize_seconds += time.perf_counter() - start
+            response.add_post_render_callback(rendered)
+        return response
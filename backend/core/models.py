@@ -0,0 +1,24 @@
+from django.db import models
+from django.conf import settings
+
+
+class Tombstone(models.Model):
+    """Records a deleted row so /api/sync/ can tell clients to drop it."""
+    RESOURCES = [
+        ('categories', 'Categories'),
+        ('goals', 'Goals'),
+        ('reflections', 'Reflections'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    resource = models.CharField(max_length=20, choices=RESOURCES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at', 'id'], name='tombstone_user_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"Deleted {self.resource} #{self.object_id}"
@@ -14,6 +14,8 @@ import os
 from datetime import timedelta
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -31,6 +33,11 @@ ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost,127.0.0.1').sp
 
 CORS_ALLOWED_ORIGINS = os.environ.get('CORS_ALLOWED_ORIGINS', 'http://localhost:3000').split(',')
 CORS_ALLOW_CREDENTIALS = True
+# Resumable uploads send their position and chunk digest in tus-style headers
+# and read the position back; the waveform layout of /peaks/ also comes back
+# in headers the frontend has to read.
+CORS_ALLOW_HEADERS = (*default_headers, 'upload-offset', 'upload-checksum')
+CORS_EXPOSE_HEADERS = ['Upload-Offset', 'X-Peaks-Sample-Rate', 'X-Peaks-Samples-Per-Peak', 'X-Peaks-Levels']
 
 # Application definition
 
@@ -52,6 +59,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -103,13 +111,24 @@ AUTH_USER_MODEL = 'users.User'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
 }
 
+# Upper bound on operations accepted by /api/batch/ in one request
+BATCH_MAX_OPERATIONS = int(os.environ.get('BATCH_MAX_OPERATIONS', 500))
+
+# Delta sync: rows per stream per response, and how long tombstones are kept.
+# Clients whose cursor is older than the retention period must resync fully.
+SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', 500))
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+# Timestamps are taken before a transaction commits, so each sync re-reads the
+# last SYNC_SAFETY_WINDOW seconds; it must exceed the longest write transaction.
+SYNC_SAFETY_WINDOW = int(os.environ.get('SYNC_SAFETY_WINDOW', 60))
+
 # JWT settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
@@ -126,6 +145,14 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
+# Users resolved from access tokens are cached per process for
+# AUTH_USER_LOCAL_TTL seconds (at most AUTH_USER_LOCAL_SIZE of them) and in
+# Redis for AUTH_USER_CACHE_TIMEOUT. Saving or deleting a user drops its
+# entries; other processes see a deactivation within the local TTL.
+AUTH_USER_LOCAL_TTL = float(os.environ.get('AUTH_USER_LOCAL_TTL', 5))
+AUTH_USER_LOCAL_SIZE = int(os.environ.get('AUTH_USER_LOCAL_SIZE', 1024))
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get('AUTH_USER_CACHE_TIMEOUT', 300))
+
 # Redis settings
 REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379')
 
@@ -140,6 +167,18 @@ CACHES = {
     }
 }
 
+# Seconds a cached list response is kept; entries are also invalidated by
+# bumping the per-user resource version whenever a row changes.
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300))
+
+# Request instrumentation (core.middleware): a Server-Timing header on every
+# response, and per-view histograms at /metrics in the Prometheus text format.
+# Each process adds its counts to Redis every REQUEST_METRICS_FLUSH_INTERVAL
+# seconds. Set METRICS_TOKEN to require "Authorization: Bearer <token>" there.
+SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', 'True') == 'True'
+REQUEST_METRICS_FLUSH_INTERVAL = float(os.environ.get('REQUEST_METRICS_FLUSH_INTERVAL', 5))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
 # Session settings
 SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
 SESSION_CACHE_ALIAS = 'default'
@@ -152,16 +191,117 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 
+# Celery queues: CPU-heavy transcription, audio post-processing (normalization
+# and waveform peaks), and light periodic/maintenance work on the default queue.
+# Each queue has its own worker profile (see docker-compose.yml), so a burst of
+# transcriptions never delays the light tasks.
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_ROUTES = {
+    'reflections.tasks.transcribe_audio': {'queue': 'transcription'},
+    'reflections.tasks.transcribe_batch': {'queue': 'transcription'},
+    'reflections.tasks.normalize_audio': {'queue': 'audio'},
+    'reflections.tasks.compute_waveform_peaks': {'queue': 'audio'},
+}
+# Within a queue Redis serves lower priority numbers first. User-facing work
+# runs at the default priority; sweeper retries are sent at
+# TASK_PRIORITY_BACKGROUND and the tasks they trigger inherit it.
+CELERY_TASK_DEFAULT_PRIORITY = 0
+CELERY_TASK_INHERIT_PARENT_PRIORITY = True
+TASK_PRIORITY_BACKGROUND = 6
+# Heavy tasks are acknowledged after they finish (acks_late), so a message
+# held by a worker that dies is redelivered after the visibility timeout,
+# which must exceed the longest task including any countdown.
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'queue_order_strategy': 'priority',
+    'priority_steps': list(range(10)),
+    'sep': ':',
+    'visibility_timeout': int(os.environ.get('CELERY_VISIBILITY_TIMEOUT', 3 * 3600)),
+}
+
 # Celery beat settings
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_BEAT_SCHEDULE = {
+    'prune-tombstones': {
+        'task': 'core.tasks.prune_tombstones',
+        'schedule': timedelta(days=1),
+    },
+    'rollover-recurring-goals': {
+        'task': 'goals.tasks.rollover_recurring_goals',
+        'schedule': timedelta(hours=1),
+    },
+    'sweep-stalled-reflections': {
+        'task': 'reflections.tasks.sweep_stalled_reflections',
+        'schedule': timedelta(minutes=1),
+    },
+    'sweep-abandoned-uploads': {
+        'task': 'reflections.tasks.sweep_abandoned_uploads',
+        'schedule': timedelta(hours=1),
+    },
+}
+
+# Completed recurring goals rolled over per transaction
+GOAL_ROLLOVER_CHUNK_SIZE = int(os.environ.get('GOAL_ROLLOVER_CHUNK_SIZE', 1000))
 
 # Celery result settings
 CELERY_RESULT_EXTENDED = True
 
+# Transcription settings
+TRANSCRIPTION_ENGINE = os.environ.get('TRANSCRIPTION_ENGINE', 'reflections.transcription.StubTranscriptionEngine')
+TRANSCRIPTION_WINDOW_SECONDS = int(os.environ.get('TRANSCRIPTION_WINDOW_SECONDS', 30))
+TRANSCRIPTION_WORKERS = int(os.environ.get('TRANSCRIPTION_WORKERS', os.cpu_count() or 1))
+# A batch size above 1 gathers uploads into micro-batches handled by one task
+TRANSCRIPTION_BATCH_SIZE = int(os.environ.get('TRANSCRIPTION_BATCH_SIZE', 1))
+TRANSCRIPTION_BATCH_WINDOW = float(os.environ.get('TRANSCRIPTION_BATCH_WINDOW', 2.0))
+
+# Reflection processing leases: a queued reflection must be claimed by a worker
+# within REFLECTION_QUEUE_TIMEOUT seconds, and each processing stage holds it
+# for REFLECTION_PROCESSING_LEASE seconds. The sweeper re-enqueues reflections
+# whose lease ran out, waiting REFLECTION_RETRY_BACKOFF seconds doubled per
+# attempt (capped at REFLECTION_RETRY_BACKOFF_MAX), and marks them failed after
+# REFLECTION_MAX_ATTEMPTS claims.
+REFLECTION_QUEUE_TIMEOUT = int(os.environ.get('REFLECTION_QUEUE_TIMEOUT', 3600))
+REFLECTION_PROCESSING_LEASE = int(os.environ.get('REFLECTION_PROCESSING_LEASE', 1800))
+REFLECTION_RETRY_BACKOFF = int(os.environ.get('REFLECTION_RETRY_BACKOFF', 60))
+REFLECTION_RETRY_BACKOFF_MAX = int(os.environ.get('REFLECTION_RETRY_BACKOFF_MAX', 3600))
+REFLECTION_MAX_ATTEMPTS = int(os.environ.get('REFLECTION_MAX_ATTEMPTS', 5))
+REFLECTION_SWEEP_CHUNK_SIZE = int(os.environ.get('REFLECTION_SWEEP_CHUNK_SIZE', 500))
+
+# Audio normalization: uploads are re-encoded as 16-bit mono PCM at this rate
+# before transcription. Set AUDIO_KEEP_ORIGINAL=False to delete the uploaded file.
+AUDIO_NORMALIZED_SAMPLE_RATE = int(os.environ.get('AUDIO_NORMALIZED_SAMPLE_RATE', 16000))
+AUDIO_KEEP_ORIGINAL = os.environ.get('AUDIO_KEEP_ORIGINAL', 'True') == 'True'
+
+# Reflection audio is served by /api/reflections/<id>/audio/. Signed audio URLs
+# stay valid for AUDIO_URL_MAX_AGE seconds. Set AUDIO_SENDFILE_BACKEND to
+# 'x-accel-redirect' (nginx, with AUDIO_SENDFILE_PREFIX an internal location
+# aliased to MEDIA_ROOT) or 'x-sendfile' (Apache/lighttpd) to let the proxy
+# send the bytes.
+AUDIO_URL_MAX_AGE = int(os.environ.get('AUDIO_URL_MAX_AGE', 3600))
+AUDIO_SENDFILE_BACKEND = os.environ.get('AUDIO_SENDFILE_BACKEND', '')
+AUDIO_SENDFILE_PREFIX = os.environ.get('AUDIO_SENDFILE_PREFIX', '/protected-media/')
+
+# Reflection vectors each worker process keeps in memory (1 KiB each) for
+# /api/reflections/<id>/related/
+RELATED_REFLECTIONS_CACHE_ROWS = int(os.environ.get('RELATED_REFLECTIONS_CACHE_ROWS', 200000))
+
+# /api/reflections/events/ sends a comment this often (seconds) to keep idle
+# streams open, closes each stream after MAX_AGE seconds, and asks EventSource
+# to reconnect after RETRY_MS milliseconds.
+REFLECTION_EVENTS_HEARTBEAT = float(os.environ.get('REFLECTION_EVENTS_HEARTBEAT', 15))
+REFLECTION_EVENTS_MAX_AGE = float(os.environ.get('REFLECTION_EVENTS_MAX_AGE', 300))
+REFLECTION_EVENTS_RETRY_MS = int(os.environ.get('REFLECTION_EVENTS_RETRY_MS', 3000))
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Resumable reflection uploads are assembled here before moving to storage.
+# Unfinished uploads untouched for REFLECTION_UPLOAD_EXPIRY seconds are
+# deleted, with their partial files, by sweep_abandoned_uploads.
+REFLECTION_UPLOAD_DIR = os.environ.get('REFLECTION_UPLOAD_DIR', os.path.join(MEDIA_ROOT, 'uploads'))
+REFLECTION_UPLOAD_MAX_SIZE = int(os.environ.get('REFLECTION_UPLOAD_MAX_SIZE', 500 * 1024 * 1024))
+REFLECTION_UPLOAD_EXPIRY = int(os.environ.get('REFLECTION_UPLOAD_EXPIRY', 24 * 3600))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -0,0 +1,56 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from goals.models import Category, Goal
+from reflections.models import Reflection
+from .cache import bump_version
+from .models import Tombstone
+
+RESOURCES = {
+    Category: 'categories',
+    Goal: 'goals',
+    Reflection: 'reflections',
+}
+
+# Goal responses include each goal's category, so category changes also
+# invalidate cached goal lists.
+DEPENDENT_RESOURCES = {
+    Category: ('categories', 'goals'),
+    Goal: ('goals',),
+    Reflection: ('reflections',),
+}
+
+
+def bump_versions_on_commit(user_id, resources):
+    def bump():
+        for resource in resources:
+            bump_version(user_id, resource)
+    transaction.on_commit(bump)
+
+
+def invalidate_cached_lists(sender, instance, **kwargs):
+    bump_versions_on_commit(instance.user_id, DEPENDENT_RESOURCES[sender])
+
+
+def record_tombstone(sender, instance, origin=None, **kwargs):
+    # Deleting the account removes everything; its tombstones would only be
+    # cascaded away with it.
+    if isinstance(origin, get_user_model()):
+        return
+    Tombstone.objects.create(user_id=instance.user_id, resource=RESOURCES[sender], object_id=instance.pk)
+
+
+for model in RESOURCES:
+    label = model._meta.label_lower
+    post_save.connect(invalidate_cached_lists, sender=model, dispatch_uid=f'invalidate_save_{label}')
+    post_delete.connect(invalidate_cached_lists, sender=model, dispatch_uid=f'invalidate_delete_{label}')
+    post_delete.connect(record_tombstone, sender=model, dispatch_uid=f'tombstone_{label}')
+
+
+@receiver(pre_delete, sender=Category)
+def touch_goals_of_deleted_category(sender, instance, **kwargs):
+    # SET_NULL clears goal.category with a bare UPDATE; bump updated_at so
+    # the change shows up in the sync feed.
+    Goal.objects.filter(category=instance).update(updated_at=timezone.now())
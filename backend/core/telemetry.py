@@ -0,0 +1,68 @@
+"""
+Celery signal handlers that time every task into ``core.metrics.task_registry``.
+
+The publisher stamps each message with the time it was sent; the worker
+measures how long it waited in the broker (from the later of that stamp and
+its ETA) and how long it ran, and counts successes, failures and retries per
+task name and queue.
+"""
+import time
+from datetime import datetime
+
+from celery import signals
+from django.conf import settings
+from .metrics import task_registry
+
+ENQUEUED_HEADER = 'enqueued_at'
+
+# Start times of the tasks running in this process, by task id.
+started = {}
+
+
+def task_queue(task):
+    delivery_info = task.request.delivery_info or {}
+    queue = delivery_info.get('routing_key')
+    if queue:
+        return queue
+    # Eager calls never pass through a queue; use the one they are routed to.
+    return settings.CELERY_TASK_ROUTES.get(task.name, {}).get('queue', settings.CELERY_TASK_DEFAULT_QUEUE)
+
+
+def queue_wait(request, now):
+    enqueued_at = getattr(request, ENQUEUED_HEADER, None)
+    if enqueued_at is None:
+        return None
+    ready_at = float(enqueued_at)
+    if request.eta:
+        # A countdown is not time spent waiting for a worker.
+        ready_at = max(ready_at, datetime.fromisoformat(request.eta).timestamp())
+    return max(now - ready_at, 0.0)
+
+
+@signals.before_task_publish.connect
+def stamp_enqueue_time(headers=None, **kwargs):
+    if headers is not None:
+        headers[ENQUEUED_HEADER] = time.time()
+
+
+@signals.task_prerun.connect
+def record_start(task_id=None, task=None, **kwargs):
+    started[task_id] = (time.time(), time.perf_counter())
+
+
+@signals.task_postrun.connect
+def record_finish(task_id=None, task=None, state=None, **kwargs):
+    start = started.pop(task_id, None)
+    if start is None or task is None:
+        return
+    started_at, perf_start = start
+    histograms = {'runtime': time.perf_counter() - perf_start}
+    wait = queue_wait(task.request, started_at)
+    if wait is not None:
+        histograms['wait'] = wait
+    outcome = {'SUCCESS': 'succeeded', 'FAILURE': 'failed', 'RETRY': 'retried'}.get(state)
+    task_registry.observe(
+        (task.name, task_queue(task)),
+        histograms=histograms,
+        counters={outcome: 1} if outcome else None,
+    )
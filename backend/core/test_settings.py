@@ -20,4 +20,7 @@ CACHES = {
 }
 
 # Use in-memory storage for file uploads during tests
-DEFAULT_FILE_STORAGE = 'django.core.files.storage.InMemoryStorage'
\ No newline at end of file
+DEFAULT_FILE_STORAGE = 'django.core.files.storage.InMemoryStorage'
+
+# Transcribe inline rather than through a process pool
+TRANSCRIPTION_WORKERS = 1
@@ -0,0 +1,525 @@
+import io
+import json
+import math
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from asgiref.sync import iscoroutinefunction
+from django.http import HttpResponse
+from django.test import AsyncClient, TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from django.urls import reverse
+from unittest.mock import MagicMock, patch
+from core.celery import app as celery_app
+from .bench import Benchmark, compare, seed
+from goals.models import Goal, GoalStat, Category
+from reflections.models import Reflection, ReflectionKeyword
+from .cache import bump_version, get_version
+from rest_framework_simplejwt.tokens import AccessToken
+from .middleware import RequestMetricsMiddleware
+from .metrics import Registry, histogram_quantile, registry, task_registry
+from .models import Tombstone
+from .pagination import encode_cursor
+from .tasks import prune_tombstones
+from .telemetry import queue_wait, record_finish, record_start, stamp_enqueue_time
+
+User = get_user_model()
+
+
+class BatchAPITests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('batch')
+
+    def test_mixed_operations(self):
+        category = Category.objects.create(user=self.user, name='Health')
+        goal = Goal.objects.create(user=self.user, title='Run', category=category)
+        doomed = Goal.objects.create(user=self.user, title='Old goal')
+        operations = [
+            {'op': 'create', 'resource': 'category', 'data': {'name': 'Learning'}},
+            {'op': 'create', 'resource': 'goal', 'data': {'title': 'Read', 'category': category.id}},
+            {'op': 'update', 'resource': 'goal', 'id': goal.id, 'data': {'status': 'completed'}},
+            {'op': 'delete', 'resource': 'goal', 'id': doomed.id},
+        ]
+        response = self.client.post(self.url, {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            [201, 201, 200, 204]
+        )
+        self.assertTrue(Category.objects.filter(user=self.user, name='Learning').exists())
+        self.assertEqual(Goal.objects.get(title='Read').category, category)
+        goal.refresh_from_db()
+        self.assertEqual(goal.status, 'completed')
+        self.assertGreater(goal.updated_at, goal.created_at)
+        self.assertFalse(Goal.objects.filter(id=doomed.id).exists())
+
+    def test_hundred_creates_use_a_few_queries(self):
+        operations = [
+            {'op': 'create', 'resource': 'goal', 'data': {'title': f'Goal {i}'}}
+            for i in range(100)
+        ]
+        # savepoint, bulk insert (split on backends with a parameter limit),
+        # goal stats insert + increment, release
+        fields = [field for field in Goal._meta.concrete_fields if not field.primary_key]
+        inserts = math.ceil(100 / connection.ops.bulk_batch_size(fields, operations))
+        with self.assertNumQueries(4 + inserts):
+            response = self.client.post(self.url, {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Goal.objects.filter(user=self.user).count(), 100)
+
+    def test_invalid_operation_applies_nothing(self):
+        operations = [
+            {'op': 'create', 'resource': 'goal', 'data': {'title': 'Valid'}},
+            {'op': 'create', 'resource': 'goal', 'data': {'description': 'Missing title'}},
+        ]
+        response = self.client.post(self.url, {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors'][0]['index'], 1)
+        self.assertFalse(Goal.objects.exists())
+
+    def test_cannot_touch_other_users_rows(self):
+        other_user = User.objects.create_user(email='other@example.com', password='otherpass123')
+        other_goal = Goal.objects.create(user=other_user, title='Private')
+        operations = [{'op': 'delete', 'resource': 'goal', 'id': other_goal.id}]
+        response = self.client.post(self.url, {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Goal.objects.filter(id=other_goal.id).exists())
+
+    def test_references_to_deleted_rows_are_rejected(self):
+        category = Category.objects.create(user=self.user, name='Health')
+        goal = Goal.objects.create(user=self.user, title='Run')
+        operations = [
+            {'op': 'create', 'resource': 'goal', 'data': {'title': 'Swim', 'category': category.id}},
+            {'op': 'update', 'resource': 'goal', 'id': goal.id, 'data': {'title': 'Jog'}},
+            {'op': 'delete', 'resource': 'category', 'id': category.id},
+            {'op': 'delete', 'resource': 'goal', 'id': goal.id},
+            {'op': 'update', 'resource': 'goal', 'id': goal.id, 'data': {'title': 'Walk'}},
+        ]
+        response = self.client.post(self.url, {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data['errors'],
+            [
+                {'index': 0, 'errors': {'category': ['Deleted by operation 2.']}},
+                {'index': 4, 'errors': {'detail': 'Deleted by operation 3.'}},
+            ]
+        )
+        self.assertTrue(Category.objects.filter(pk=category.pk).exists())
+        self.assertEqual(Goal.objects.get().title, 'Run')
+
+        # Updating a row before deleting it is fine.
+        response = self.client.post(self.url, {'operations': operations[1:4]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(Goal.objects.exists())
+
+    def test_unique_conflict_rolls_back(self):
+        Category.objects.create(user=self.user, name='Health')
+        operations = [
+            {'op': 'create', 'resource': 'goal', 'data': {'title': 'Kept?'}},
+            {'op': 'create', 'resource': 'category', 'data': {'name': 'Health'}},
+        ]
+        response = self.client.post(self.url, {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Goal.objects.exists())
+
+
+class SyncAPITests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('sync')
+
+    def sync(self, since=None):
+        params = {'since': since} if since else {}
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    @override_settings(SYNC_SAFETY_WINDOW=0)
+    def test_initial_then_incremental_sync(self):
+        category = Category.objects.create(user=self.user, name='Health')
+        goal = Goal.objects.create(user=self.user, title='Run', category=category)
+        data = self.sync()
+        self.assertEqual([item['id'] for item in data['categories']], [category.id])
+        self.assertEqual([item['id'] for item in data['goals']], [goal.id])
+
+        idle = self.sync(data['cursor'])
+        self.assertEqual((idle['categories'], idle['goals'], idle['reflections']), ([], [], []))
+        self.assertEqual(idle['deleted'], {'categories': [], 'goals': [], 'reflections': []})
+
+        goal.status = 'completed'
+        goal.save()
+        changed = self.sync(idle['cursor'])
+        self.assertEqual([item['status'] for item in changed['goals']], ['completed'])
+        self.assertEqual(changed['categories'], [])
+
+    def test_deletes_produce_tombstones(self):
+        category = Category.objects.create(user=self.user, name='Health')
+        goal = Goal.objects.create(user=self.user, title='Run', category=category)
+        category_id = category.id
+        cursor = self.sync()['cursor']
+        category.delete()
+        data = self.sync(cursor)
+        self.assertEqual(data['deleted']['categories'], [category_id])
+        # The goal lost its category, so it is sent again
+        self.assertEqual([(item['id'], item['category']) for item in data['goals']], [(goal.id, None)])
+
+    def test_late_commits_are_not_skipped(self):
+        Goal.objects.create(user=self.user, title='Run')
+        cursor = self.sync()['cursor']
+        # Stamped before the previous sync, committed after it.
+        late = Goal.objects.create(user=self.user, title='Read')
+        Goal.objects.filter(pk=late.pk).update(updated_at=timezone.now() - timedelta(seconds=5))
+        data = self.sync(cursor)
+        self.assertIn(late.id, [item['id'] for item in data['goals']])
+        self.assertEqual(len({item['id'] for item in data['goals']}), len(data['goals']))
+
+        with override_settings(SYNC_SAFETY_WINDOW=0):
+            self.assertEqual(self.sync(self.sync(data['cursor'])['cursor'])['goals'], [])
+
+    @override_settings(SYNC_PAGE_SIZE=2)
+    def test_pages_until_exhausted(self):
+        goals = [Goal.objects.create(user=self.user, title=f'Goal {i}') for i in range(5)]
+        # Identical timestamps must not drop rows at page boundaries
+        Goal.objects.update(updated_at=timezone.now())
+        seen = []
+        data = self.sync()
+        seen.extend(item['id'] for item in data['goals'])
+        while data['has_more']:
+            data = self.sync(data['cursor'])
+            seen.extend(item['id'] for item in data['goals'])
+        self.assertEqual(sorted(seen), sorted(goal.id for goal in goals))
+
+    def test_stale_cursor_requires_full_sync(self):
+        old = timezone.now() - timedelta(days=365)
+        cursor = encode_cursor(old.isoformat(), *[value for _ in range(4) for value in (old.isoformat(), 0)])
+        response = self.client.get(self.url, {'since': cursor})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+    def test_prune_tombstones(self):
+        Tombstone.objects.create(user=self.user, resource='goals', object_id=1)
+        Tombstone.objects.create(user=self.user, resource='goals', object_id=2)
+        Tombstone.objects.filter(object_id=1).update(deleted_at=timezone.now() - timedelta(days=365))
+        self.assertEqual(prune_tombstones(), 1)
+        self.assertEqual(list(Tombstone.objects.values_list('object_id', flat=True)), [2])
+
+    def test_deleting_account_leaves_no_tombstones(self):
+        Goal.objects.create(user=self.user, title='Run')
+        self.user.delete()
+        self.assertFalse(Tombstone.objects.exists())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('goal-list')
+        Goal.objects.create(user=self.user, title='Run')
+
+    def test_version_counter(self):
+        version = get_version(self.user.pk, 'goals')
+        self.assertEqual(get_version(self.user.pk, 'goals'), version)
+        bump_version(self.user.pk, 'goals')
+        self.assertEqual(get_version(self.user.pk, 'goals'), version + 1)
+
+    def test_repeat_request_is_served_from_cache(self):
+        first = self.client.get(self.url)
+        self.assertIn('ETag', first)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_writes_invalidate_cached_list(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Goal.objects.create(user=self.user, title='Read')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_category_changes_invalidate_goal_lists(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(user=self.user, name='Health')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_batch_writes_invalidate_cached_list(self):
+        etag = self.client.get(self.url)['ETag']
+        operations = [{'op': 'create', 'resource': 'goal', 'data': {'title': 'Read'}}]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('batch'), {'operations': operations}, format='json')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'api.example.com'])
+    def test_host_is_part_of_the_key(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag, HTTP_HOST='api.example.com')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    @override_settings(AUDIO_URL_MAX_AGE=3600)
+    def test_reflection_lists_expire_before_their_audio_urls(self):
+        url = reverse('reflection-list')
+        Reflection.objects.create(user=self.user, audio_file=SimpleUploadedFile('a.wav', b'RIFF'))
+        with patch('reflections.views.time.time', return_value=1800):
+            etag = self.client.get(url)['ETag']
+        with patch('reflections.views.time.time', return_value=1800 + 1799):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        with patch('reflections.views.time.time', return_value=1800 + 1800):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_cache_is_per_user(self):
+        self.client.get(self.url)
+        other_user = User.objects.create_user(email='other@example.com', password='otherpass123')
+        self.client.force_authenticate(user=other_user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['results'], [])
+
+
+class CeleryRoutingTests(TestCase):
+    def queue(self, task_name):
+        return celery_app.amqp.router.route({}, task_name)['queue'].name
+
+    def test_heavy_tasks_have_their_own_queues(self):
+        self.assertEqual(self.queue('reflections.tasks.transcribe_audio'), 'transcription')
+        self.assertEqual(self.queue('reflections.tasks.transcribe_batch'), 'transcription')
+        self.assertEqual(self.queue('reflections.tasks.normalize_audio'), 'audio')
+        self.assertEqual(self.queue('reflections.tasks.compute_waveform_peaks'), 'audio')
+
+    def test_light_tasks_use_default_queue(self):
+        for task_name in (
+            'core.tasks.prune_tombstones',
+            'goals.tasks.rollover_recurring_goals',
+            'reflections.tasks.sweep_stalled_reflections',
+        ):
+            self.assertEqual(self.queue(task_name), 'default')
+
+    def test_heavy_tasks_are_acknowledged_late(self):
+        self.assertTrue(celery_app.tasks['reflections.tasks.transcribe_audio'].acks_late)
+        self.assertTrue(celery_app.tasks['reflections.tasks.normalize_audio'].acks_late)
+        self.assertFalse(celery_app.tasks['core.tasks.prune_tombstones'].acks_late)
+
+
+class BenchTests(TestCase):
+    def test_seed_is_reproducible(self):
+        users = seed(2, categories=2, goals=3, reflections=4)
+        self.assertEqual(Category.objects.filter(user__in=users).count(), 4)
+        self.assertEqual(Goal.objects.filter(user__in=users).count(), 6)
+        self.assertEqual(sum(GoalStat.objects.values_list('total', flat=True)), 6)
+        self.assertEqual(Reflection.objects.filter(user__in=users, status='done').count(), 8)
+        self.assertTrue(ReflectionKeyword.objects.exists())
+        titles = list(Goal.objects.order_by('pk').values_list('title', flat=True))
+        for user in users:
+            user.delete()
+        seed(2, categories=2, goals=3, reflections=4)
+        self.assertEqual(list(Goal.objects.order_by('pk').values_list('title', flat=True)), titles)
+
+    def test_report_covers_every_endpoint(self):
+        users = seed(1, categories=1, goals=2, reflections=2)
+        report = Benchmark(users).run(iterations=2, warmup=1)
+        self.assertIn('users-login', report['endpoints'])
+        self.assertIn('reflections-related', report['endpoints'])
+        goals_list = report['endpoints']['goals-list']
+        self.assertEqual((goals_list['method'], goals_list['requests']), ('GET', 2))
+        self.assertLessEqual(goals_list['p50_ms'], goals_list['p99_ms'])
+        self.assertGreater(goals_list['queries'], 0)
+
+    def test_compare_flags_regressions(self):
+        def report(p50, queries):
+            return {'endpoints': {'goals-list': {'p50_ms': p50, 'p95_ms': p50, 'p99_ms': p50, 'queries': queries}}}
+
+        self.assertFalse(compare(report(11, 2), report(10, 2))['goals-list']['regressed'])
+        self.assertTrue(compare(report(20, 2), report(10, 2))['goals-list']['regressed'])
+        self.assertTrue(compare(report(10, 3), report(10, 2))['goals-list']['regressed'])
+        self.assertEqual(compare(report(10, 2), {'endpoints': {}}), {})
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('goal-list')
+        Goal.objects.create(user=self.user, title='Run')
+
+    def timing(self, response):
+        return dict(
+            (part.split(';')[0].strip(), part.strip()) for part in response['Server-Timing'].split(',')
+        )
+
+    def test_server_timing_header(self):
+        first = self.timing(self.client.get(self.url))
+        self.assertRegex(first['db'], r'desc="[1-9]\d* queries";dur=[\d.]+')
+        self.assertIn('hits=0 misses=2', first['cache'])
+        self.assertRegex(first['serialize'], r'dur=[\d.]+')
+        second = self.timing(self.client.get(self.url))
+        self.assertIn('hits=2 misses=0', second['cache'])
+        self.assertIn('desc="0 queries"', second['db'])
+
+    async def test_async_stack_records_queries(self):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        response = await AsyncClient().get(self.url, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRegex(self.timing(response)['db'], r'desc="[1-9]\d* queries"')
+
+    def test_middleware_is_async_capable(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        middleware = RequestMetricsMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertFalse(iscoroutinefunction(RequestMetricsMiddleware(lambda request: HttpResponse())))
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_server_timing_can_be_disabled(self):
+        self.assertNotIn('Server-Timing', self.client.get(self.url))
+
+    def test_metrics_endpoint(self):
+        def count():
+            text = self.client.get(reverse('metrics')).content.decode()
+            prefix = 'http_request_duration_seconds_count{method="GET",view="goal-list",status="200"} '
+            lines = [line for line in text.splitlines() if line.startswith(prefix)]
+            return int(lines[0][len(prefix):]) if lines else 0
+
+        before = count()
+        self.client.get(self.url)
+        self.client.get(self.url)
+        self.assertEqual(count(), before + 2)
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+        self.assertIn('le="+Inf"', text)
+        self.assertIn('http_request_cache_hits_total{method="GET",view="goal-list",status="200"}', text)
+
+    def test_unmatched_paths_share_a_label(self):
+        self.client.get('/no/such/page/')
+        self.assertIn('view="unmatched",status="404"', registry.render())
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        client = APIClient()
+        self.assertEqual(client.get(reverse('metrics')).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+    def test_flush_adds_to_shared_totals(self):
+        local = Registry(registry.key, registry.labels, registry.buckets, registry.histograms, registry.counters)
+        local.observe(('GET', 'goal-list', 200), histograms={'duration': 0.02}, counters={'queries': 3})
+        redis = MagicMock()
+        redis.hgetall.return_value = {
+            b'GET\tgoal-list\t200\tduration\tcount': b'5', b'GET\tgoal-list\t200\tduration\tbucket2': b'5'
+        }
+        with patch('core.metrics._redis', return_value=redis):
+            text = local.render()
+        pipeline = redis.pipeline.return_value
+        pipeline.hincrbyfloat.assert_any_call('metrics:http', 'GET\tgoal-list\t200\tqueries', 3)
+        pipeline.execute.assert_called_once_with()
+        self.assertEqual(local.pending, {})
+        self.assertIn(
+            'http_request_duration_seconds_bucket{method="GET",view="goal-list",status="200",le="0.025"} 5', text
+        )
+
+
+class TaskTelemetryTests(TestCase):
+    def setUp(self):
+        task_registry.reset()
+
+    def test_task_runs_are_recorded(self):
+        prune_tombstones.delay()
+        values = task_registry.series()[('core.tasks.prune_tombstones', 'default')]
+        self.assertEqual(values[('runtime', 'count')], 1)
+        self.assertEqual(values[('succeeded',)], 1)
+        # Eager calls are never published, so there is no queue wait.
+        self.assertNotIn(('wait', 'count'), values)
+
+    def test_failures_and_retries_are_counted(self):
+        task = MagicMock()
+        task.name = 'reflections.tasks.transcribe_audio'
+        task.request.delivery_info = {'routing_key': 'transcription'}
+        task.request.enqueued_at = time.time() - 2
+        task.request.eta = None
+        for task_id, state in (('a', 'FAILURE'), ('b', 'RETRY'), ('c', 'SUCCESS')):
+            record_start(task_id=task_id, task=task)
+            record_finish(task_id=task_id, task=task, state=state)
+        values = task_registry.series()[('reflections.tasks.transcribe_audio', 'transcription')]
+        self.assertEqual((values[('failed',)], values[('retried',)], values[('succeeded',)]), (1, 1, 1))
+        self.assertEqual(values[('wait', 'count')], 3)
+        self.assertGreaterEqual(values[('wait', 'sum')], 6)
+
+    def test_queue_wait_starts_at_eta(self):
+        headers = {}
+        stamp_enqueue_time(headers=headers)
+        now = headers['enqueued_at'] + 30
+        request = MagicMock(enqueued_at=headers['enqueued_at'], eta=None)
+        self.assertAlmostEqual(queue_wait(request, now), 30, places=3)
+        request.eta = datetime.fromtimestamp(now - 10, tz=dt_timezone.utc).isoformat()
+        self.assertAlmostEqual(queue_wait(request, now), 10, places=3)
+        self.assertIsNone(queue_wait(MagicMock(spec=['eta']), now))
+
+    def test_histogram_quantile(self):
+        self.assertIsNone(histogram_quantile((1, 2), [0, 0, 0], 0.5))
+        self.assertEqual(histogram_quantile((1, 2), [0, 4, 0], 0.5), 1.5)
+        self.assertEqual(histogram_quantile((1, 2), [2, 0, 2], 0.95), 2)
+
+    def test_taskstats_and_metrics_endpoint(self):
+        task_registry.observe(
+            ('reflections.tasks.transcribe_audio', 'transcription'),
+            histograms={'wait': 0.3, 'runtime': 20.0},
+            counters={'succeeded': 1},
+        )
+        out = io.StringIO()
+        call_command('taskstats', '--json', stdout=out)
+        [row] = json.loads(out.getvalue())
+        self.assertEqual(
+            (row['task'], row['queue'], row['succeeded']), ('reflections.tasks.transcribe_audio', 'transcription', 1)
+        )
+        self.assertEqual(row['runtime']['count'], 1)
+        self.assertTrue(10 < row['runtime']['p50_s'] <= 30)
+        out = io.StringIO()
+        call_command('taskstats', stdout=out)
+        self.assertIn('reflections.tasks.transcribe_audio  transcription', out.getvalue())
+
+        text = APIClient().get(reverse('metrics')).content.decode()
+        self.assertIn(
+            'celery_task_runtime_seconds_count{task="reflections.tasks.transcribe_audio",queue="transcription"} 1', text
+        )
+        self.assertIn('# TYPE celery_task_queue_wait_seconds histogram', text)
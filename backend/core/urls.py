@@ -16,12 +16,14 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from django.conf import settings
-from django.conf.urls.static import static
+from .views import BatchView, SyncView, metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/users/', include('users.urls')),
     path('api/goals/', include('goals.urls')),
     path('api/reflections/', include('reflections.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('api/batch/', BatchView.as_view(), name='batch'),
+    path('api/sync/', SyncView.as_view(), name='sync'),
+    path('metrics', metrics, name='metrics'),
+]
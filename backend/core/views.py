@@ -0,0 +1,327 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from hmac import compare_digest
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Model, Q
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import permissions, status
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from goals.models import Category, Goal, GoalStat
+from goals.serializers import CategorySerializer, GoalSerializer
+from reflections.models import Reflection
+from reflections.serializers import ReflectionSerializer
+from .metrics import registry, task_registry
+from .models import Tombstone
+from .signals import DEPENDENT_RESOURCES, bump_versions_on_commit
+from .pagination import decode_cursor, encode_cursor
+
+# Resources in the order their writes are applied, with the operations each
+# one accepts. Reflections are created through the upload endpoints.
+BATCH_RESOURCES = {
+    'category': (Category, CategorySerializer, {'create', 'update', 'delete'}),
+    'goal': (Goal, GoalSerializer, {'create', 'update', 'delete'}),
+    'reflection': (Reflection, ReflectionSerializer, {'delete'}),
+}
+
+
+class BatchView(APIView):
+    """
+    Apply a list of create/update/delete operations in one transaction.
+
+    Every operation is validated with the resource's serializer first; if
+    any fail, nothing is written and the per-operation errors are returned.
+    Otherwise writes are grouped per resource into bulk_create, bulk_update
+    and a single delete query each.
+
+    Resources are written in ``BATCH_RESOURCES`` order, not in request
+    order. The result still matches applying the operations one by one,
+    because a batch is rejected if a create or update refers to a row that
+    the batch deletes, or if it updates a row after deleting it. A row may
+    be updated and then deleted.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def parse_operations(self, request):
+        operations = request.data.get('operations') if isinstance(request.data, dict) else None
+        if not isinstance(operations, list) or not operations:
+            return None, 'Expected a non-empty "operations" list.'
+        if len(operations) > settings.BATCH_MAX_OPERATIONS:
+            return None, f'A batch may contain at most {settings.BATCH_MAX_OPERATIONS} operations.'
+        return operations, None
+
+    def check_operation(self, operation):
+        if not isinstance(operation, dict):
+            return 'Each operation must be an object.'
+        resource = BATCH_RESOURCES.get(operation.get('resource'))
+        if resource is None:
+            return f'Unknown resource. Expected one of: {", ".join(BATCH_RESOURCES)}.'
+        if operation.get('op') not in resource[2]:
+            return f'Unsupported operation. Expected one of: {", ".join(sorted(resource[2]))}.'
+        if operation['op'] != 'create' and not isinstance(operation.get('id'), int):
+            return 'An integer "id" is required.'
+        if operation['op'] != 'delete' and not isinstance(operation.get('data', {}), dict):
+            return '"data" must be an object.'
+        return None
+
+    def load_instances(self, user, operations):
+        ids = {name: set() for name in BATCH_RESOURCES}
+        for operation in operations:
+            if operation['op'] != 'create':
+                ids[operation['resource']].add(operation['id'])
+        return {
+            name: model.objects.filter(user=user).in_bulk(ids[name]) if ids[name] else {}
+            for name, (model, _, _) in BATCH_RESOURCES.items()
+        }
+
+    def post(self, request):
+        operations, error = self.parse_operations(request)
+        if error:
+            return Response({'detail': error}, status=status.HTTP_400_BAD_REQUEST)
+
+        errors = {}
+        for index, operation in enumerate(operations):
+            error = self.check_operation(operation)
+            if error:
+                errors[index] = {'detail': error}
+        if errors:
+            return self.error_response(errors)
+
+        instances = self.load_instances(request.user, operations)
+        context = {'request': request, 'view': self}
+        validated = []
+        for index, operation in enumerate(operations):
+            _, serializer_class, _ = BATCH_RESOURCES[operation['resource']]
+            instance = None
+            if operation['op'] != 'create':
+                instance = instances[operation['resource']].get(operation['id'])
+                if instance is None:
+                    errors[index] = {'detail': 'Not found.'}
+                    continue
+            serializer = None
+            if operation['op'] != 'delete':
+                serializer = serializer_class(
+                    instance, data=operation.get('data', {}), partial=instance is not None, context=context
+                )
+                if not serializer.is_valid():
+                    errors[index] = serializer.errors
+                    continue
+            validated.append((index, operation, instance, serializer))
+        if errors:
+            return self.error_response(errors)
+        errors = self.check_deleted_references(validated)
+        if errors:
+            return self.error_response(errors)
+
+        try:
+            with transaction.atomic():
+                results = self.apply(request.user, validated)
+        except IntegrityError:
+            return Response(
+                {'detail': 'The batch conflicts with existing data and was not applied.'},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response({'results': [results[index] for index in range(len(operations))]})
+
+    def check_deleted_references(self, validated):
+        deleted = {}
+        for index, operation, instance, _ in validated:
+            if operation['op'] == 'delete':
+                deleted.setdefault((type(instance), instance.pk), index)
+        errors = {}
+        for index, operation, instance, serializer in validated:
+            if serializer is None:
+                continue
+            if instance is not None and deleted.get((type(instance), instance.pk), index) < index:
+                errors[index] = {'detail': f'Deleted by operation {deleted[type(instance), instance.pk]}.'}
+                continue
+            for field, value in serializer.validated_data.items():
+                if isinstance(value, Model) and (type(value), value.pk) in deleted:
+                    errors[index] = {field: [f'Deleted by operation {deleted[type(value), value.pk]}.']}
+                    break
+        return errors
+
+    def apply(self, user, validated):
+        now = timezone.now()
+        results = {}
+        for name, (model, serializer_class, _) in BATCH_RESOURCES.items():
+            ops = [item for item in validated if item[1]['resource'] == name]
+            created = []
+            updated = {}
+            update_fields = {'updated_at'}
+            deleted = set()
+            for index, operation, instance, serializer in ops:
+                if operation['op'] == 'create':
+                    created.append((index, model(user=user, **serializer.validated_data)))
+                elif operation['op'] == 'update':
+                    for field, value in serializer.validated_data.items():
+                        setattr(instance, field, value)
+                        update_fields.add(field)
+                    # bulk_update() does not run auto_now, so stamp it here.
+                    instance.updated_at = now
+                    updated[index] = instance
+                else:
+                    deleted.add(instance.pk)
+                    results[index] = {'index': index, 'status': status.HTTP_204_NO_CONTENT, 'id': instance.pk}
+
+            if created:
+                model.objects.bulk_create([instance for _, instance in created])
+            live_updates = {instance.pk: instance for instance in updated.values() if instance.pk not in deleted}
+            if live_updates:
+                model.objects.bulk_update(list(live_updates.values()), sorted(update_fields))
+            if deleted:
+                model.objects.filter(user=user, pk__in=deleted).delete()
+
+            if ops:
+                # Bulk writes skip post_save, so invalidate cached lists here.
+                bump_versions_on_commit(user.pk, DEPENDENT_RESOURCES[model])
+            if model is Goal and (created or live_updates):
+                # ...and update goal stats (deletes still send post_delete).
+                GoalStat.objects.record(
+                    removed=[instance._stats_key for instance in live_updates.values()],
+                    added=[instance.stats_key() for instance in live_updates.values()]
+                    + [instance.stats_key() for _, instance in created],
+                )
+
+            for index, instance in created:
+                results[index] = {
+                    'index': index,
+                    'status': status.HTTP_201_CREATED,
+                    'id': instance.pk,
+                    'data': serializer_class(instance).data,
+                }
+            for index, instance in updated.items():
+                results[index] = {'index': index, 'status': status.HTTP_200_OK, 'id': instance.pk}
+                if instance.pk not in deleted:
+                    results[index]['data'] = serializer_class(instance).data
+        return results
+
+    def error_response(self, errors):
+        return Response(
+            {
+                'detail': 'No operations were applied.',
+                'errors': [
+                    {'index': index, 'errors': errors[index]} for index in sorted(errors)
+                ],
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+
+class SyncView(APIView):
+    """
+    Changes feed for offline clients.
+
+    Returns rows updated after the ``since`` cursor and tombstones for rows
+    deleted after it. Each stream is read as a keyset range on its
+    ``(user, updated_at, id)`` index. Pass the returned ``cursor`` back as
+    ``since``; keep calling while ``has_more`` is true.
+
+    ``updated_at`` is stamped before the row's transaction commits, so a
+    late commit can carry a timestamp older than rows already synced. The
+    last page of each stream therefore leaves its cursor
+    ``SYNC_SAFETY_WINDOW`` seconds back, and rows from that window are sent
+    again; clients upsert them by id.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    streams = (
+        ('categories', Category, CategorySerializer),
+        ('goals', Goal, GoalSerializer),
+        ('reflections', Reflection, ReflectionSerializer),
+    )
+    epoch = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+    def decode_cursor(self, since):
+        """Return (issued_at, positions) for a ``since`` cursor."""
+        names = [name for name, _, _ in self.streams] + ['deleted']
+        if not since:
+            return None, {name: (self.epoch, 0) for name in names}
+        values = decode_cursor(since)
+        if len(values) != 1 + 2 * len(names):
+            raise NotFound('Invalid cursor')
+        issued_at = parse_datetime(values[0])
+        positions = {}
+        for index, name in enumerate(names):
+            timestamp = parse_datetime(values[1 + 2 * index])
+            try:
+                pk = int(values[2 + 2 * index])
+            except ValueError:
+                raise NotFound('Invalid cursor')
+            if timestamp is None:
+                raise NotFound('Invalid cursor')
+            positions[name] = (timestamp, pk)
+        if issued_at is None:
+            raise NotFound('Invalid cursor')
+        return issued_at, positions
+
+    def after(self, queryset, field, position):
+        timestamp, pk = position
+        return queryset.filter(
+            Q(**{f'{field}__gt': timestamp}) | Q(**{field: timestamp, 'id__gt': pk})
+        ).order_by(field, 'id')
+
+    def get(self, request):
+        issued_at, positions = self.decode_cursor(request.query_params.get('since'))
+        now = timezone.now()
+        if issued_at is not None and issued_at < now - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS):
+            return Response(
+                {'detail': 'Cursor is older than the tombstone retention period; run a full sync.'},
+                status=status.HTTP_410_GONE
+            )
+
+        limit = settings.SYNC_PAGE_SIZE
+        horizon = (now - timedelta(seconds=settings.SYNC_SAFETY_WINDOW), 0)
+        context = {'request': request, 'view': self}
+        data = {}
+        has_more = False
+        for name, model, serializer_class in self.streams:
+            rows = list(self.after(model.objects.filter(user=request.user), 'updated_at', positions[name])[:limit + 1])
+            more = len(rows) > limit
+            rows = rows[:limit]
+            if rows:
+                positions[name] = (rows[-1].updated_at, rows[-1].id)
+            if not more:
+                positions[name] = min(positions[name], horizon)
+            has_more = has_more or more
+            data[name] = serializer_class(rows, many=True, context=context).data
+
+        tombstones = list(
+            self.after(Tombstone.objects.filter(user=request.user), 'deleted_at', positions['deleted'])[:limit + 1]
+        )
+        more = len(tombstones) > limit
+        tombstones = tombstones[:limit]
+        if tombstones:
+            positions['deleted'] = (tombstones[-1].deleted_at, tombstones[-1].id)
+        if not more:
+            positions['deleted'] = min(positions['deleted'], horizon)
+        has_more = has_more or more
+        deleted = {name: [] for name, _, _ in self.streams}
+        for tombstone in tombstones:
+            deleted[tombstone.resource].append(tombstone.object_id)
+
+        cursor = encode_cursor(now.isoformat(), *[
+            value
+            for timestamp, pk in positions.values()
+            for value in (timestamp.isoformat(), pk)
+        ])
+        return Response({
+            'cursor': cursor,
+            'has_more': has_more,
+            **data,
+            'deleted': deleted,
+        })
+
+
+def metrics(request):
+    """Request and task histograms and counters in the Prometheus text format."""
+    if settings.METRICS_TOKEN:
+        expected = f'Bearer {settings.METRICS_TOKEN}'
+        if not compare_digest(request.headers.get('Authorization', ''), expected):
+            return HttpResponse(status=status.HTTP_401_UNAUTHORIZED, headers={'WWW-Authenticate': 'Bearer'})
+    return HttpResponse(
+        registry.render() + task_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
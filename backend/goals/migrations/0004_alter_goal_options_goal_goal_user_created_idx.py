@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goals', '0003_category_alter_goal_category'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='goal',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+        migrations.AddIndex(
+            model_name='goal',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='goal_user_created_idx'),
+        ),
+    ]
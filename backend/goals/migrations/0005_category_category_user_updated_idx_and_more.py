@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goals', '0004_alter_goal_options_goal_goal_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='category_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goal',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='goal_user_updated_idx'),
+        ),
+    ]
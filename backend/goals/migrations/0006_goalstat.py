@@ -0,0 +1,69 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_goal_stats(apps, schema_editor):
+    from collections import defaultdict
+    from datetime import timedelta
+    from django.utils import timezone
+
+    Goal = apps.get_model('goals', 'Goal')
+    GoalStat = apps.get_model('goals', 'GoalStat')
+    counts = defaultdict(lambda: [0, 0, 0, 0])
+    rows = Goal.objects.values_list('user_id', 'category_id', 'target_date', 'created_at', 'status', 'recurring')
+    for user_id, category_id, target_date, created_at, status, recurring in rows.iterator(chunk_size=2000):
+        day = target_date or timezone.localdate(created_at)
+        bucket = counts[(user_id, category_id or 0, day - timedelta(days=day.weekday()))]
+        completed = status == 'completed'
+        bucket[0] += 1
+        bucket[1] += completed
+        bucket[2] += recurring
+        bucket[3] += completed and recurring
+    GoalStat.objects.bulk_create([
+        GoalStat(
+            user_id=user_id, category_key=category_key, week=week,
+            total=total, completed=completed, recurring_total=recurring_total,
+            recurring_completed=recurring_completed,
+        )
+        for (user_id, category_key, week), (total, completed, recurring_total, recurring_completed) in counts.items()
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('goals', '0005_category_category_user_updated_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoalStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category_key', models.BigIntegerField(default=0)),
+                ('week', models.DateField()),
+                ('total', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('recurring_total', models.IntegerField(default=0)),
+                ('recurring_completed', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='goal',
+            index=models.Index(fields=['user', 'status', 'target_date'], name='goal_user_status_target_idx'),
+        ),
+        migrations.AddField(
+            model_name='goalstat',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='goal_stats', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='goalstat',
+            constraint=models.UniqueConstraint(fields=('user', 'category_key', 'week'), name='unique_goal_stat_bucket'),
+        ),
+        migrations.RunPython(backfill_goal_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goals', '0006_goalstat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goal',
+            name='previous',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='next', to='goals.goal'),
+        ),
+        migrations.AddField(
+            model_name='goal',
+            name='recurrence',
+            field=models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly')], default='weekly', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='goal',
+            name='rolled_over_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='goal',
+            index=models.Index(condition=models.Q(('recurring', True), ('rolled_over_at__isnull', True), ('status', 'completed')), fields=['id'], name='goal_rollover_due_idx'),
+        ),
+    ]
@@ -1,5 +1,23 @@
+from collections import defaultdict
+from datetime import timedelta
+
+import calendar
+
 from django.db import models
+from django.db.models import F, Q
 from django.conf import settings
+from django.utils import timezone
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    year = day.year + month // 12
+    month = month % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
 
 
 class Category(models.Model):
@@ -11,6 +29,9 @@ class Category(models.Model):
     class Meta:
         ordering = ['name']
         unique_together = [['user', 'name']]
+        indexes = [
+            models.Index(fields=['user', 'updated_at', 'id'], name='category_user_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -21,6 +42,11 @@ class Goal(models.Model):
         ('in_progress', 'In Progress'),
         ('completed', 'Completed'),
     ]
+    RECURRENCES = [
+        ('daily', 'Daily'),
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+    ]
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     title = models.CharField(max_length=200)
@@ -29,11 +55,121 @@ class Goal(models.Model):
     target_date = models.DateField(null=True, blank=True)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='goals')
     recurring = models.BooleanField(default=False)
+    recurrence = models.CharField(max_length=10, choices=RECURRENCES, default='weekly')
+    # The completed goal this one was rolled over from, see goals.tasks.
+    previous = models.OneToOneField('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='next')
+    rolled_over_at = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='goal_user_created_idx'),
+            models.Index(fields=['user', 'updated_at', 'id'], name='goal_user_updated_idx'),
+            models.Index(fields=['user', 'status', 'target_date'], name='goal_user_status_target_idx'),
+            # Only goals still waiting for rollover, so it stays small.
+            models.Index(
+                fields=['id'],
+                condition=Q(recurring=True, status='completed', rolled_over_at__isnull=True),
+                name='goal_rollover_due_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.get_status_display()})"
+
+    STATS_FIELDS = {'user_id', 'category_id', 'target_date', 'created_at', 'status', 'recurring'}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember which GoalStat bucket the stored row is counted in.
+        if not instance.get_deferred_fields() & cls.STATS_FIELDS:
+            instance._stats_key = instance.stats_key()
+        return instance
+
+    def next_target_date(self, today):
+        """The due date of the next period that does not lie in the past."""
+        due = self.target_date or timezone.localdate(self.created_at)
+        if self.recurrence == 'monthly':
+            periods = max(1, (today.year - due.year) * 12 + today.month - due.month)
+            while add_months(due, periods) < today:
+                periods += 1
+            return add_months(due, periods)
+        step = timedelta(days=1) if self.recurrence == 'daily' else timedelta(weeks=1)
+        return due + max(1, -((due - today) // step)) * step
+
+    def stats_key(self):
+        """The ``(user, category, week, completed, recurring)`` bucket this goal counts towards."""
+        if self.created_at is None:
+            return None
+        day = self.target_date or timezone.localdate(self.created_at)
+        return (
+            self.user_id,
+            self.category_id or 0,
+            week_start(day),
+            self.status == 'completed',
+            self.recurring,
+        )
+
+
+class GoalStatManager(models.Manager):
+    def record(self, removed=(), added=()):
+        """Move goals between buckets, given the old and new ``Goal.stats_key()`` of each."""
+        changes = defaultdict(lambda: [0, 0, 0, 0])
+        for keys, sign in ((removed, -1), (added, 1)):
+            for key in keys:
+                if key is None:
+                    continue
+                user_id, category_key, week, completed, recurring = key
+                counts = changes[(user_id, category_key, week)]
+                counts[0] += sign
+                counts[1] += sign * completed
+                counts[2] += sign * recurring
+                counts[3] += sign * (completed and recurring)
+        self.apply(changes)
+
+    def apply(self, changes):
+        """Add ``[total, completed, recurring_total, recurring_completed]`` deltas per bucket."""
+        changes = {bucket: counts for bucket, counts in changes.items() if any(counts)}
+        if not changes:
+            return
+        # Make sure every bucket has a row, then increment in place so
+        # concurrent writers never overwrite each other's counts.
+        self.bulk_create(
+            [self.model(user_id=user_id, category_key=category_key, week=week) for user_id, category_key, week in changes],
+            ignore_conflicts=True
+        )
+        for (user_id, category_key, week), (total, completed, recurring_total, recurring_completed) in changes.items():
+            self.filter(user_id=user_id, category_key=category_key, week=week).update(
+                total=F('total') + total,
+                completed=F('completed') + completed,
+                recurring_total=F('recurring_total') + recurring_total,
+                recurring_completed=F('recurring_completed') + recurring_completed,
+            )
+
+
+class GoalStat(models.Model):
+    """
+    Goal counts per user, category and week, kept up to date as goals change
+    (see ``goals.signals``) so analytics never scan the goals table.
+
+    ``category_key`` is the category id, or 0 for goals without one. The
+    week is the Monday of the goal's target date, or of its creation date
+    when it has none.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='goal_stats')
+    category_key = models.BigIntegerField(default=0)
+    week = models.DateField()
+    total = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    recurring_total = models.IntegerField(default=0)
+    recurring_completed = models.IntegerField(default=0)
+
+    objects = GoalStatManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category_key', 'week'], name='unique_goal_stat_bucket'),
+        ]
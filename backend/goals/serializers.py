@@ -9,15 +9,78 @@ class CategorySerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'created_at', 'updated_at']
 
 
+def expanded_fields(request):
+    """Names listed in ``?expand=``, e.g. ``?expand=category``."""
+    if request is None:
+        return set()
+    return {
+        name.strip()
+        for value in request.query_params.getlist('expand')
+        for name in value.split(',')
+        if name.strip()
+    }
+
+
+class CategoryResolver:
+    """
+    Look up the requesting user's categories by id.
+
+    All of the user's categories are loaded in one query the first time an
+    id is resolved; the resolver is kept on the serializer context so every
+    goal in a request (including many=True and batch payloads) shares it.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._categories = None
+
+    def get(self, pk):
+        if self._categories is None:
+            self._categories = Category.objects.filter(user=self.user).in_bulk()
+        return self._categories.get(pk)
+
+
+class UserCategoryField(serializers.PrimaryKeyRelatedField):
+    def get_queryset(self):
+        request = self.context.get('request')
+        if request is None:
+            return Category.objects.none()
+        return Category.objects.filter(user=request.user)
+
+    def get_resolver(self):
+        resolver = self.context.get('category_resolver')
+        if resolver is None:
+            resolver = CategoryResolver(self.context['request'].user)
+            self.context['category_resolver'] = resolver
+        return resolver
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if self.context.get('request') is None:
+            self.fail('does_not_exist', pk_value=data)
+        category = self.get_resolver().get(pk)
+        if category is None:
+            self.fail('does_not_exist', pk_value=data)
+        return category
+
+
 class GoalSerializer(serializers.ModelSerializer):
-    category = serializers.PrimaryKeyRelatedField(
-        queryset=Category.objects.all(),
-        allow_null=True,
-        required=False
-    )
+    category = UserCategoryField(allow_null=True, required=False)
 
     class Meta:
         model = Goal
         fields = ('id', 'title', 'description', 'status', 'target_date', 
-                 'category', 'recurring', 'created_at', 'updated_at')
-        read_only_fields = ('created_at', 'updated_at')
\ No newline at end of file
+                 'category', 'recurring', 'recurrence', 'previous', 'created_at', 'updated_at')
+        read_only_fields = ('previous', 'created_at', 'updated_at')
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if 'category' in expanded_fields(self.context.get('request')):
+            category = instance.category
+            data['category'] = {'id': category.id, 'name': category.name} if category else None
+        return data
@@ -0,0 +1,42 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from .models import Category, Goal, GoalStat
+
+
+@receiver(pre_save, sender=Goal)
+def load_previous_stats_key(sender, instance, **kwargs):
+    if instance._state.adding or hasattr(instance, '_stats_key'):
+        return
+    previous = Goal.objects.filter(pk=instance.pk).first()
+    instance._stats_key = previous._stats_key if previous else None
+
+
+@receiver(post_save, sender=Goal)
+def update_goal_stats(sender, instance, **kwargs):
+    previous = getattr(instance, '_stats_key', None)
+    current = instance.stats_key()
+    if previous != current:
+        GoalStat.objects.record(removed=[previous], added=[current])
+    instance._stats_key = current
+
+
+@receiver(post_delete, sender=Goal)
+def remove_goal_stats(sender, instance, origin=None, **kwargs):
+    # Deleting the account cascades to the stats rows as well.
+    if isinstance(origin, get_user_model()):
+        return
+    GoalStat.objects.record(removed=[getattr(instance, '_stats_key', instance.stats_key())])
+
+
+@receiver(pre_delete, sender=Category)
+def move_stats_of_deleted_category(sender, instance, origin=None, **kwargs):
+    # SET_NULL moves the category's goals to "no category" without signals.
+    if isinstance(origin, get_user_model()):
+        return
+    stats = GoalStat.objects.filter(user_id=instance.user_id, category_key=instance.pk)
+    GoalStat.objects.apply({
+        (instance.user_id, 0, stat.week): [stat.total, stat.completed, stat.recurring_total, stat.recurring_completed]
+        for stat in stats
+    })
+    stats.delete()
@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from django.db.models import OuterRef, Subquery, Sum
+from django.utils import timezone
+from .models import Category, Goal, GoalStat, week_start
+
+
+def completion_rate(completed, total):
+    return round(completed / total, 4) if total else None
+
+
+def recurring_streaks(weeks, current_week):
+    """
+    Return ``(current, longest)`` runs of consecutive weeks with a completed
+    recurring goal. The current streak is still alive if only this week is
+    missing so far.
+    """
+    done = sorted(week for week in weeks if week <= current_week)
+    longest = run = 0
+    previous = None
+    for week in done:
+        run = run + 1 if previous is not None and week - previous == timedelta(weeks=1) else 1
+        longest = max(longest, run)
+        previous = week
+    done = set(done)
+    week = current_week if current_week in done else current_week - timedelta(weeks=1)
+    current = 0
+    while week in done:
+        current += 1
+        week -= timedelta(weeks=1)
+    return current, longest
+
+
+def goal_stats(user, weeks=12):
+    """Summarize a user's goals from GoalStat in a fixed number of queries."""
+    today = timezone.localdate()
+    current_week = week_start(today)
+    stats = GoalStat.objects.filter(user=user)
+
+    categories = list(
+        stats.values('category_key')
+        .annotate(
+            name=Subquery(Category.objects.filter(pk=OuterRef('category_key')).values('name')[:1]),
+            total=Sum('total'),
+            completed=Sum('completed'),
+        )
+        .filter(total__gt=0)
+        .order_by('category_key')
+    )
+    by_week = list(
+        stats.values('week')
+        .annotate(total=Sum('total'), completed=Sum('completed'), recurring_completed=Sum('recurring_completed'))
+        .order_by('week')
+    )
+    overdue = Goal.objects.filter(user=user, status='in_progress', target_date__lt=today).count()
+
+    total = sum(row['total'] for row in categories)
+    completed = sum(row['completed'] for row in categories)
+    first_week = current_week - timedelta(weeks=weeks - 1)
+    current_streak, longest_streak = recurring_streaks(
+        [row['week'] for row in by_week if row['recurring_completed'] > 0], current_week
+    )
+    return {
+        'total': total,
+        'completed': completed,
+        'completion_rate': completion_rate(completed, total),
+        'overdue': overdue,
+        'categories': [
+            {
+                'category': row['category_key'] or None,
+                'name': row['name'],
+                'total': row['total'],
+                'completed': row['completed'],
+                'completion_rate': completion_rate(row['completed'], row['total']),
+            }
+            for row in categories
+        ],
+        'weeks': [
+            {
+                'week': row['week'],
+                'total': row['total'],
+                'completed': row['completed'],
+                'completion_rate': completion_rate(row['completed'], row['total']),
+            }
+            for row in by_week
+            if first_week <= row['week'] <= current_week and row['total']
+        ],
+        'recurring_streak': {'current': current_streak, 'longest': longest_streak},
+    }
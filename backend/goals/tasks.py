@@ -0,0 +1,82 @@
+import calendar
+from datetime import datetime, time, timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from core.signals import bump_versions_on_commit
+from .models import Goal, GoalStat, add_months
+
+
+def last_ended_start(recurrence, today):
+    """The latest day a period of ``recurrence`` can start on and have ended by ``today``."""
+    if recurrence == 'daily':
+        return today - timedelta(days=1)
+    if recurrence == 'weekly':
+        return today - timedelta(weeks=1)
+    if today.day == calendar.monthrange(today.year, today.month)[1]:
+        # add_months clamps, so periods from the 29th-31st of the previous month end today too.
+        return today.replace(day=1) - timedelta(days=1)
+    return add_months(today, -1)
+
+
+def undated_due(today):
+    """Goals without a target date whose first period, from the day they were created, has ended."""
+    due = Q()
+    for recurrence, _ in Goal.RECURRENCES:
+        cutoff = last_ended_start(recurrence, today) + timedelta(days=1)
+        due |= Q(recurrence=recurrence, created_at__lt=timezone.make_aware(datetime.combine(cutoff, time.min)))
+    return Q(target_date__isnull=True) & due
+
+
+@shared_task
+def rollover_recurring_goals(chunk_size=None):
+    """
+    Start the next period of every completed recurring goal whose period
+    has ended: a fresh in-progress copy is created with ``previous`` pointing
+    at the completed goal, which keeps its history.
+
+    Due goals are walked in primary-key chunks, each in its own short
+    transaction that locks only that chunk (skipping rows another run holds),
+    bulk-inserts the copies and marks the originals with ``rolled_over_at``.
+    A crash rolls back the current chunk only, so rerunning is safe.
+    """
+    chunk_size = chunk_size or settings.GOAL_ROLLOVER_CHUNK_SIZE
+    now = timezone.now()
+    today = timezone.localdate(now)
+    due = Goal.objects.filter(recurring=True, status='completed', rolled_over_at__isnull=True).filter(
+        Q(target_date__lt=today) | undated_due(today)
+    )
+    last_id = 0
+    created = 0
+    while True:
+        with transaction.atomic():
+            chunk = list(due.filter(pk__gt=last_id).order_by('pk').select_for_update(skip_locked=True)[:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1].pk
+            # previous is unique; never copy a goal twice, e.g. if its
+            # rolled_over_at was cleared by hand.
+            existing = set(Goal.objects.filter(previous__in=chunk).values_list('previous_id', flat=True))
+            copies = Goal.objects.bulk_create([
+                Goal(
+                    user_id=goal.user_id,
+                    title=goal.title,
+                    description=goal.description,
+                    category_id=goal.category_id,
+                    recurring=True,
+                    recurrence=goal.recurrence,
+                    target_date=goal.next_target_date(today),
+                    previous=goal,
+                )
+                for goal in chunk
+                if goal.pk not in existing
+            ])
+            Goal.objects.filter(pk__in=[goal.pk for goal in chunk]).update(rolled_over_at=now)
+            GoalStat.objects.record(added=[goal.stats_key() for goal in copies])
+            for user_id in {goal.user_id for goal in copies}:
+                bump_versions_on_commit(user_id, ('goals',))
+            created += len(copies)
+    return created
@@ -1,9 +1,14 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
-from rest_framework.test import APIClient
+from django.db.models import Sum
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
 from rest_framework import status
 from django.urls import reverse
-from .models import Goal
+from django.utils import timezone
+from .models import Goal, Category, GoalStat
+from .serializers import GoalSerializer
+from .tasks import last_ended_start, rollover_recurring_goals
 import datetime
 
 User = get_user_model()
@@ -66,8 +71,8 @@ class GoalAPITests(TestCase):
         url = reverse('goal-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['title'], self.goal_data['title'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['title'], self.goal_data['title'])
 
     def test_update_goal(self):
         goal = Goal.objects.create(user=self.user, **self.goal_data)
@@ -107,3 +112,215 @@ class GoalAPITests(TestCase):
         url = reverse('goal-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class GoalCategoryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.category = Category.objects.create(user=self.user, name='Health')
+
+    def test_categories_route_is_not_shadowed(self):
+        response = self.client.get(reverse('category-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['name'], 'Health')
+
+    def test_cannot_use_other_users_category(self):
+        other_user = User.objects.create_user(email='other@example.com', password='otherpass123')
+        other_category = Category.objects.create(user=other_user, name='Private')
+        response = self.client.post(reverse('goal-list'), {'title': 'Run', 'category': other_category.id})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('category', response.data)
+
+    def test_expand_category(self):
+        Goal.objects.create(user=self.user, title='Run', category=self.category)
+        Goal.objects.create(user=self.user, title='Read')
+        response = self.client.get(reverse('goal-list'), {'expand': 'category'})
+        self.assertEqual(
+            [goal['category'] for goal in response.data['results']],
+            [None, {'id': self.category.id, 'name': 'Health'}]
+        )
+
+    def test_expanded_list_uses_fixed_queries(self):
+        for i in range(20):
+            category = Category.objects.create(user=self.user, name=f'Category {i}')
+            Goal.objects.create(user=self.user, title=f'Goal {i}', category=category)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('goal-list'), {'expand': 'category'})
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_many_goals_resolve_categories_in_one_query(self):
+        request = APIRequestFactory().post('/')
+        force_authenticate(request, user=self.user)
+        data = [{'title': f'Goal {i}', 'category': self.category.id} for i in range(10)]
+        serializer = GoalSerializer(data=data, many=True, context={'request': Request(request)})
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+
+
+class GoalStatsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('goal-stats')
+        self.today = timezone.localdate()
+        self.category = Category.objects.create(user=self.user, name='Health')
+
+    def stats(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_stats_follow_goal_changes(self):
+        run = Goal.objects.create(user=self.user, title='Run', category=self.category)
+        Goal.objects.create(user=self.user, title='Read')
+        data = self.stats()
+        self.assertEqual((data['total'], data['completed'], data['completion_rate']), (2, 0, 0.0))
+
+        run.status = 'completed'
+        run.save()
+        data = self.stats()
+        self.assertEqual((data['total'], data['completed'], data['completion_rate']), (2, 1, 0.5))
+        self.assertEqual(
+            [(row['category'], row['name'], row['completion_rate']) for row in data['categories']],
+            [(None, None, 0.0), (self.category.id, 'Health', 1.0)]
+        )
+        self.assertEqual([(row['total'], row['completed']) for row in data['weeks']], [(2, 1)])
+
+        run.delete()
+        data = self.stats()
+        self.assertEqual((data['total'], data['completed']), (1, 0))
+
+    def test_matches_goal_table_after_edits(self):
+        goals = [
+            Goal.objects.create(user=self.user, title=f'Goal {i}', target_date=self.today - datetime.timedelta(weeks=i))
+            for i in range(6)
+        ]
+        for goal in goals[::2]:
+            goal.status = 'completed'
+            goal.category = self.category
+            goal.save()
+        Goal.objects.get(pk=goals[1].pk).delete()
+        self.category.delete()
+        expected = sorted(
+            (goal.target_date - datetime.timedelta(days=goal.target_date.weekday()), goal.status == 'completed')
+            for goal in Goal.objects.filter(user=self.user)
+        )
+        self.assertEqual(
+            sorted((stat.week, bool(stat.completed)) for stat in GoalStat.objects.filter(total__gt=0)),
+            expected
+        )
+        self.assertEqual(list(GoalStat.objects.values_list('category_key', flat=True).distinct()), [0])
+
+    def test_overdue(self):
+        Goal.objects.create(user=self.user, title='Late', target_date=self.today - datetime.timedelta(days=1))
+        Goal.objects.create(user=self.user, title='Done', status='completed', target_date=self.today - datetime.timedelta(days=1))
+        Goal.objects.create(user=self.user, title='Upcoming', target_date=self.today + datetime.timedelta(days=1))
+        self.assertEqual(self.stats()['overdue'], 1)
+
+    def test_recurring_streak(self):
+        for weeks_ago in (0, 1, 2, 4, 5, 6, 7):
+            Goal.objects.create(
+                user=self.user, title='Workout', recurring=True, status='completed',
+                target_date=self.today - datetime.timedelta(weeks=weeks_ago)
+            )
+        self.assertEqual(self.stats()['recurring_streak'], {'current': 3, 'longest': 4})
+
+    def test_stats_use_fixed_queries(self):
+        for i in range(30):
+            Goal.objects.create(user=self.user, title=f'Goal {i}', target_date=self.today - datetime.timedelta(weeks=i))
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+
+    def test_batch_updates_stats(self):
+        goal = Goal.objects.create(user=self.user, title='Run')
+        operations = [
+            {'op': 'create', 'resource': 'goal', 'data': {'title': 'Read', 'status': 'completed'}},
+            {'op': 'update', 'resource': 'goal', 'id': goal.id, 'data': {'status': 'completed'}},
+        ]
+        self.client.post(reverse('batch'), {'operations': operations}, format='json')
+        data = self.stats()
+        self.assertEqual((data['total'], data['completed']), (2, 2))
+
+    def test_deleting_account_clears_stats(self):
+        Goal.objects.create(user=self.user, title='Run', category=self.category)
+        self.user.delete()
+        self.assertFalse(GoalStat.objects.exists())
+
+
+class GoalRolloverTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.today = timezone.localdate()
+
+    def create_goal(self, **kwargs):
+        defaults = {'user': self.user, 'title': 'Workout', 'recurring': True, 'status': 'completed'}
+        defaults.update(kwargs)
+        return Goal.objects.create(**defaults)
+
+    def test_rolls_over_completed_recurring_goals(self):
+        last_week = self.today - datetime.timedelta(days=7)
+        weekly = self.create_goal(target_date=last_week)
+        monthly = self.create_goal(recurrence='monthly', target_date=datetime.date(2024, 1, 31))
+        self.create_goal(status='in_progress', target_date=last_week)
+        self.create_goal(recurring=False, target_date=last_week)
+        self.create_goal(target_date=self.today)
+
+        self.assertEqual(rollover_recurring_goals(chunk_size=1), 2)
+
+        copy = weekly.next
+        self.assertEqual((copy.status, copy.title, copy.recurring), ('in_progress', 'Workout', True))
+        self.assertEqual(copy.target_date, self.today)
+        self.assertGreaterEqual(monthly.next.target_date, self.today)
+        self.assertLess(monthly.next.target_date - self.today, datetime.timedelta(days=31))
+        self.assertIn(monthly.next.target_date.day, (28, 29, 30, 31))
+        weekly.refresh_from_db()
+        self.assertIsNotNone(weekly.rolled_over_at)
+
+    def test_undated_goals_roll_over_once_their_period_ends(self):
+        def created(goal, days_ago):
+            Goal.objects.filter(pk=goal.pk).update(created_at=timezone.now() - datetime.timedelta(days=days_ago))
+            return goal
+        mid_week = created(self.create_goal(), 3)
+        past_week = created(self.create_goal(), 8)
+        mid_month = created(self.create_goal(recurrence='monthly'), 20)
+        daily = created(self.create_goal(recurrence='daily'), 1)
+
+        self.assertEqual(rollover_recurring_goals(), 2)
+        self.assertEqual(
+            set(Goal.objects.filter(previous__isnull=False).values_list('previous', flat=True)), {past_week.pk, daily.pk}
+        )
+        self.assertFalse(Goal.objects.filter(previous__in=[mid_week, mid_month]).exists())
+
+    def test_monthly_periods_end_with_clamped_month_ends(self):
+        self.assertEqual(last_ended_start('monthly', datetime.date(2023, 2, 28)), datetime.date(2023, 1, 31))
+        self.assertEqual(last_ended_start('monthly', datetime.date(2024, 3, 30)), datetime.date(2024, 2, 29))
+        self.assertEqual(last_ended_start('monthly', datetime.date(2024, 1, 15)), datetime.date(2023, 12, 15))
+        self.assertEqual(last_ended_start('weekly', datetime.date(2024, 1, 15)), datetime.date(2024, 1, 8))
+
+    def test_rerun_does_not_duplicate(self):
+        goal = self.create_goal(target_date=self.today - datetime.timedelta(days=1))
+        self.assertEqual(rollover_recurring_goals(), 1)
+        self.assertEqual(rollover_recurring_goals(), 0)
+        Goal.objects.filter(pk=goal.pk).update(rolled_over_at=None)
+        self.assertEqual(rollover_recurring_goals(), 0)
+        self.assertEqual(Goal.objects.filter(previous=goal).count(), 1)
+
+    def test_rollover_updates_stats(self):
+        self.create_goal(target_date=self.today - datetime.timedelta(days=1))
+        rollover_recurring_goals()
+        self.assertEqual(
+            GoalStat.objects.aggregate(total=Sum('total'), completed=Sum('completed')),
+            {'total': 2, 'completed': 1}
+        )
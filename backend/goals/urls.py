@@ -3,8 +3,9 @@ from rest_framework.routers import DefaultRouter
 from . import views
 
 router = DefaultRouter()
-router.register(r'', views.GoalViewSet, basename='goal')
+# categories must come first, or the goal detail route swallows it.
 router.register(r'categories', views.CategoryViewSet, basename='category')
+router.register(r'', views.GoalViewSet, basename='goal')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,9 +1,15 @@
 from rest_framework import viewsets, permissions
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from core.cache import CachedListMixin
+from core.pagination import CreatedAtKeysetPagination
 from .models import Goal, Category
-from .serializers import GoalSerializer, CategorySerializer
+from .serializers import GoalSerializer, CategorySerializer, expanded_fields
+from .stats import goal_stats
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CachedListMixin, viewsets.ModelViewSet):
+    cache_resource = 'categories'
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -14,12 +20,26 @@ class CategoryViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class GoalViewSet(viewsets.ModelViewSet):
+class GoalViewSet(CachedListMixin, viewsets.ModelViewSet):
+    cache_resource = 'goals'
+    pagination_class = CreatedAtKeysetPagination
     serializer_class = GoalSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Goal.objects.filter(user=self.request.user)
+        queryset = Goal.objects.filter(user=self.request.user)
+        if 'category' in expanded_fields(self.request):
+            queryset = queryset.select_related('category')
+        return queryset
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """Completion rates per category and week, overdue count and recurring streaks."""
+        try:
+            weeks = max(1, min(int(request.query_params.get('weeks', 12)), 104))
+        except ValueError:
+            weeks = 12
+        return Response(goal_stats(request.user, weeks=weeks))
@@ -0,0 +1,134 @@
+"""
+Local keyword extraction and extractive summaries.
+
+Keywords are the transcript's terms ranked by TF-IDF against the user's own
+reflections, so words they use every day rank below what is particular to
+this entry. The summary is the highest-scoring sentences in their original
+order. Document frequencies live in ``TermFrequency`` and are adjusted as
+reflections are analyzed or deleted.
+"""
+import re
+from collections import Counter
+
+import numpy as np
+from django.db import transaction
+from .models import Reflection, ReflectionKeyword, TermFrequency
+
+MAX_KEYWORDS = 5
+SUMMARY_SENTENCES = 2
+
+TOKEN_RE = re.compile(r"[a-z][a-z']*[a-z]")
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+STOPWORDS = frozenset('''
+    about above after again against all also and any are aren't because been before being below between both but
+    can can't cannot could couldn't did didn't does doesn't doing don't down during each few for from further get
+    got had hadn't has hasn't have haven't having her here hers herself him himself his how i'd i'll i'm i've into
+    isn't it's its itself just let's like more most much must mustn't myself nor not now off once only other ought
+    our ours ourselves out over own really same she she'd she'll she's should shouldn't some such than that that's
+    the their theirs them themselves then there there's these they they'd they'll they're they've this those
+    through too under until very was wasn't we'd we'll we're we've were weren't what what's when when's where
+    where's which while who who's whom why why's will with won't would wouldn't you you'd you'll you're you've your
+    yours yourself yourselves yeah okay well thing things lot going gonna want
+'''.split())
+
+
+def tokenize(text):
+    return [
+        token for token in TOKEN_RE.findall((text or '').lower())
+        if 2 < len(token) <= 50 and token not in STOPWORDS
+    ]
+
+
+def split_sentences(text):
+    return [sentence.strip() for sentence in SENTENCE_RE.split((text or '').strip()) if sentence.strip()]
+
+
+def inverse_document_frequency(frequencies, documents):
+    return np.log((1 + documents) / (1 + np.asarray(frequencies, dtype=np.float64))) + 1
+
+
+def summarize(text, frequencies, documents, max_keywords=MAX_KEYWORDS, summary_sentences=SUMMARY_SENTENCES):
+    """
+    Return ``(keywords, summary)`` for ``text`` given the corpus document
+    frequency of each term and the number of documents in the corpus.
+    """
+    sentences = split_sentences(text)
+    sentence_tokens = [tokenize(sentence) for sentence in sentences]
+    vocabulary = sorted({token for tokens in sentence_tokens for token in tokens})
+    if not vocabulary:
+        return [], ' '.join(sentences[:summary_sentences])
+    index = {term: column for column, term in enumerate(vocabulary)}
+    # Sentence x term counts; everything below is array arithmetic on it.
+    counts = np.zeros((len(sentences), len(vocabulary)))
+    for row, tokens in enumerate(sentence_tokens):
+        np.add.at(counts[row], [index[token] for token in tokens], 1)
+    term_counts = counts.sum(axis=0)
+    idf = inverse_document_frequency([frequencies.get(term, 1) for term in vocabulary], max(documents, 1))
+    weights = term_counts / term_counts.sum() * idf
+    keywords = [vocabulary[column] for column in np.argsort(-weights, kind='stable')[:max_keywords]]
+    scores = (counts > 0) @ weights / np.sqrt(np.maximum(counts.sum(axis=1), 1))
+    chosen = sorted(np.argsort(-scores, kind='stable')[:summary_sentences])
+    return keywords, ' '.join(sentences[row] for row in chosen)
+
+
+def analyze_reflection(reflection, text):
+    """
+    Set ``keywords``, ``ai_summary`` and ``terms`` from ``text`` (pass '' for
+    reflections without a usable transcript), moving the user's document
+    frequencies from the old term set to the new one. Call inside the
+    transaction that saves the reflection.
+    """
+    previous = set(reflection.terms or [])
+    current = set(tokenize(text))
+    TermFrequency.objects.record(reflection.user_id, removed=previous - current, added=current - previous)
+    if bool(previous) != bool(current):
+        TermFrequency.objects.record_document(reflection.user_id, 1 if current else -1)
+    reflection.terms = sorted(current)
+    if not current:
+        reflection.keywords = []
+        reflection.ai_summary = ' '.join(split_sentences(text)[:SUMMARY_SENTENCES])
+        return
+    frequencies, documents = TermFrequency.objects.lookup(reflection.user_id, current)
+    reflection.keywords, reflection.ai_summary = summarize(text, frequencies, documents)
+
+
+def reanalyze_user(user, skip_transcriptions=()):
+    """
+    Rebuild a user's document frequencies from scratch and re-score all of
+    their reflections against them, as one batch. Returns the number of
+    reflections analyzed.
+    """
+    from core.signals import bump_versions_on_commit
+    from . import search, similarity
+
+    with transaction.atomic():
+        reflections = list(
+            Reflection.objects.filter(user=user).exclude(transcription='').select_for_update()
+        )
+        # Skipped placeholders are analyzed as '', like analyze_reflection does for them.
+        texts = [
+            '' if reflection.transcription in skip_transcriptions else reflection.transcription
+            for reflection in reflections
+        ]
+        term_sets = [set(tokenize(text)) for text in texts]
+        frequencies = Counter(term for terms in term_sets for term in terms)
+        documents = sum(1 for terms in term_sets if terms)
+        TermFrequency.objects.filter(user=user).delete()
+        TermFrequency.objects.bulk_create(
+            [TermFrequency(user=user, term=term, documents=count) for term, count in frequencies.items()]
+            + [TermFrequency(user=user, term=TermFrequency.DOCUMENTS, documents=documents)],
+            batch_size=1000
+        )
+        for reflection, text, terms in zip(reflections, texts, term_sets):
+            reflection.terms = sorted(terms)
+            if terms:
+                reflection.keywords, reflection.ai_summary = summarize(text, frequencies, documents)
+            else:
+                reflection.keywords = []
+                reflection.ai_summary = ' '.join(split_sentences(text)[:SUMMARY_SENTENCES])
+        Reflection.objects.bulk_update(reflections, ['terms', 'keywords', 'ai_summary'], batch_size=500)
+        ReflectionKeyword.objects.rebuild(user.pk, reflections)
+        search.index_reflections(reflections)
+        similarity.update_vectors(reflections, texts)
+        bump_versions_on_commit(user.pk, ('reflections',))
+    return len(reflections)
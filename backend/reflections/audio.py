@@ -0,0 +1,189 @@
+import wave
+from collections import namedtuple
+
+import numpy as np
+
+AudioWindow = namedtuple(
+    'AudioWindow',
+    ['index', 'start', 'end', 'sample_rate', 'channels', 'sample_width', 'frames']
+)
+
+
+class AudioDecodeError(Exception):
+    pass
+
+
+def open_wav(fileobj):
+    try:
+        return wave.open(fileobj, 'rb')
+    except (wave.Error, EOFError) as exc:
+        raise AudioDecodeError(str(exc)) from exc
+
+
+def iter_windows(fileobj, window_seconds):
+    """
+    Decode a PCM WAV file sequentially, yielding fixed-length windows so that
+    only one window of samples is held in memory at a time.
+    """
+    with open_wav(fileobj) as reader:
+        sample_rate = reader.getframerate()
+        channels = reader.getnchannels()
+        sample_width = reader.getsampwidth()
+        window_frames = max(1, int(window_seconds * sample_rate))
+        index = 0
+        position = 0
+        while True:
+            try:
+                frames = reader.readframes(window_frames)
+            except (wave.Error, EOFError) as exc:
+                raise AudioDecodeError(str(exc)) from exc
+            if not frames:
+                break
+            count = len(frames) // (channels * sample_width)
+            yield AudioWindow(
+                index=index,
+                start=position / sample_rate,
+                end=(position + count) / sample_rate,
+                sample_rate=sample_rate,
+                channels=channels,
+                sample_width=sample_width,
+                frames=frames,
+            )
+            index += 1
+            position += count
+
+
+def pcm_to_float(frames, sample_width, channels):
+    """Convert interleaved PCM bytes to a float32 ``(frames, channels)`` array in [-1, 1)."""
+    if sample_width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif sample_width == 2:
+        samples = np.frombuffer(frames, dtype='<i2').astype(np.float32) / 32768
+    elif sample_width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        values = np.where(values & 0x800000, values - 0x1000000, values)
+        samples = values.astype(np.float32) / 8388608
+    elif sample_width == 4:
+        samples = np.frombuffer(frames, dtype='<i4').astype(np.float32) / 2147483648
+    else:
+        raise AudioDecodeError(f'Unsupported sample width: {sample_width} bytes')
+    return samples.reshape(-1, channels)
+
+
+class Resampler:
+    """
+    Streaming sample-rate converter for mono float blocks.
+
+    Downsampling runs a windowed-sinc low-pass first so content above the
+    new Nyquist frequency does not alias, then interpolates linearly at the
+    output sample times. Filter history and the fractional read position
+    carry over between blocks, so block boundaries leave no seams.
+    """
+
+    def __init__(self, source_rate, target_rate, taps=63):
+        self.step = source_rate / target_rate
+        if self.step > 1:
+            cutoff = 0.45 / self.step
+            n = np.arange(taps) - (taps - 1) / 2
+            kernel = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+            self.kernel = (kernel / kernel.sum()).astype(np.float32)
+        else:
+            self.kernel = None
+        self.history = np.zeros(taps - 1 if self.kernel is not None else 0, dtype=np.float32)
+        self.consumed = 0
+        self.next_time = 0.0
+        self.last = np.float32(0)
+
+    def process(self, block):
+        if self.kernel is not None:
+            padded = np.concatenate([self.history, block])
+            self.history = padded[len(padded) - len(self.history):]
+            block = np.convolve(padded, self.kernel, mode='valid').astype(np.float32)
+        if not len(block):
+            return block
+        # buffer[0] is the last sample of the previous block.
+        buffer = np.concatenate([[self.last], block])
+        end = self.consumed + len(block) - 1
+        count = int(np.floor((end - self.next_time) / self.step)) + 1 if self.next_time <= end else 0
+        times = self.next_time + self.step * np.arange(count)
+        output = np.interp(times - (self.consumed - 1), np.arange(len(buffer)), buffer).astype(np.float32)
+        self.next_time += self.step * count
+        self.consumed += len(block)
+        self.last = block[-1]
+        return output
+
+
+def normalize_wav(fileobj, out, sample_rate=16000, block_seconds=10):
+    """
+    Write ``fileobj`` to ``out`` as 16-bit mono PCM WAV at ``sample_rate``.
+
+    The input is decoded in ``block_seconds`` blocks, so memory use does not
+    grow with the length of the recording. Returns the number of frames
+    written.
+    """
+    written = 0
+    resampler = None
+    with wave.open(out, 'wb') as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(sample_rate)
+        for window in iter_windows(fileobj, block_seconds):
+            if resampler is None:
+                resampler = Resampler(window.sample_rate, sample_rate)
+            mono = pcm_to_float(window.frames, window.sample_width, window.channels).mean(axis=1)
+            samples = resampler.process(mono)
+            writer.writeframes((np.clip(samples, -1, 32767 / 32768) * 32768).astype('<i2').tobytes())
+            written += len(samples)
+    return written
+
+
+def is_normalized(fileobj, sample_rate=16000):
+    with open_wav(fileobj) as reader:
+        return (reader.getnchannels(), reader.getsampwidth(), reader.getframerate()) == (1, 2, sample_rate)
+
+
+# Samples per min/max pair at each zoom level; each is a multiple of the first.
+PEAK_LEVELS = (256, 1024, 4096, 16384)
+
+
+def compute_peaks(fileobj, levels=PEAK_LEVELS, block_seconds=10):
+    """
+    Return ``(sample_rate, {samples_per_peak: bytes})`` for a WAV file.
+
+    Each level is an int8 array of interleaved ``min, max`` pairs scaled to
+    [-127, 127]. Only the finest level is computed from the samples, block
+    by block; coarser ones are reduced from it.
+    """
+    base = levels[0]
+    sample_rate = 0
+    mins, maxs = [], []
+    carry = np.zeros(0, dtype=np.float32)
+    for window in iter_windows(fileobj, block_seconds):
+        sample_rate = window.sample_rate
+        samples = np.concatenate([carry, pcm_to_float(window.frames, window.sample_width, window.channels).mean(axis=1)])
+        usable = len(samples) // base * base
+        bins = samples[:usable].reshape(-1, base)
+        mins.append(bins.min(axis=1))
+        maxs.append(bins.max(axis=1))
+        carry = samples[usable:]
+    if len(carry):
+        mins.append(np.array([carry.min()]))
+        maxs.append(np.array([carry.max()]))
+    low = np.concatenate(mins) if mins else np.zeros(0, dtype=np.float32)
+    high = np.concatenate(maxs) if maxs else np.zeros(0, dtype=np.float32)
+
+    peaks = {}
+    for samples_per_peak in levels:
+        if len(low):
+            starts = np.arange(0, len(low), samples_per_peak // base)
+            level_low = np.minimum.reduceat(low, starts)
+            level_high = np.maximum.reduceat(high, starts)
+        else:
+            level_low = level_high = low
+        pairs = np.stack([
+            np.clip(np.floor(level_low * 127), -127, 127),
+            np.clip(np.ceil(level_high * 127), -127, 127),
+        ], axis=1)
+        peaks[samples_per_peak] = pairs.astype(np.int8).tobytes()
+    return sample_rate, peaks
@@ -0,0 +1,82 @@
+import json
+import time
+
+import redis.asyncio as redis_asyncio
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django_redis import get_redis_connection
+from rest_framework.utils.encoders import JSONEncoder
+from .models import Reflection
+from .serializers import ReflectionSerializer
+
+TRANSCRIPTION_EVENT = 'transcription'
+
+
+def channel_name(user_id):
+    return f'reflections:events:{user_id}'
+
+
+def transcription_payload(reflection):
+    return {'id': reflection.pk, 'status': reflection.status, 'reflection': ReflectionSerializer(reflection).data}
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, cls=JSONEncoder)}\n\n'
+
+
+def publish_transcription(reflection):
+    """Announce a finished (or failed) transcript to the owner's event streams once the transaction commits."""
+    message = json.dumps(
+        {'event': TRANSCRIPTION_EVENT, 'data': transcription_payload(reflection)}, cls=JSONEncoder
+    )
+    channel = channel_name(reflection.user_id)
+    transaction.on_commit(lambda: get_redis_connection('default').publish(channel, message))
+
+
+def finished_transcriptions(user_id, reflection_ids):
+    reflections = Reflection.objects.filter(user_id=user_id, pk__in=reflection_ids, status__in=('done', 'failed'))
+    return [transcription_payload(reflection) for reflection in reflections]
+
+
+def connect():
+    # Pub/sub channels are server-wide, so the database number does not matter.
+    return redis_asyncio.from_url(settings.REDIS_URL)
+
+
+async def stream_events(user_id, pending_ids=()):
+    """
+    Yield server-sent events for a user's reflections until the client goes
+    away or the stream is ``REFLECTION_EVENTS_MAX_AGE`` seconds old.
+    Reflections in ``pending_ids`` that finished before the subscription
+    started are sent first, so none can be missed.
+
+    Django before 5.0 never cancels a streaming response whose client has
+    disconnected, so the age limit is what ends abandoned streams there;
+    EventSource reconnects on its own after the stream closes.
+    """
+    deadline = time.monotonic() + settings.REFLECTION_EVENTS_MAX_AGE
+    client = connect()
+    pubsub = client.pubsub()
+    try:
+        await pubsub.subscribe(channel_name(user_id))
+        yield f'retry: {settings.REFLECTION_EVENTS_RETRY_MS}\n\n'
+        if pending_ids:
+            for data in await sync_to_async(finished_transcriptions)(user_id, pending_ids):
+                yield format_event(TRANSCRIPTION_EVENT, data)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=min(settings.REFLECTION_EVENTS_HEARTBEAT, remaining)
+            )
+            if message is None:
+                # Keeps proxies from closing an idle connection.
+                yield ': keep-alive\n\n'
+                continue
+            payload = json.loads(message['data'])
+            yield format_event(payload['event'], payload['data'])
+    finally:
+        await pubsub.aclose()
+        await client.aclose()
@@ -0,0 +1,73 @@
+import json
+import os
+import tempfile
+import time
+import wave
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+from reflections.transcription import transcribe_file
+
+
+def write_recording(fileobj, seconds, sample_rate=16000, seed=0):
+    """Write ``seconds`` of 16-bit mono noise, one second at a time."""
+    rng = np.random.default_rng(seed)
+    with wave.open(fileobj, 'wb') as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(sample_rate)
+        for _ in range(seconds):
+            writer.writeframes(rng.integers(-12000, 12000, sample_rate, dtype='<i2').tobytes())
+
+
+class Command(BaseCommand):
+    help = (
+        'Time transcribing one synthetic recording with different numbers of workers '
+        'and report the speedup over a single worker as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=int, default=1200, help='Length of the recording (default 20 minutes)')
+        parser.add_argument(
+            '--workers', default=f'1,{os.cpu_count() or 1}',
+            help='Comma-separated worker counts to compare (default 1 and the number of cores)'
+        )
+        parser.add_argument('--engine', default=None, help='Engine class path (default TRANSCRIPTION_ENGINE)')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per worker count; the fastest is kept')
+
+    def handle(self, *args, **options):
+        try:
+            worker_counts = sorted({int(count) for count in options['workers'].split(',')})
+        except ValueError:
+            raise CommandError('--workers must be a comma-separated list of numbers.')
+        if options['seconds'] < 1 or options['repeat'] < 1 or worker_counts[0] < 1:
+            raise CommandError('--seconds, --repeat and every worker count must be at least 1.')
+        engine = import_string(options['engine'] or settings.TRANSCRIPTION_ENGINE)()
+
+        report = {
+            'engine': engine.version_key,
+            'executor': engine.executor,
+            'seconds': options['seconds'],
+            'window_seconds': settings.TRANSCRIPTION_WINDOW_SECONDS,
+            'cores': os.cpu_count(),
+            'runs': {},
+        }
+        with tempfile.TemporaryFile() as recording:
+            write_recording(recording, options['seconds'])
+            for workers in worker_counts:
+                # Pools are kept by the worker process; start this one outside the timings.
+                recording.seek(0)
+                transcribe_file(recording, engine=engine, workers=workers)
+                timings = []
+                for _ in range(options['repeat']):
+                    recording.seek(0)
+                    start = time.perf_counter()
+                    transcribe_file(recording, engine=engine, workers=workers)
+                    timings.append(time.perf_counter() - start)
+                report['runs'][workers] = {'seconds': round(min(timings), 3)}
+        serial = report['runs'][worker_counts[0]]['seconds']
+        for run in report['runs'].values():
+            run['speedup'] = round(serial / run['seconds'], 2) if run['seconds'] else None
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,22 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from reflections.analysis import reanalyze_user
+from reflections.tasks import NO_AUDIO_MESSAGE, UNDECODABLE_AUDIO_MESSAGE
+
+
+class Command(BaseCommand):
+    help = "Rebuild term frequencies and recompute keywords and summaries for users' reflections"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='emails', help='Only this user (repeatable)')
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.filter(reflection__isnull=False).distinct().order_by('pk')
+        if options['emails']:
+            users = users.filter(email__in=options['emails'])
+        total = 0
+        for user in users.iterator():
+            count = reanalyze_user(user, skip_transcriptions=(NO_AUDIO_MESSAGE, UNDECODABLE_AUDIO_MESSAGE))
+            total += count
+            self.stdout.write(f'{user.email}: {count} reflections')
+        self.stdout.write(self.style.SUCCESS(f'Reanalyzed {total} reflections.'))
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reflections', '0003_audioupload'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='reflection',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+        migrations.AddIndex(
+            model_name='reflection',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='reflection_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:15
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            "UPDATE reflections_reflection SET search_vector = "
+            "setweight(to_tsvector('english', coalesce(transcription, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(ai_summary, '')), 'B')"
+        )
+        schema_editor.execute(
+            "CREATE INDEX reflection_search_vector_idx ON reflections_reflection USING gin (search_vector)"
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE reflections_reflection_fts "
+            "USING fts5(transcription, ai_summary, tokenize='porter unicode61')"
+        )
+        schema_editor.execute(
+            "INSERT INTO reflections_reflection_fts (rowid, transcription, ai_summary) "
+            "SELECT id, transcription, ai_summary FROM reflections_reflection"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS reflection_search_vector_idx")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS reflections_reflection_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reflections', '0004_alter_reflection_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reflection',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
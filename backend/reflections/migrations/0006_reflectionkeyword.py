@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_keyword_index(apps, schema_editor):
+    Reflection = apps.get_model('reflections', 'Reflection')
+    ReflectionKeyword = apps.get_model('reflections', 'ReflectionKeyword')
+    batch = []
+    rows = Reflection.objects.exclude(keywords=[]).values_list('id', 'user_id', 'keywords')
+    for reflection_id, user_id, keywords in rows.iterator(chunk_size=2000):
+        normalized = {' '.join(str(keyword).lower().split())[:100] for keyword in keywords or []} - {''}
+        batch.extend(
+            ReflectionKeyword(user_id=user_id, reflection_id=reflection_id, keyword=keyword)
+            for keyword in normalized
+        )
+        if len(batch) >= 2000:
+            ReflectionKeyword.objects.bulk_create(batch)
+            batch = []
+    ReflectionKeyword.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('reflections', '0005_reflection_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReflectionKeyword',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('keyword', models.CharField(max_length=100)),
+                ('reflection', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='keyword_index', to='reflections.reflection')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'keyword'], name='reflection_keyword_user_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='reflectionkeyword',
+            constraint=models.UniqueConstraint(fields=('reflection', 'keyword'), name='unique_reflection_keyword'),
+        ),
+        migrations.RunPython(backfill_keyword_index, migrations.RunPython.noop),
+    ]
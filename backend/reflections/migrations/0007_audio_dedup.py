@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reflections', '0006_reflectionkeyword'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranscriptionResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('audio_sha256', models.CharField(max_length=64)),
+                ('engine', models.CharField(max_length=100)),
+                ('transcription', models.TextField(blank=True)),
+                ('ai_summary', models.TextField(blank=True)),
+                ('keywords', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='reflection',
+            name='audio_sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='transcriptionresult',
+            constraint=models.UniqueConstraint(fields=('audio_sha256', 'engine'), name='unique_transcription_result'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reflections', '0007_audio_dedup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reflection',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='reflection_user_updated_idx'),
+        ),
+    ]
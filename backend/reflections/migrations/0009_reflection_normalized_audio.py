@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reflections', '0008_reflection_reflection_user_updated_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reflection',
+            name='normalized_audio',
+            field=models.FileField(blank=True, editable=False, null=True, upload_to='reflections/audio/16k/'),
+        ),
+    ]
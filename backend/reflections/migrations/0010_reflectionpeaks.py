@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reflections', '0009_reflection_normalized_audio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReflectionPeaks',
+            fields=[
+                ('reflection', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='peaks', serialize=False, to='reflections.reflection')),
+                ('sample_rate', models.PositiveIntegerField()),
+                ('levels', models.JSONField(default=list)),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
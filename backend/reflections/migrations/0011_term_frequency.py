@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('reflections', '0010_reflectionpeaks'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='transcriptionresult',
+            name='ai_summary',
+        ),
+        migrations.RemoveField(
+            model_name='transcriptionresult',
+            name='keywords',
+        ),
+        migrations.AddField(
+            model_name='reflection',
+            name='terms',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.CreateModel(
+            name='TermFrequency',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(blank=True, max_length=100)),
+                ('documents', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='termfrequency',
+            constraint=models.UniqueConstraint(fields=('user', 'term'), name='unique_user_term'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('reflections', '0011_term_frequency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReflectionVector',
+            fields=[
+                ('reflection', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='vector', serialize=False, to='reflections.reflection')),
+                ('vector', models.BinaryField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
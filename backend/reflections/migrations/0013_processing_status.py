@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:52
+
+from django.db import migrations, models
+import reflections.models
+
+
+def backfill_status(apps, schema_editor):
+    from django.db.models import Q
+    from django.utils import timezone
+
+    Reflection = apps.get_model('reflections', 'Reflection')
+    failed = ['Audio could not be decoded for transcription.', 'No audio file provided for transcription.']
+    Reflection.objects.filter(transcription__in=failed).update(status='failed', lease_expires_at=None)
+    Reflection.objects.filter(status='queued').filter(
+        ~Q(transcription='') | Q(audio_file__isnull=True) | Q(audio_file='')
+    ).update(status='done', lease_expires_at=None)
+    # Whatever is left was never transcribed; let the next sweep pick it up.
+    Reflection.objects.filter(status='queued').update(lease_expires_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reflections', '0012_reflectionvector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reflection',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='reflection',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, default=reflections.models.queue_deadline, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='reflection',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='queued', editable=False, max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='reflection',
+            index=models.Index(condition=models.Q(('status', 'done'), _negated=True), fields=['status', 'lease_expires_at'], name='reflection_processing_idx'),
+        ),
+        migrations.RunPython(backfill_status, migrations.RunPython.noop),
+    ]
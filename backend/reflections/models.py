@@ -1,18 +1,231 @@
+import os
+import uuid
+from datetime import timedelta
+
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import Q
 from django.conf import settings
+from django.utils import timezone
+
+
+def queue_deadline():
+    """When a newly queued reflection counts as lost if no worker has claimed it."""
+    return timezone.now() + timedelta(seconds=settings.REFLECTION_QUEUE_TIMEOUT)
 
 
 class Reflection(models.Model):
+    STATUSES = [
+        ('queued', 'Queued'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    # Statuses whose lease the sweeper watches
+    ACTIVE_STATUSES = ('queued', 'processing')
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     audio_file = models.FileField(upload_to='reflections/audio/', null=True, blank=True)
+    audio_sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+    # 16 kHz mono copy made by reflections.tasks.normalize_audio
+    normalized_audio = models.FileField(upload_to='reflections/audio/16k/', null=True, blank=True, editable=False)
     transcription = models.TextField(blank=True)
     ai_summary = models.TextField(blank=True)
     keywords = models.JSONField(default=list, blank=True)
+    # Distinct transcript terms counted in the user's TermFrequency rows
+    terms = models.JSONField(default=list, blank=True, editable=False)
+    # Maintained by reflections.search on PostgreSQL; unused on SQLite, which
+    # indexes into an FTS5 table instead.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Audio processing state, see reflections.tasks. Workers claim a queued
+    # reflection by moving it to processing; an active reflection whose lease
+    # has run out is re-enqueued by sweep_stalled_reflections.
+    status = models.CharField(max_length=20, choices=STATUSES, default='queued', editable=False)
+    attempts = models.PositiveSmallIntegerField(default=0, editable=False)
+    lease_expires_at = models.DateTimeField(null=True, blank=True, default=queue_deadline, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='reflection_user_created_idx'),
+            models.Index(fields=['user', 'updated_at', 'id'], name='reflection_user_updated_idx'),
+            # Only unfinished reflections are indexed, so queue health and the
+            # sweeper stay cheap however many reflections are done.
+            models.Index(
+                fields=['status', 'lease_expires_at'], name='reflection_processing_idx', condition=~Q(status='done')
+            ),
+        ]
 
     def __str__(self):
         return f"Reflection by {self.user.email} on {self.created_at.date()}"
+
+    @property
+    def current_audio(self):
+        """The normalized audio once available, otherwise the upload."""
+        return self.normalized_audio if self.normalized_audio else self.audio_file
+
+
+class ReflectionPeaks(models.Model):
+    """
+    Waveform envelope of a reflection's audio, see ``audio.compute_peaks``.
+
+    ``data`` holds every zoom level back to back; ``levels`` lists each one's
+    ``samples_per_peak`` with its byte ``offset`` and ``length`` in ``data``.
+    """
+    reflection = models.OneToOneField(Reflection, on_delete=models.CASCADE, primary_key=True, related_name='peaks')
+    sample_rate = models.PositiveIntegerField()
+    levels = models.JSONField(default=list)
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def level(self, samples_per_peak):
+        for level in self.levels:
+            if level['samples_per_peak'] == samples_per_peak:
+                return bytes(self.data[level['offset']:level['offset'] + level['length']])
+        return None
+
+
+class ReflectionVector(models.Model):
+    """Quantized transcript feature vector used to find related reflections, see ``reflections.similarity``."""
+    reflection = models.OneToOneField(Reflection, on_delete=models.CASCADE, primary_key=True, related_name='vector')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    vector = models.BinaryField()
+
+
+class TranscriptionResult(models.Model):
+    """Engine output cached by audio content so re-uploads skip transcription."""
+    audio_sha256 = models.CharField(max_length=64)
+    engine = models.CharField(max_length=100)
+    transcription = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['audio_sha256', 'engine'], name='unique_transcription_result'),
+        ]
+
+    def __str__(self):
+        return f"{self.engine} result for {self.audio_sha256[:12]}"
+
+
+class AudioUpload(models.Model):
+    STATUSES = [
+        ('pending', 'Pending'),
+        ('complete', 'Complete'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='audio_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    checksum = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=STATUSES, default='pending')
+    reflection = models.OneToOneField(
+        Reflection, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Upload {self.id} ({self.offset}/{self.size} bytes)"
+
+    @property
+    def partial_path(self):
+        return os.path.join(settings.REFLECTION_UPLOAD_DIR, f'{self.id}.part')
+
+
+def normalize_keyword(keyword):
+    return ' '.join(str(keyword).lower().split())[:100]
+
+
+class ReflectionKeywordManager(models.Manager):
+    def sync(self, reflection):
+        """Bring the index rows for a reflection in line with its ``keywords`` list."""
+        wanted = {normalize_keyword(keyword) for keyword in reflection.keywords or []} - {''}
+        existing = set(self.filter(reflection=reflection).values_list('keyword', flat=True))
+        stale = existing - wanted
+        if stale:
+            self.filter(reflection=reflection, keyword__in=stale).delete()
+        missing = wanted - existing
+        if missing:
+            self.bulk_create([
+                self.model(user_id=reflection.user_id, reflection=reflection, keyword=keyword)
+                for keyword in sorted(missing)
+            ])
+
+    def rebuild(self, user_id, reflections):
+        """Replace all of a user's index rows with those for ``reflections``, in two queries."""
+        self.filter(user_id=user_id).delete()
+        self.bulk_create([
+            self.model(user_id=user_id, reflection=reflection, keyword=keyword)
+            for reflection in reflections
+            for keyword in sorted({normalize_keyword(keyword) for keyword in reflection.keywords or []} - {''})
+        ], batch_size=1000)
+
+
+class ReflectionKeyword(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    reflection = models.ForeignKey(Reflection, on_delete=models.CASCADE, related_name='keyword_index')
+    keyword = models.CharField(max_length=100)
+
+    objects = ReflectionKeywordManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['reflection', 'keyword'], name='unique_reflection_keyword'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'keyword'], name='reflection_keyword_user_idx'),
+        ]
+
+    def __str__(self):
+        return self.keyword
+
+
+class TermFrequencyManager(models.Manager):
+    def record(self, user_id, removed=(), added=()):
+        """Adjust document counts for terms that left or joined one of the user's reflections."""
+        if added:
+            self.bulk_create(
+                [self.model(user_id=user_id, term=term) for term in sorted(added)],
+                ignore_conflicts=True
+            )
+            self.filter(user_id=user_id, term__in=added).update(documents=models.F('documents') + 1)
+        if removed:
+            self.filter(user_id=user_id, term__in=removed).update(documents=models.F('documents') - 1)
+
+    def record_document(self, user_id, delta):
+        self.bulk_create([self.model(user_id=user_id, term=self.model.DOCUMENTS)], ignore_conflicts=True)
+        self.filter(user_id=user_id, term=self.model.DOCUMENTS).update(documents=models.F('documents') + delta)
+
+    def lookup(self, user_id, terms):
+        """Return ``({term: documents}, total documents)`` for the given terms."""
+        frequencies = dict(
+            self.filter(user_id=user_id, term__in=[*terms, self.model.DOCUMENTS]).values_list('term', 'documents')
+        )
+        return frequencies, frequencies.pop(self.model.DOCUMENTS, 0)
+
+
+class TermFrequency(models.Model):
+    """
+    How many of a user's analyzed reflections contain ``term``. The row with
+    the empty term counts the analyzed reflections themselves.
+    """
+    DOCUMENTS = ''
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    term = models.CharField(max_length=100, blank=True)
+    documents = models.IntegerField(default=0)
+
+    objects = TermFrequencyManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'term'], name='unique_user_term'),
+        ]
@@ -0,0 +1,93 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F
+from .models import Reflection
+
+SEARCH_CONFIG = 'english'
+FTS_TABLE = 'reflections_reflection_fts'
+
+
+def _search_vector():
+    return (
+        SearchVector('transcription', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('ai_summary', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def index_reflection(reflection):
+    """Refresh the search index entry for a reflection after its text changes."""
+    if connection.vendor == 'postgresql':
+        Reflection.objects.filter(pk=reflection.pk).update(search_vector=_search_vector())
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [reflection.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, transcription, ai_summary) VALUES (%s, %s, %s)',
+                [reflection.pk, reflection.transcription, reflection.ai_summary]
+            )
+
+
+def index_reflections(reflections):
+    """Refresh the search index entries for many reflections at once."""
+    if not reflections:
+        return
+    if connection.vendor == 'postgresql':
+        Reflection.objects.filter(pk__in=[reflection.pk for reflection in reflections]).update(
+            search_vector=_search_vector()
+        )
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [[reflection.pk] for reflection in reflections])
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, transcription, ai_summary) VALUES (%s, %s, %s)',
+                [[reflection.pk, reflection.transcription, reflection.ai_summary] for reflection in reflections]
+            )
+
+
+def remove_reflection(reflection_id):
+    # The PostgreSQL vector lives on the row itself and goes away with it.
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [reflection_id])
+
+
+def _fts5_query(query):
+    # Quote every term so user input can't be parsed as FTS5 syntax.
+    terms = re.findall(r'\w+', query)
+    return ' '.join('"%s"' % term for term in terms)
+
+
+def search_reflections(user, query, limit=20):
+    """Return the user's reflections matching ``query``, best match first, with a ``rank`` attribute."""
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+        return list(
+            Reflection.objects.filter(user=user, search_vector=search_query)
+            .annotate(rank=SearchRank(F('search_vector'), search_query))
+            .order_by('-rank', '-created_at')[:limit]
+        )
+
+    match = _fts5_query(query)
+    if not match:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT {FTS_TABLE}.rowid, bm25({FTS_TABLE}, 1.0, 0.5) AS score '
+            f'FROM {FTS_TABLE} JOIN reflections_reflection ON reflections_reflection.id = {FTS_TABLE}.rowid '
+            f'WHERE {FTS_TABLE} MATCH %s AND reflections_reflection.user_id = %s '
+            f'ORDER BY score LIMIT %s',
+            [match, user.pk, limit]
+        )
+        scores = cursor.fetchall()
+    reflections = Reflection.objects.in_bulk([pk for pk, _ in scores])
+    results = []
+    for pk, score in scores:
+        reflection = reflections.get(pk)
+        if reflection is None:
+            continue
+        # bm25() is lower-is-better; flip it so rank reads like SearchRank.
+        reflection.rank = -score
+        results.append(reflection)
+    return results
@@ -1,11 +1,50 @@
+import re
+
+from django.conf import settings
 from rest_framework import serializers
-from .models import Reflection
+from .models import Reflection, AudioUpload
+from .streaming import audio_url
 
 
 class ReflectionSerializer(serializers.ModelSerializer):
+    audio_url = serializers.SerializerMethodField()
+
     class Meta:
         model = Reflection
-        fields = ('id', 'audio_file', 'transcription', 'ai_summary', 
-                 'keywords', 'created_at', 'updated_at')
-        read_only_fields = ('transcription', 'ai_summary', 'keywords', 
-                          'created_at', 'updated_at')
\ No newline at end of file
+        fields = ('id', 'audio_file', 'audio_url', 'audio_sha256', 'transcription', 'ai_summary',
+                 'keywords', 'status', 'attempts', 'created_at', 'updated_at')
+        read_only_fields = ('audio_sha256', 'transcription', 'ai_summary', 'keywords',
+                          'status', 'attempts', 'created_at', 'updated_at')
+        # Audio is only served through the signed audio_url.
+        extra_kwargs = {'audio_file': {'write_only': True}}
+
+    def get_audio_url(self, obj):
+        if not obj.current_audio:
+            return None
+        return audio_url(obj, self.context.get('request'))
+
+
+class AudioUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AudioUpload
+        fields = ('id', 'filename', 'size', 'checksum', 'offset', 'status',
+                  'reflection', 'created_at', 'updated_at')
+        read_only_fields = ('offset', 'status', 'reflection', 'created_at', 'updated_at')
+
+    def validate_filename(self, value):
+        return value.replace('\\', '/').rsplit('/', 1)[-1]
+
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError('Upload size must be positive.')
+        if value > settings.REFLECTION_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'Upload size may not exceed {settings.REFLECTION_UPLOAD_MAX_SIZE} bytes.'
+            )
+        return value
+
+    def validate_checksum(self, value):
+        value = value.lower()
+        if not re.fullmatch(r'[0-9a-f]{64}', value):
+            raise serializers.ValidationError('Checksum must be a hex-encoded SHA-256 digest.')
+        return value
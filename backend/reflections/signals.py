@@ -0,0 +1,19 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from . import search
+from .models import Reflection, TermFrequency
+
+
+@receiver(post_delete, sender=Reflection)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.remove_reflection(instance.pk)
+
+
+@receiver(post_delete, sender=Reflection)
+def remove_from_term_frequencies(sender, instance, origin=None, **kwargs):
+    # Deleting the account cascades to the user's term frequencies.
+    if isinstance(origin, get_user_model()) or not instance.terms:
+        return
+    TermFrequency.objects.record(instance.user_id, removed=instance.terms)
+    TermFrequency.objects.record_document(instance.user_id, -1)
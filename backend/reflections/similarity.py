@@ -0,0 +1,105 @@
+"""
+Offline "related reflections": each transcript becomes a hashed bag of word
+unigrams and bigrams, L2-normalized and quantized to ``DIMENSIONS`` int8
+values (``ReflectionVector``). Queries score all of a user's vectors with
+one matrix-vector product held in a per-process LRU, which is invalidated
+through the user's reflections version from ``core.cache``.
+"""
+import threading
+import zlib
+from collections import Counter, OrderedDict
+
+import numpy as np
+from django.conf import settings
+from core.cache import get_version
+from .analysis import tokenize
+from .models import ReflectionVector
+
+DIMENSIONS = 256
+_matrices = OrderedDict()
+_lock = threading.Lock()
+
+
+def features(text):
+    tokens = tokenize(text)
+    return Counter(tokens + [f'{first} {second}' for first, second in zip(tokens, tokens[1:])])
+
+
+def embed(text):
+    """Return the int8 feature vector for ``text``, or None if it has no terms."""
+    counts = features(text)
+    if not counts:
+        return None
+    hashes = np.array([zlib.crc32(feature.encode()) for feature in counts], dtype=np.uint32)
+    weights = np.log1p(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+    # The hash's top bit picks the sign so colliding features tend to cancel.
+    signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    np.add.at(vector, hashes % DIMENSIONS, signs * weights)
+    norm = np.linalg.norm(vector)
+    if not norm:
+        return None
+    return np.round(vector / norm * 127).astype(np.int8)
+
+
+def update_vector(reflection, text):
+    vector = embed(text)
+    if vector is None:
+        ReflectionVector.objects.filter(reflection=reflection).delete()
+    else:
+        ReflectionVector.objects.update_or_create(
+            reflection=reflection, defaults={'user_id': reflection.user_id, 'vector': vector.tobytes()}
+        )
+
+
+def update_vectors(reflections, texts):
+    """``update_vector`` for many reflections, as one delete and one insert."""
+    vectors = []
+    for reflection, text in zip(reflections, texts):
+        vector = embed(text)
+        if vector is not None:
+            vectors.append(ReflectionVector(
+                reflection=reflection, user_id=reflection.user_id, vector=vector.tobytes()
+            ))
+    ReflectionVector.objects.filter(reflection__in=[reflection.pk for reflection in reflections]).delete()
+    ReflectionVector.objects.bulk_create(vectors, batch_size=500)
+
+
+def _user_matrix(user_id):
+    version = get_version(user_id, 'reflections')
+    with _lock:
+        cached = _matrices.get(user_id)
+        if cached is not None and cached[0] == version:
+            _matrices.move_to_end(user_id)
+            return cached[1], cached[2]
+    rows = list(ReflectionVector.objects.filter(user_id=user_id).values_list('reflection_id', 'vector'))
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    # Widened once here: BLAS float32 products are several times faster than
+    # integer ones, which numpy runs without BLAS.
+    matrix = np.frombuffer(b''.join(bytes(row[1]) for row in rows), dtype=np.int8).reshape(len(rows), DIMENSIONS)
+    matrix = matrix.astype(np.float32) / 127
+    with _lock:
+        _matrices[user_id] = (version, ids, matrix)
+        _matrices.move_to_end(user_id)
+        while len(_matrices) > 1 and sum(len(entry[1]) for entry in _matrices.values()) > settings.RELATED_REFLECTIONS_CACHE_ROWS:
+            _matrices.popitem(last=False)
+    return ids, matrix
+
+
+def related_ids(reflection, limit=5):
+    """Return ``[(reflection_id, similarity)]`` for the user's reflections most similar to ``reflection``."""
+    try:
+        query = np.frombuffer(bytes(reflection.vector.vector), dtype=np.int8)
+    except ReflectionVector.DoesNotExist:
+        query = embed(reflection.transcription)
+    if query is None:
+        return []
+    ids, matrix = _user_matrix(reflection.user_id)
+    if not len(ids):
+        return []
+    scores = matrix @ (query.astype(np.float32) / 127)
+    scores[ids == reflection.pk] = -np.inf
+    count = min(limit, len(ids))
+    top = np.argpartition(-scores, count - 1)[:count]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    return [(int(ids[index]), round(float(scores[index]), 4)) for index in top if scores[index] > 0]
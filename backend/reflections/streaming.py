@@ -0,0 +1,137 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core import signing
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from .uploads import CHUNK_SIZE
+
+AUDIO_TOKEN_SALT = 'reflections.audio'
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def audio_token(reflection):
+    return signing.dumps({'r': reflection.pk, 'u': reflection.user_id}, salt=AUDIO_TOKEN_SALT, compress=True)
+
+
+def read_audio_token(token, reflection_id):
+    """Return the user id a token was issued to, or None if it is invalid, expired or for another reflection."""
+    try:
+        payload = signing.loads(token, salt=AUDIO_TOKEN_SALT, max_age=settings.AUDIO_URL_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    if str(payload.get('r')) != str(reflection_id):
+        return None
+    return payload.get('u')
+
+
+def audio_url(reflection, request=None):
+    """
+    A short-lived URL for the reflection's audio that works without an
+    Authorization header, so it can be used as an <audio> element's src.
+    """
+    url = f"{reverse('reflection-audio', args=[reflection.pk])}?token={audio_token(reflection)}"
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def parse_range(header, size):
+    """
+    Return ``(start, end)`` (inclusive) for a single-range ``Range`` header,
+    None to send the whole file, or raise ValueError if it is unsatisfiable.
+    Multi-range requests are answered with the whole file, as RFC 9110 allows.
+    """
+    match = RANGE_RE.match((header or '').strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError('Unsatisfiable range')
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if start >= size:
+        raise ValueError('Unsatisfiable range')
+    end = min(int(last), size - 1) if last else size - 1
+    if end < start:
+        return None
+    return start, end
+
+
+def iter_file(fileobj, start, length):
+    try:
+        fileobj.seek(start)
+        remaining = length
+        while remaining > 0:
+            block = fileobj.read(min(CHUNK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+    finally:
+        fileobj.close()
+
+
+def offload_header(fieldfile):
+    """The X-Accel-Redirect/X-Sendfile header to let the front proxy send the file, if configured."""
+    backend = settings.AUDIO_SENDFILE_BACKEND
+    if not backend:
+        return None
+    if backend == 'x-accel-redirect':
+        return 'X-Accel-Redirect', settings.AUDIO_SENDFILE_PREFIX.rstrip('/') + '/' + fieldfile.name.lstrip('/')
+    if backend == 'x-sendfile':
+        return 'X-Sendfile', os.path.abspath(fieldfile.path)
+    raise ValueError(f'Unknown AUDIO_SENDFILE_BACKEND: {backend}')
+
+
+def audio_response(request, fieldfile):
+    """
+    Serve a stored audio file with HTTP Range support.
+
+    When ``AUDIO_SENDFILE_BACKEND`` is set the response only carries the
+    offload header and the proxy sends the bytes (and handles Range itself);
+    otherwise the requested range is streamed in ``CHUNK_SIZE`` blocks.
+    """
+    content_type = mimetypes.guess_type(fieldfile.name)[0] or 'application/octet-stream'
+    etag = f'"{os.path.basename(fieldfile.name)}"'
+    offload = offload_header(fieldfile)
+    if offload is not None:
+        response = HttpResponse(content_type=content_type)
+        response[offload[0]] = offload[1]
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, max-age=3600'
+        return response
+
+    size = fieldfile.size
+    try:
+        byte_range = parse_range(request.headers.get('Range'), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    # A conditional range for a different version of the file gets it whole.
+    if_range = request.headers.get('If-Range')
+    if byte_range is not None and if_range and if_range != etag:
+        byte_range = None
+    start, end = byte_range or (0, size - 1)
+    length = max(end - start + 1, 0)
+
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+    else:
+        response = StreamingHttpResponse(
+            iter_file(fieldfile.storage.open(fieldfile.name, 'rb'), start, length),
+            content_type=content_type
+        )
+    if byte_range is not None:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=3600'
+    return response
@@ -1,23 +1,382 @@
-from celery import shared_task
-from .models import Reflection
+import logging
+import os
+import tempfile
+from collections import defaultdict
+from datetime import timedelta
+from functools import partial
+
+from celery import current_app, shared_task
+from celery.signals import worker_process_init
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from django_redis import get_redis_connection
+from core.signals import bump_versions_on_commit
+from . import search, similarity, uploads
+from .events import publish_transcription
+from .analysis import analyze_reflection
+from .audio import AudioDecodeError, compute_peaks, is_normalized, normalize_wav
+from .models import AudioUpload, Reflection, ReflectionKeyword, ReflectionPeaks, TranscriptionResult
+from .transcription import get_engine, transcribe_file
+
+logger = logging.getLogger(__name__)
+
+PENDING_TRANSCRIPTIONS_KEY = 'reflections:transcription:pending'
+PROCESSING_TRANSCRIPTIONS_KEY = 'reflections:transcription:processing:{}'
+TRANSCRIPTION_QUEUE = 'transcription'
+UNDECODABLE_AUDIO_MESSAGE = "Audio could not be decoded for transcription."
+NO_AUDIO_MESSAGE = "No audio file provided for transcription."
+
+
+@worker_process_init.connect
+def warm_transcription_engine(**kwargs):
+    # Load the model once per worker process instead of on the first task,
+    # only in workers that consume the transcription queue.
+    if TRANSCRIPTION_QUEUE in current_app.amqp.queues.consume_from:
+        get_engine()
+
+
+def enqueue_transcription(reflection_id):
+    """
+    Queue a reflection for transcription.
+
+    With ``TRANSCRIPTION_BATCH_SIZE`` above 1, ids are collected in a Redis
+    list and drained by ``transcribe_batch`` once a batch fills up or
+    ``TRANSCRIPTION_BATCH_WINDOW`` seconds after the first id arrives.
+    """
+    batch_size = settings.TRANSCRIPTION_BATCH_SIZE
+    if batch_size <= 1:
+        transcribe_audio.delay(reflection_id)
+        return
+    pending = get_redis_connection('default').rpush(PENDING_TRANSCRIPTIONS_KEY, reflection_id)
+    if pending == 1:
+        transcribe_batch.apply_async(countdown=settings.TRANSCRIPTION_BATCH_WINDOW)
+    elif pending % batch_size == 0:
+        transcribe_batch.delay()
+
+
+def enqueue_audio_processing(reflection_id):
+    """Queue a new upload for normalization, which queues transcription after it."""
+    normalize_audio.delay(reflection_id)
+
+
+def claim_reflection(reflection_id):
+    """
+    Take a queued reflection, or one whose lease ran out, for processing.
+    Returns False if another worker holds it or it is already finished, so
+    duplicate deliveries of the same task are dropped.
+    """
+    now = timezone.now()
+    claimed = (
+        Reflection.objects.filter(pk=reflection_id)
+        .filter(Q(status='queued') | Q(status='processing', lease_expires_at__lt=now))
+        .update(
+            status='processing',
+            attempts=F('attempts') + 1,
+            lease_expires_at=now + timedelta(seconds=settings.REFLECTION_PROCESSING_LEASE),
+            updated_at=now,
+        )
+    )
+    if not claimed:
+        return False
+    # update() skips the signals that invalidate cached lists.
+    user_id = Reflection.objects.values_list('user_id', flat=True).get(pk=reflection_id)
+    bump_versions_on_commit(user_id, ('reflections',))
+    return True
+
+
+def renew_lease(reflection_id):
+    Reflection.objects.filter(pk=reflection_id, status='processing').update(
+        lease_expires_at=timezone.now() + timedelta(seconds=settings.REFLECTION_PROCESSING_LEASE)
+    )
+
+
+def retry_delay(attempts):
+    return min(settings.REFLECTION_RETRY_BACKOFF * 2 ** attempts, settings.REFLECTION_RETRY_BACKOFF_MAX)
+
+
+def requeue_reflections(reflection_ids, delay):
+    for reflection_id in reflection_ids:
+        normalize_audio.apply_async((reflection_id,), countdown=delay, priority=settings.TASK_PRIORITY_BACKGROUND)
+
+
+def queue_health():
+    """Counts of unfinished reflections by status, plus how many have an expired lease."""
+    health = {'queued': 0, 'processing': 0, 'failed': 0, 'expired': 0}
+    health.update(
+        Reflection.objects.exclude(status='done').values_list('status').annotate(count=Count('pk')).order_by()
+    )
+    health['expired'] = Reflection.objects.filter(
+        status__in=Reflection.ACTIVE_STATUSES, lease_expires_at__lt=timezone.now()
+    ).count()
+    return health
 
 
 @shared_task
-def transcribe_audio(reflection_id):
+def sweep_stalled_reflections(chunk_size=None):
+    """
+    Recover reflections whose worker died or whose task message was lost:
+    every active reflection with an expired lease is queued again, with the
+    retry delayed exponentially by its attempt count, or marked failed once
+    it has been claimed ``REFLECTION_MAX_ATTEMPTS`` times.
+
+    Expired reflections are walked in primary-key chunks, each locked (skipping
+    rows another sweep holds) and updated with one query per attempt count.
+    """
+    chunk_size = chunk_size or settings.REFLECTION_SWEEP_CHUNK_SIZE
+    now = timezone.now()
+    expired = Reflection.objects.filter(status__in=Reflection.ACTIVE_STATUSES, lease_expires_at__lt=now)
+    last_id = 0
+    swept = {'retried': 0, 'failed': 0}
+    while True:
+        with transaction.atomic():
+            updated_at = timezone.now()
+            chunk = list(
+                expired.filter(pk__gt=last_id).order_by('pk').select_for_update(skip_locked=True)
+                .values_list('pk', 'user_id', 'attempts')[:chunk_size]
+            )
+            if not chunk:
+                break
+            last_id = chunk[-1][0]
+            retries = defaultdict(list)
+            exhausted = []
+            for pk, _, attempts in chunk:
+                if attempts >= settings.REFLECTION_MAX_ATTEMPTS:
+                    exhausted.append(pk)
+                else:
+                    retries[attempts].append(pk)
+            for attempts, pks in retries.items():
+                delay = retry_delay(attempts)
+                Reflection.objects.filter(pk__in=pks).update(
+                    status='queued',
+                    lease_expires_at=now + timedelta(seconds=delay + settings.REFLECTION_QUEUE_TIMEOUT),
+                    updated_at=updated_at,
+                )
+                transaction.on_commit(partial(requeue_reflections, pks, delay))
+                swept['retried'] += len(pks)
+            if exhausted:
+                Reflection.objects.filter(pk__in=exhausted).update(
+                    status='failed', lease_expires_at=None, updated_at=updated_at
+                )
+                for reflection in Reflection.objects.filter(pk__in=exhausted):
+                    logger.error('Giving up on reflection %s after %s attempts', reflection.pk, reflection.attempts)
+                    publish_transcription(reflection)
+                swept['failed'] += len(exhausted)
+            for user_id in {user_id for _, user_id, _ in chunk}:
+                bump_versions_on_commit(user_id, ('reflections',))
+    return swept
+
+
+@shared_task
+def sweep_abandoned_uploads():
+    """
+    Delete resumable uploads that have not received a chunk for
+    ``REFLECTION_UPLOAD_EXPIRY`` seconds, with their partial files, and any
+    partial file left in ``REFLECTION_UPLOAD_DIR`` without an upload.
+    Returns the number of uploads and stray files removed.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.REFLECTION_UPLOAD_EXPIRY)
+    with transaction.atomic():
+        # Uploads receiving a chunk right now are locked and left alone.
+        abandoned = list(
+            AudioUpload.objects.filter(status='pending', updated_at__lt=cutoff).select_for_update(skip_locked=True)
+        )
+        AudioUpload.objects.filter(pk__in=[upload.pk for upload in abandoned]).delete()
+    for upload in abandoned:
+        uploads.remove_partial(upload.partial_path)
+    removed = len(abandoned)
+
     try:
-        reflection = Reflection.objects.get(id=reflection_id)
-        # TODO: Implement audio transcription using Whisper or Mozilla DeepSpeech
-        # For MVP, we'll just set a placeholder text
-        if reflection.audio_file and reflection.audio_file.name:
-            reflection.transcription = f"Transcription processed for: {reflection.audio_file.name}"
+        entries = list(os.scandir(settings.REFLECTION_UPLOAD_DIR))
+    except FileNotFoundError:
+        return removed
+    pending = {str(pk) for pk in AudioUpload.objects.filter(status='pending').values_list('pk', flat=True)}
+    for entry in entries:
+        upload_id, extension = os.path.splitext(entry.name)
+        if extension != '.part' or upload_id in pending or entry.stat().st_mtime >= cutoff.timestamp():
+            continue
+        uploads.remove_partial(entry.path)
+        removed += 1
+    return removed
+
+
+def _normalize_reflection(reflection):
+    storage = Reflection._meta.get_field('normalized_audio').storage
+    sha256 = reflection.audio_sha256
+    if not sha256:
+        with reflection.audio_file.open('rb') as audio_file:
+            sha256 = uploads.file_sha256(audio_file)
+    name = uploads.content_addressed_name(sha256, '.wav', uploads.NORMALIZED_AUDIO_DIR)
+    original = reflection.audio_file.name
+    if not storage.exists(name):
+        with reflection.audio_file.open('rb') as audio_file:
+            already_normalized = is_normalized(audio_file, settings.AUDIO_NORMALIZED_SAMPLE_RATE)
+        if already_normalized:
+            name = original
         else:
-            reflection.transcription = "No audio file provided for transcription."
-        reflection.ai_summary = f"Summary of: {reflection.transcription[:50]}..."
-        if reflection.audio_file and reflection.audio_file.name:
-            reflection.keywords = ["processed", "placeholder"]
+            with reflection.audio_file.open('rb') as audio_file, tempfile.TemporaryFile() as out:
+                normalize_wav(audio_file, out, settings.AUDIO_NORMALIZED_SAMPLE_RATE)
+                out.seek(0)
+                name = storage.save(name, File(out))
+    reflection.normalized_audio = name
+    update_fields = ['normalized_audio', 'updated_at']
+    if not settings.AUDIO_KEEP_ORIGINAL and name != original:
+        reflection.audio_file = None
+        update_fields.append('audio_file')
+    reflection.save(update_fields=update_fields)
+    if reflection.audio_file.name != original:
+        # Uploads are stored by content hash, so other reflections may share
+        # it, or a new upload of the same bytes may be about to reuse it.
+        with uploads.audio_lock(sha256):
+            if not Reflection.objects.filter(audio_file=original).exists():
+                storage.delete(original)
+
+
+@shared_task(acks_late=True)
+def normalize_audio(reflection_id):
+    """Store a 16 kHz mono copy of a reflection's upload, then queue transcription."""
+    if not claim_reflection(reflection_id):
+        return False
+    reflection = Reflection.objects.get(id=reflection_id)
+    if reflection.audio_file and not reflection.normalized_audio:
+        try:
+            _normalize_reflection(reflection)
+        except AudioDecodeError as exc:
+            # Transcription records the decode failure on the reflection.
+            logger.warning('Could not normalize audio for reflection %s: %s', reflection.id, exc)
+    if reflection.normalized_audio:
+        compute_waveform_peaks.delay(reflection.id)
+    enqueue_transcription(reflection.id)
+    return True
+
+
+@shared_task(acks_late=True)
+def compute_waveform_peaks(reflection_id):
+    """Store the min/max waveform envelope of a reflection's audio at each zoom level."""
+    try:
+        reflection = Reflection.objects.get(id=reflection_id)
+    except Reflection.DoesNotExist:
+        return False
+    audio = reflection.current_audio
+    if not audio:
+        return False
+    try:
+        with audio.open('rb') as audio_file:
+            sample_rate, peaks = compute_peaks(audio_file)
+    except AudioDecodeError as exc:
+        logger.warning('Could not compute peaks for reflection %s: %s', reflection.id, exc)
+        return False
+    levels = []
+    offset = 0
+    for samples_per_peak, data in peaks.items():
+        levels.append({'samples_per_peak': samples_per_peak, 'offset': offset, 'length': len(data)})
+        offset += len(data)
+    ReflectionPeaks.objects.update_or_create(
+        reflection=reflection,
+        defaults={'sample_rate': sample_rate, 'levels': levels, 'data': b''.join(peaks.values())}
+    )
+    return True
+
+
+def _transcribe_reflection(reflection, engine):
+    cached = None
+    if reflection.audio_sha256:
+        cached = TranscriptionResult.objects.filter(
+            audio_sha256=reflection.audio_sha256, engine=engine.version_key
+        ).first()
+    transcribed = cached is not None
+    if cached is not None:
+        reflection.transcription = cached.transcription
+    else:
+        audio = reflection.current_audio
+        if audio:
+            try:
+                with audio.open('rb') as audio_file:
+                    reflection.transcription = transcribe_file(audio_file, engine=engine)
+                transcribed = True
+            except AudioDecodeError as exc:
+                logger.warning('Could not decode audio for reflection %s: %s', reflection.id, exc)
+                reflection.transcription = UNDECODABLE_AUDIO_MESSAGE
         else:
-            reflection.keywords = []
+            reflection.transcription = NO_AUDIO_MESSAGE
+        if transcribed and reflection.audio_sha256:
+            TranscriptionResult.objects.get_or_create(
+                audio_sha256=reflection.audio_sha256,
+                engine=engine.version_key,
+                defaults={'transcription': reflection.transcription}
+            )
+    reflection.status = 'done' if transcribed else 'failed'
+    reflection.lease_expires_at = None
+    with transaction.atomic():
+        # Keywords depend on the user's other reflections, so they are never
+        # cached with the transcript. Re-read the counted terms under a lock.
+        reflection.terms = Reflection.objects.select_for_update().values_list('terms', flat=True).get(pk=reflection.pk)
+        analyze_reflection(reflection, reflection.transcription if transcribed else '')
         reflection.save()
-        return True
+        similarity.update_vector(reflection, reflection.transcription if transcribed else '')
+        search.index_reflection(reflection)
+        ReflectionKeyword.objects.sync(reflection)
+        publish_transcription(reflection)
+
+
+@shared_task(acks_late=True)
+def transcribe_audio(reflection_id):
+    try:
+        reflection = Reflection.objects.get(id=reflection_id)
     except Reflection.DoesNotExist:
-        return False
\ No newline at end of file
+        return False
+    renew_lease(reflection.id)
+    _transcribe_reflection(reflection, get_engine())
+    return True
+
+
+@shared_task(bind=True, acks_late=True)
+def transcribe_batch(self, reflection_ids=None):
+    """
+    Transcribe several reflections in one task with the worker's cached engine.
+
+    Without explicit ids, up to ``TRANSCRIPTION_BATCH_SIZE`` ids are moved
+    from the pending list filled by ``enqueue_transcription`` to a list named
+    after this task, and each leaves it once its transcript is saved. If the
+    task fails, the ids it did not reach go back to the pending list; if the
+    worker dies, the redelivered message (same task id) resumes the list.
+    """
+    redis = None
+    if reflection_ids is None:
+        redis = get_redis_connection('default')
+        processing = PROCESSING_TRANSCRIPTIONS_KEY.format(self.request.id)
+        claimed = redis.lrange(processing, 0, -1)
+        while len(claimed) < settings.TRANSCRIPTION_BATCH_SIZE:
+            reflection_id = redis.lmove(PENDING_TRANSCRIPTIONS_KEY, processing, 'LEFT', 'RIGHT')
+            if reflection_id is None:
+                break
+            claimed.append(reflection_id)
+        # Outlives a redelivery, but not an abandoned task.
+        redis.expire(processing, 2 * settings.CELERY_BROKER_TRANSPORT_OPTIONS['visibility_timeout'])
+        reflection_ids = [int(reflection_id) for reflection_id in claimed]
+    engine = get_engine()
+    processed = 0
+    try:
+        for reflection in Reflection.objects.filter(id__in=reflection_ids):
+            try:
+                renew_lease(reflection.id)
+                _transcribe_reflection(reflection, engine)
+                processed += 1
+            except Exception:
+                logger.exception('Transcription failed for reflection %s', reflection.id)
+            if redis is not None:
+                redis.lrem(processing, 1, reflection.id)
+    except BaseException:
+        if redis is not None:
+            while redis.lmove(processing, PENDING_TRANSCRIPTIONS_KEY, 'RIGHT', 'LEFT') is not None:
+                pass
+        raise
+    if redis is not None:
+        # Anything left belongs to reflections deleted in the meantime.
+        redis.delete(processing)
+        if redis.llen(PENDING_TRANSCRIPTIONS_KEY):
+            # More ids arrived while this batch ran without tripping a trigger.
+            transcribe_batch.delay()
+    return processed
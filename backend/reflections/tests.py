@@ -1,15 +1,134 @@
-from django.test import TestCase
+import base64
+import json
+import hashlib
+import io
+import math
+import os
+import shutil
+import struct
+import tempfile
+import time
+import uuid
+import wave
+from datetime import timedelta
+
+import numpy as np
+from billiard.pool import Pool
+from django.test import AsyncClient, TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework import status
 from django.urls import reverse
-from unittest.mock import patch
-from .models import Reflection
-from .tasks import transcribe_audio
+from django.utils import timezone
+from unittest import skipIf
+from unittest.mock import MagicMock, patch
+from . import uploads
+from .models import (
+    Reflection, AudioUpload, ReflectionKeyword, ReflectionPeaks, ReflectionVector, TermFrequency, TranscriptionResult,
+)
+from .analysis import analyze_reflection, reanalyze_user, summarize
+from .events import channel_name
+from .audio import PEAK_LEVELS, compute_peaks, normalize_wav
+from .search import index_reflection, search_reflections
+from .similarity import embed, related_ids, update_vector
+from .tasks import (
+    NO_AUDIO_MESSAGE, PENDING_TRANSCRIPTIONS_KEY, PROCESSING_TRANSCRIPTIONS_KEY, claim_reflection,
+    compute_waveform_peaks, enqueue_transcription, normalize_audio, queue_health, sweep_abandoned_uploads,
+    sweep_stalled_reflections, transcribe_audio, transcribe_batch,
+)
+from .transcription import StubTranscriptionEngine, get_engine, transcribe_file
 
 User = get_user_model()
 
+
+class FakeRedisLists:
+    """The Redis list commands the transcription batches use."""
+
+    def __init__(self):
+        self.lists = {}
+
+    def lrange(self, key, start, end):
+        return list(self.lists.get(key, []))
+
+    def lmove(self, source, destination, src_side, dest_side):
+        items = self.lists.get(source)
+        if not items:
+            return None
+        value = items.pop(0 if src_side == 'LEFT' else -1)
+        if not items:
+            del self.lists[source]
+        target = self.lists.setdefault(destination, [])
+        target.insert(0 if dest_side == 'LEFT' else len(target), value)
+        return value
+
+    def lrem(self, key, count, value):
+        items = self.lists.get(key, [])
+        items.remove(str(value).encode())
+        if not items:
+            self.lists.pop(key, None)
+
+    def llen(self, key):
+        return len(self.lists.get(key, []))
+
+    def expire(self, key, seconds):
+        pass
+
+    def delete(self, key):
+        self.lists.pop(key, None)
+
+
+def transcribe_in_worker(reflection_id):
+    transcribe_audio(reflection_id)
+    return Reflection.objects.get(pk=reflection_id).transcription
+
+
+class PidEngine(StubTranscriptionEngine):
+    """Reports which process transcribed each window."""
+    name = 'pid'
+
+    def transcribe_window(self, window):
+        return f'{os.getpid()}.'
+
+
+class ThreadPidEngine(PidEngine):
+    executor = 'threads'
+
+
+class ThreadStubEngine(StubTranscriptionEngine):
+    executor = 'threads'
+
+
+class BusyEngine(StubTranscriptionEngine):
+    """Holds the GIL for a fixed amount of pure-Python work per window."""
+    name = 'busy'
+
+    def transcribe_window(self, window):
+        total = 0
+        for value in range(2_000_000):
+            total += value
+        return super().transcribe_window(window)
+
+
+def make_wav(seconds=1.0, sample_rate=8000, channels=1, frequency=440.0):
+    frames = int(seconds * sample_rate)
+    samples = []
+    for i in range(frames):
+        value = int(12000 * math.sin(2 * math.pi * frequency * i / sample_rate))
+        samples.extend([value] * channels)
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as writer:
+        writer.setnchannels(channels)
+        writer.setsampwidth(2)
+        writer.setframerate(sample_rate)
+        writer.writeframes(struct.pack(f'<{len(samples)}h', *samples))
+    return buffer.getvalue()
+
+
 class ReflectionModelTests(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -64,7 +183,7 @@ class ReflectionAPITests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Reflection.objects.count(), 1)
         self.assertIn('message', response.data)
-        self.assertIn('audio_file', response.data)
+        self.assertIn('audio_url', response.data)
         
         # Check that the task was called with the new reflection's ID
         reflection_id = response.data['id']
@@ -75,8 +194,30 @@ class ReflectionAPITests(TestCase):
         url = reverse('reflection-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertIn('audio_file', response.data[0])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIn('audio_url', response.data['results'][0])
+
+    def test_reflections_are_cursor_paginated(self):
+        reflections = [Reflection.objects.create(user=self.user) for _ in range(5)]
+        # Give two rows the same timestamp so the id tie-breaker matters
+        Reflection.objects.filter(id__in=[reflections[1].id, reflections[2].id]).update(
+            created_at=reflections[1].created_at
+        )
+        url = reverse('reflection-list')
+        seen = []
+        response = self.client.get(url, {'page_size': 2})
+        while True:
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen.extend(item['id'] for item in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        expected = list(Reflection.objects.filter(user=self.user).values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('reflection-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
     def test_unauthorized_access(self):
         # Create another user and their reflection
@@ -94,6 +235,51 @@ class ReflectionAPITests(TestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
+    @patch('reflections.tasks.publish_transcription')
+    def test_new_audio_is_processed_again(self, mock_publish):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('reflection-list'),
+                {'audio_file': SimpleUploadedFile('first.wav', make_wav(sample_rate=44100))},
+                format='multipart'
+            )
+        reflection = Reflection.objects.get(pk=response.data['id'])
+        self.assertEqual(reflection.status, 'done')
+        first_audio, first_transcription = reflection.current_audio.name, reflection.transcription
+        first_peaks = ReflectionPeaks.objects.get(reflection=reflection).data
+
+        url = reverse('reflection-detail', args=[reflection.id])
+        with patch('reflections.views.enqueue_audio_processing') as mock_enqueue, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                url, {'audio_file': SimpleUploadedFile('second.wav', make_wav(seconds=2, sample_rate=44100))},
+                format='multipart'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        mock_enqueue.assert_called_once_with(reflection.id)
+        reflection.refresh_from_db()
+        self.assertEqual(reflection.status, 'queued')
+        self.assertFalse(reflection.normalized_audio)
+        self.assertFalse(ReflectionPeaks.objects.filter(reflection=reflection).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            normalize_audio(reflection.id)
+        reflection.refresh_from_db()
+        self.assertEqual(reflection.status, 'done')
+        self.assertNotEqual(reflection.current_audio.name, first_audio)
+        self.assertNotEqual(reflection.transcription, first_transcription)
+        self.assertNotEqual(ReflectionPeaks.objects.get(reflection=reflection).data, first_peaks)
+
+        # Saving the same audio again keeps the results.
+        with patch('reflections.views.enqueue_audio_processing') as mock_enqueue:
+            self.client.patch(
+                url, {'audio_file': SimpleUploadedFile('again.wav', make_wav(seconds=2, sample_rate=44100))},
+                format='multipart'
+            )
+        mock_enqueue.assert_not_called()
+        reflection.refresh_from_db()
+        self.assertEqual(reflection.status, 'done')
+
     def test_unauthenticated_access(self):
         self.client.force_authenticate(user=None)
         url = reverse('reflection-list')
@@ -108,7 +294,7 @@ class TranscriptionTaskTests(TestCase):
         )
         self.audio_file = SimpleUploadedFile(
             "test_audio.wav",
-            b"file_content",
+            make_wav(),
             content_type="audio/wav"
         )
         self.reflection = Reflection.objects.create(
@@ -127,6 +313,25 @@ class TranscriptionTaskTests(TestCase):
         self.assertTrue(len(self.reflection.ai_summary) > 0)
         self.assertTrue(len(self.reflection.keywords) > 0)
 
+    @override_settings(TRANSCRIPTION_WORKERS=2, TRANSCRIPTION_WINDOW_SECONDS=1)
+    def test_transcribe_audio_in_prefork_worker(self):
+        # Celery's prefork children are daemonic processes.
+        self.reflection.audio_file.save('long.wav', io.BytesIO(make_wav(seconds=3)))
+        with Pool(1) as pool:
+            transcription = pool.apply(transcribe_in_worker, (self.reflection.id,))
+        self.assertEqual(transcription.count('.'), 3)
+        self.reflection.audio_file.seek(0)
+        self.assertEqual(transcription, transcribe_file(self.reflection.audio_file, workers=1))
+
+    def test_transcribe_audio_task_undecodable_audio(self):
+        reflection = Reflection.objects.create(
+            user=self.user,
+            audio_file=SimpleUploadedFile("broken.wav", b"file_content", content_type="audio/wav")
+        )
+        self.assertTrue(transcribe_audio(reflection.id))
+        reflection.refresh_from_db()
+        self.assertEqual(reflection.transcription, "Audio could not be decoded for transcription.")
+
     def test_transcribe_audio_task_invalid_id(self):
         # Test the task with a non-existent reflection ID
         result = transcribe_audio(999999)
@@ -150,3 +355,999 @@ class TranscriptionTaskTests(TestCase):
         # Check that the task was called with the new reflection's ID
         reflection_id = response.data['id']
         mock_task.assert_called_once_with(reflection_id)
+
+class AudioDeduplicationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.content = make_wav(frequency=321.0)
+
+    @patch('reflections.tasks.transcribe_audio.delay')
+    def test_duplicate_uploads_share_stored_audio(self, mock_task):
+        url = reverse('reflection-list')
+        ids = []
+        for name in ('first.wav', 'retry.wav'):
+            audio = SimpleUploadedFile(name, self.content, content_type="audio/wav")
+            ids.append(self.client.post(url, {'audio_file': audio}, format='multipart').data['id'])
+        first, retry = Reflection.objects.get(id=ids[0]), Reflection.objects.get(id=ids[1])
+        expected = hashlib.sha256(self.content).hexdigest()
+        self.assertEqual(first.audio_sha256, expected)
+        self.assertEqual(first.audio_file.name, retry.audio_file.name)
+        self.assertIn(expected, first.audio_file.name)
+
+    def test_transcription_result_is_reused(self):
+        sha256 = hashlib.sha256(self.content).hexdigest()
+        reflections = [
+            Reflection.objects.create(
+                user=self.user,
+                audio_file=SimpleUploadedFile("audio.wav", self.content, content_type="audio/wav"),
+                audio_sha256=sha256
+            )
+            for _ in range(2)
+        ]
+        transcribe_audio(reflections[0].id)
+        self.assertEqual(TranscriptionResult.objects.count(), 1)
+        with patch('reflections.tasks.transcribe_file') as mock_transcribe:
+            transcribe_audio(reflections[1].id)
+        mock_transcribe.assert_not_called()
+        reflections[0].refresh_from_db()
+        reflections[1].refresh_from_db()
+        self.assertEqual(reflections[1].transcription, reflections[0].transcription)
+        self.assertEqual(reflections[1].keywords, reflections[0].keywords)
+
+
+class BatchTranscriptionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.reflections = [
+            Reflection.objects.create(
+                user=self.user,
+                audio_file=SimpleUploadedFile(f"audio_{i}.wav", make_wav(frequency=200 + i), content_type="audio/wav")
+            )
+            for i in range(3)
+        ]
+
+    def test_batch_transcribes_every_reflection(self):
+        ids = [reflection.id for reflection in self.reflections]
+        self.assertEqual(transcribe_batch(ids), 3)
+        for reflection in Reflection.objects.filter(id__in=ids):
+            self.assertTrue(reflection.transcription)
+
+    def test_engine_is_loaded_once_per_process(self):
+        self.assertIs(get_engine(), get_engine())
+        with patch.object(StubTranscriptionEngine, 'load') as mock_load:
+            transcribe_batch([reflection.id for reflection in self.reflections])
+        mock_load.assert_not_called()
+
+    @patch('reflections.tasks.transcribe_audio.delay')
+    def test_enqueue_without_batching(self, mock_task):
+        enqueue_transcription(self.reflections[0].id)
+        mock_task.assert_called_once_with(self.reflections[0].id)
+
+    @override_settings(TRANSCRIPTION_BATCH_SIZE=2, TRANSCRIPTION_BATCH_WINDOW=5)
+    @patch('reflections.tasks.transcribe_batch.delay')
+    @patch('reflections.tasks.transcribe_batch.apply_async')
+    @patch('reflections.tasks.get_redis_connection')
+    def test_enqueue_with_batching(self, mock_redis, mock_apply_async, mock_delay):
+        redis = MagicMock()
+        redis.rpush.side_effect = [1, 2]
+        mock_redis.return_value = redis
+        enqueue_transcription(self.reflections[0].id)
+        mock_apply_async.assert_called_once_with(countdown=5)
+        enqueue_transcription(self.reflections[1].id)
+        mock_delay.assert_called_once_with()
+
+    @override_settings(TRANSCRIPTION_BATCH_SIZE=2)
+    def test_batch_drains_pending_list(self):
+        redis = FakeRedisLists()
+        redis.lists[PENDING_TRANSCRIPTIONS_KEY] = [str(reflection.id).encode() for reflection in self.reflections]
+        with patch('reflections.tasks.get_redis_connection', return_value=redis), \
+                patch('reflections.tasks.transcribe_batch.delay') as delay:
+            self.assertEqual(transcribe_batch.apply(task_id='batch-1').get(), 2)
+        self.assertEqual(redis.lists, {PENDING_TRANSCRIPTIONS_KEY: [str(self.reflections[2].id).encode()]})
+        delay.assert_called_once_with()
+
+    @override_settings(TRANSCRIPTION_BATCH_SIZE=3)
+    def test_failed_batch_returns_unprocessed_ids(self):
+        redis = FakeRedisLists()
+        ids = [str(reflection.id).encode() for reflection in self.reflections]
+        redis.lists[PENDING_TRANSCRIPTIONS_KEY] = list(ids)
+        calls = []
+
+        def transcribe(reflection, engine):
+            calls.append(reflection.id)
+            if len(calls) == 2:
+                raise SystemExit()
+        with patch('reflections.tasks.get_redis_connection', return_value=redis), \
+                patch('reflections.tasks._transcribe_reflection', side_effect=transcribe), \
+                self.assertRaises(SystemExit):
+            transcribe_batch.apply(task_id='batch-1')
+        # Only the first reflection finished; the other two are pending again.
+        self.assertEqual(list(redis.lists), [PENDING_TRANSCRIPTIONS_KEY])
+        self.assertCountEqual(redis.lists[PENDING_TRANSCRIPTIONS_KEY], [value for value in ids if int(value) != calls[0]])
+
+    @override_settings(TRANSCRIPTION_BATCH_SIZE=2)
+    def test_redelivered_batch_resumes_its_ids(self):
+        # The worker was killed after moving the ids off the pending list.
+        redis = FakeRedisLists()
+        processing = PROCESSING_TRANSCRIPTIONS_KEY.format('batch-1')
+        redis.lists[processing] = [str(self.reflections[0].id).encode()]
+        with patch('reflections.tasks.get_redis_connection', return_value=redis):
+            self.assertEqual(transcribe_batch.apply(task_id='batch-1').get(), 1)
+        self.assertEqual(redis.lists, {})
+        self.assertTrue(Reflection.objects.get(pk=self.reflections[0].pk).transcription)
+
+
+class ReflectionSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def create_indexed(self, user, transcription, ai_summary=''):
+        reflection = Reflection.objects.create(user=user, transcription=transcription, ai_summary=ai_summary)
+        index_reflection(reflection)
+        return reflection
+
+    def test_search_ranks_matches(self):
+        strong = self.create_indexed(self.user, 'Running every morning. Running felt great.', 'Running habit')
+        weak = self.create_indexed(self.user, 'Went for a run after work.', 'Busy day')
+        self.create_indexed(self.user, 'Read a book about gardens.')
+        url = reverse('reflection-search')
+        response = self.client.get(url, {'q': 'running'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [item['id'] for item in response.data['results']]
+        self.assertEqual(ids, [strong.id, weak.id])
+        self.assertIn('rank', response.data['results'][0])
+
+    def test_search_is_scoped_to_user(self):
+        other_user = User.objects.create_user(email='other@example.com', password='otherpass123')
+        self.create_indexed(other_user, 'Secret gardening plans')
+        self.assertEqual(search_reflections(self.user, 'gardening'), [])
+
+    def test_search_requires_query(self):
+        response = self.client.get(reverse('reflection-search'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_reindexed_after_transcription_and_removed_on_delete(self):
+        reflection = Reflection.objects.create(
+            user=self.user,
+            audio_file=SimpleUploadedFile("test_audio.wav", make_wav(), content_type="audio/wav")
+        )
+        transcribe_audio(reflection.id)
+        reflection.refresh_from_db()
+        first_word = reflection.transcription.split()[0].strip('.')
+        self.assertEqual([r.id for r in search_reflections(self.user, first_word)], [reflection.id])
+        reflection.delete()
+        self.assertEqual(search_reflections(self.user, first_word), [])
+
+
+class ReflectionKeywordIndexTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def create_with_keywords(self, keywords, user=None):
+        reflection = Reflection.objects.create(user=user or self.user, keywords=keywords)
+        ReflectionKeyword.objects.sync(reflection)
+        return reflection
+
+    def test_sync_is_incremental(self):
+        reflection = self.create_with_keywords(['Running', 'sleep'])
+        kept = ReflectionKeyword.objects.get(reflection=reflection, keyword='running')
+        reflection.keywords = ['running', 'Family  Time']
+        ReflectionKeyword.objects.sync(reflection)
+        self.assertEqual(
+            set(ReflectionKeyword.objects.filter(reflection=reflection).values_list('keyword', flat=True)),
+            {'running', 'family time'}
+        )
+        self.assertTrue(ReflectionKeyword.objects.filter(pk=kept.pk).exists())
+
+    def test_filter_by_keyword(self):
+        match = self.create_with_keywords(['running'])
+        self.create_with_keywords(['sleep'])
+        response = self.client.get(reverse('reflection-list'), {'keyword': 'Running'})
+        self.assertEqual([item['id'] for item in response.data['results']], [match.id])
+
+    def test_keyword_facets(self):
+        self.create_with_keywords(['running', 'sleep'])
+        self.create_with_keywords(['running'])
+        other_user = User.objects.create_user(email='other@example.com', password='otherpass123')
+        self.create_with_keywords(['sleep'], user=other_user)
+        response = self.client.get(reverse('reflection-keywords'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [
+            {'keyword': 'running', 'count': 2},
+            {'keyword': 'sleep', 'count': 1},
+        ])
+
+    def test_transcription_updates_index(self):
+        reflection = Reflection.objects.create(
+            user=self.user,
+            audio_file=SimpleUploadedFile("test_audio.wav", make_wav(), content_type="audio/wav")
+        )
+        transcribe_audio(reflection.id)
+        reflection.refresh_from_db()
+        self.assertEqual(
+            set(ReflectionKeyword.objects.filter(reflection=reflection).values_list('keyword', flat=True)),
+            set(reflection.keywords)
+        )
+
+
+@override_settings(TRANSCRIPTION_WINDOW_SECONDS=1)
+class TranscriptionEngineTests(TestCase):
+    def test_stub_engine_is_deterministic(self):
+        audio = make_wav(seconds=3)
+        first = transcribe_file(io.BytesIO(audio), StubTranscriptionEngine(), workers=1)
+        second = transcribe_file(io.BytesIO(audio), StubTranscriptionEngine(), workers=1)
+        self.assertEqual(first, second)
+        self.assertEqual(first.count('.'), 3)
+
+    def test_silent_windows_are_skipped(self):
+        silence = make_wav(seconds=2, frequency=0)
+        self.assertEqual(transcribe_file(io.BytesIO(silence), StubTranscriptionEngine(), workers=1), '')
+
+    def test_pool_preserves_window_order(self):
+        audio = make_wav(seconds=5, channels=2, frequency=123.4)
+        serial = transcribe_file(io.BytesIO(audio), StubTranscriptionEngine(), workers=1)
+        for engine in (StubTranscriptionEngine(), ThreadStubEngine()):
+            self.assertEqual(transcribe_file(io.BytesIO(audio), engine, workers=2), serial)
+
+    def test_executor_is_chosen_per_engine(self):
+        audio = make_wav(seconds=4)
+        def pids(engine):
+            return {pid.rstrip('.') for pid in transcribe_file(io.BytesIO(audio), engine, workers=2).split()}
+        self.assertNotIn(str(os.getpid()), pids(PidEngine()))
+        self.assertEqual(pids(ThreadPidEngine()), {str(os.getpid())})
+
+    @skipIf((os.cpu_count() or 1) < 2, 'needs at least two cores')
+    def test_process_pool_speeds_up_gil_bound_engine(self):
+        audio = io.BytesIO(make_wav(seconds=8))
+        engine = BusyEngine()
+        transcribe_file(audio, engine, workers=2)
+
+        def timed(workers):
+            audio.seek(0)
+            start = time.perf_counter()
+            transcribe_file(audio, engine, workers=workers)
+            return time.perf_counter() - start
+        # Ideally 2x; leave room for pickling windows and a busy machine.
+        self.assertGreater(timed(1) / timed(2), 1.5)
+
+
+class AudioUploadAPITests(TestCase):
+    def setUp(self):
+        self.upload_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.upload_dir, ignore_errors=True)
+        settings_override = override_settings(REFLECTION_UPLOAD_DIR=self.upload_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.content = b"RIFF" + bytes(range(256)) * 40
+        self.upload = self.client.post(reverse('reflection-upload-list'), {
+            'filename': 'long_entry.wav',
+            'size': len(self.content),
+            'checksum': hashlib.sha256(self.content).hexdigest(),
+        }, format='json').data
+
+    def send_chunk(self, offset, chunk, **extra):
+        url = reverse('reflection-upload-detail', args=[self.upload['id']])
+        return self.client.generic(
+            'PATCH', url, chunk,
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset),
+            **extra
+        )
+
+    def test_resume_after_partial_upload(self):
+        self.assertEqual(self.upload['offset'], 0)
+        response = self.send_chunk(0, self.content[:4000])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Upload-Offset'], '4000')
+
+        url = reverse('reflection-upload-detail', args=[self.upload['id']])
+        response = self.client.head(url)
+        self.assertEqual(response['Upload-Offset'], '4000')
+
+        response = self.client.head(url, HTTP_ORIGIN='http://localhost:3000')
+        self.assertIn('Upload-Offset', response['Access-Control-Expose-Headers'])
+        response = self.client.options(
+            url, HTTP_ORIGIN='http://localhost:3000',
+            HTTP_ACCESS_CONTROL_REQUEST_METHOD='PATCH',
+            HTTP_ACCESS_CONTROL_REQUEST_HEADERS='upload-offset, upload-checksum',
+        )
+        self.assertIn('upload-checksum', response['Access-Control-Allow-Headers'])
+
+        response = self.send_chunk(4000, self.content[4000:])
+        self.assertEqual(response.data['offset'], len(self.content))
+
+    def test_offset_mismatch_is_rejected(self):
+        self.send_chunk(0, self.content[:100])
+        response = self.send_chunk(0, self.content[:100])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['offset'], 100)
+
+    def test_chunk_checksum_mismatch_rolls_back(self):
+        bad_digest = base64.b64encode(hashlib.sha256(b'other').digest()).decode()
+        response = self.send_chunk(0, self.content[:100], HTTP_UPLOAD_CHECKSUM=f'sha256 {bad_digest}')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(AudioUpload.objects.get().offset, 0)
+
+    @patch('reflections.tasks.transcribe_audio.delay')
+    def test_complete_creates_reflection(self, mock_task):
+        self.send_chunk(0, self.content)
+        url = reverse('reflection-upload-complete', args=[self.upload['id']])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        reflection = Reflection.objects.get()
+        self.assertEqual(reflection.audio_file.read(), self.content)
+        mock_task.assert_called_once_with(reflection.id)
+
+        # Retrying the finalize call returns the same reflection
+        response = self.client.post(url)
+        self.assertEqual(response.data['id'], reflection.id)
+        self.assertEqual(Reflection.objects.count(), 1)
+
+    @patch('reflections.tasks.transcribe_audio.delay')
+    def test_only_complete_takes_the_audio_lock(self, mock_task):
+        redis = MagicMock()
+        with patch('reflections.uploads.get_redis_connection', return_value=redis):
+            self.send_chunk(0, self.content)
+            # A slow chunk must not hold up other uploads of the same bytes.
+            redis.lock.assert_not_called()
+            self.client.post(reverse('reflection-upload-complete', args=[self.upload['id']]))
+        redis.lock.assert_called_once_with(
+            f'reflections:audio-lock:{self.upload["checksum"]}', timeout=uploads.AUDIO_LOCK_TIMEOUT
+        )
+
+    def test_checksum_mismatch_restarts_upload(self):
+        corrupted = b'X' + self.content[1:]
+        self.send_chunk(0, corrupted)
+        url = reverse('reflection-upload-complete', args=[self.upload['id']])
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['offset'], 0)
+        self.assertEqual(os.path.getsize(AudioUpload.objects.get().partial_path), 0)
+
+        self.assertEqual(self.send_chunk(0, self.content).status_code, status.HTTP_200_OK)
+        with patch('reflections.views.enqueue_audio_processing'):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_abandoned_uploads_are_swept(self):
+        self.send_chunk(0, self.content[:100])
+        abandoned = AudioUpload.objects.get()
+        active = self.client.post(reverse('reflection-upload-list'), {
+            'filename': 'other.wav', 'size': 10, 'checksum': '0' * 64,
+        }, format='json').data
+
+        with override_settings(REFLECTION_UPLOAD_EXPIRY=3600):
+            self.assertEqual(sweep_abandoned_uploads(), 0)
+            AudioUpload.objects.filter(pk=abandoned.pk).update(updated_at=timezone.now() - timedelta(hours=2))
+            # Left behind by an upload whose row is gone
+            stray = os.path.join(self.upload_dir, 'f81d4fae-7dec-11d0-a765-00a0c91e6bf6.part')
+            open(stray, 'wb').close()
+            two_hours_ago = time.time() - 2 * 3600
+            os.utime(stray, (two_hours_ago, two_hours_ago))
+            self.assertEqual(sweep_abandoned_uploads(), 2)
+        self.assertEqual(list(AudioUpload.objects.values_list('pk', flat=True)), [uuid.UUID(active['id'])])
+        self.assertEqual(os.listdir(self.upload_dir), [f'{active["id"]}.part'])
+
+    def test_complete_rejects_incomplete_upload(self):
+        self.send_chunk(0, self.content[:100])
+        url = reverse('reflection-upload-complete', args=[self.upload['id']])
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Reflection.objects.exists())
+
+
+
+class AudioNormalizationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+
+    def read_wav(self, data):
+        with wave.open(io.BytesIO(data), 'rb') as reader:
+            params = (reader.getnchannels(), reader.getsampwidth(), reader.getframerate())
+            samples = np.frombuffer(reader.readframes(reader.getnframes()), dtype='<i2')
+        return params, samples
+
+    def test_downmixes_and_resamples(self):
+        out = io.BytesIO()
+        frames = normalize_wav(io.BytesIO(make_wav(seconds=2, sample_rate=44100, channels=2)), out, block_seconds=0.25)
+        params, samples = self.read_wav(out.getvalue())
+        self.assertEqual(params, (1, 2, 16000))
+        self.assertEqual(frames, len(samples))
+        self.assertAlmostEqual(len(samples), 32000, delta=2)
+        spectrum = np.abs(np.fft.rfft(samples))
+        self.assertAlmostEqual(np.argmax(spectrum) * 16000 / len(samples), 440, delta=1)
+
+    def test_filters_frequencies_above_new_nyquist(self):
+        out = io.BytesIO()
+        normalize_wav(io.BytesIO(make_wav(seconds=1, sample_rate=48000, frequency=12000)), out)
+        _, samples = self.read_wav(out.getvalue())
+        self.assertLess(np.abs(samples[100:]).max(), 200)
+
+    def test_task_stores_compact_copy_and_transcribes_it(self):
+        original = make_wav(seconds=2, sample_rate=48000, channels=2)
+        reflection = Reflection.objects.create(
+            user=self.user,
+            audio_file=SimpleUploadedFile('big.wav', original),
+            audio_sha256=hashlib.sha256(original).hexdigest()
+        )
+        with patch('reflections.tasks.transcribe_file', wraps=transcribe_file) as mock_transcribe:
+            self.assertTrue(normalize_audio(reflection.id))
+        reflection.refresh_from_db()
+        self.assertTrue(reflection.audio_file)
+        self.assertLess(reflection.normalized_audio.size * 5, len(original))
+        with reflection.normalized_audio.open('rb') as fh:
+            self.assertEqual(self.read_wav(fh.read())[0], (1, 2, 16000))
+        self.assertEqual(mock_transcribe.call_args[0][0].name, reflection.normalized_audio.name)
+        self.assertTrue(reflection.transcription)
+
+    def test_normalized_input_is_not_copied(self):
+        reflection = Reflection.objects.create(
+            user=self.user, audio_file=SimpleUploadedFile('small.wav', make_wav(sample_rate=16000))
+        )
+        normalize_audio(reflection.id)
+        reflection.refresh_from_db()
+        self.assertEqual(reflection.normalized_audio.name, reflection.audio_file.name)
+
+    @override_settings(AUDIO_KEEP_ORIGINAL=False)
+    def test_original_can_be_dropped(self):
+        audio = make_wav(sample_rate=44100)
+        sha256 = hashlib.sha256(audio).hexdigest()
+        reflections = [
+            Reflection.objects.create(user=self.user, audio_file=SimpleUploadedFile('a.wav', audio), audio_sha256=sha256)
+            for _ in range(2)
+        ]
+        Reflection.objects.filter(pk=reflections[1].pk).update(audio_file=reflections[0].audio_file.name)
+        storage = Reflection._meta.get_field('audio_file').storage
+        original = reflections[0].audio_file.name
+
+        normalize_audio(reflections[0].id)
+        reflections[0].refresh_from_db()
+        self.assertFalse(reflections[0].audio_file)
+        # Still referenced by the second reflection
+        self.assertTrue(storage.exists(original))
+
+        normalize_audio(reflections[1].id)
+        reflections[1].refresh_from_db()
+        self.assertEqual(reflections[1].normalized_audio.name, reflections[0].normalized_audio.name)
+        self.assertFalse(storage.exists(original))
+
+    @override_settings(AUDIO_KEEP_ORIGINAL=False)
+    def test_reuse_and_deletion_share_a_lock(self):
+        audio = make_wav(sample_rate=44100)
+        key = f'reflections:audio-lock:{hashlib.sha256(audio).hexdigest()}'
+        storage = Reflection._meta.get_field('audio_file').storage
+        events = []
+        redis = MagicMock()
+        redis.lock.return_value.__enter__.side_effect = lambda: events.append('lock')
+        redis.lock.return_value.__exit__.side_effect = lambda *args: events.append('unlock')
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        with patch('reflections.uploads.get_redis_connection', return_value=redis), \
+                patch('reflections.views.enqueue_audio_processing'), \
+                patch.object(storage, 'delete', side_effect=lambda name: events.append('delete')):
+            response = client.post(
+                reverse('reflection-list'), {'audio_file': SimpleUploadedFile('a.wav', audio)}, format='multipart'
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(events, ['lock', 'unlock'])
+            normalize_audio(response.data['id'])
+        self.assertEqual(events, ['lock', 'unlock', 'lock', 'delete', 'unlock'])
+        self.assertEqual({call.args[0] for call in redis.lock.call_args_list}, {key})
+
+
+class AudioStreamingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.audio = make_wav(seconds=1)
+        self.reflection = Reflection.objects.create(
+            user=self.user, audio_file=SimpleUploadedFile('audio.wav', self.audio)
+        )
+        self.url = reverse('reflection-audio', args=[self.reflection.id])
+
+    def content(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_file(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, HTTP_ACCEPT='audio/*')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'audio/x-wav')
+        self.assertEqual(self.content(response), self.audio)
+
+    def test_ranges(self):
+        self.client.force_authenticate(user=self.user)
+        size = len(self.audio)
+        for header, expected in (
+            ('bytes=10-19', self.audio[10:20]),
+            ('bytes=100-', self.audio[100:]),
+            ('bytes=-16', self.audio[-16:]),
+            ('bytes=10-999999', self.audio[10:]),
+        ):
+            response = self.client.get(self.url, HTTP_RANGE=header)
+            self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+            self.assertEqual(self.content(response), expected)
+            self.assertEqual(response['Content-Length'], str(len(expected)))
+        self.assertEqual(response['Content-Range'], f'bytes 10-{size - 1}/{size}')
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={size}-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response['Content-Range'], f'bytes */{size}')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_requires_owner(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        other_user = User.objects.create_user(email='other@example.com', password='otherpass123')
+        self.client.force_authenticate(user=other_user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_signed_url(self):
+        self.client.force_authenticate(user=self.user)
+        data = self.client.get(reverse('reflection-detail', args=[self.reflection.id])).data
+        # Storage paths are not public links.
+        self.assertNotIn('audio_file', data)
+        self.assertNotIn('normalized_audio', data)
+        url = data['audio_url']
+        self.client.force_authenticate(user=None)
+        response = self.client.get(url, HTTP_RANGE='bytes=0-3')
+        self.assertEqual(self.content(response), b'RIFF')
+
+        other = Reflection.objects.create(user=self.user, audio_file=SimpleUploadedFile('other.wav', self.audio))
+        token = url.split('token=')[1]
+        response = self.client.get(reverse('reflection-audio', args=[other.id]), {'token': token})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        with override_settings(AUDIO_URL_MAX_AGE=-1):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(AUDIO_SENDFILE_BACKEND='x-accel-redirect', AUDIO_SENDFILE_PREFIX='/protected-media/')
+    def test_offload_to_proxy(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-3')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.reflection.audio_file.name}')
+        self.assertEqual(response.content, b'')
+
+
+class WaveformPeaksTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_compute_peaks_levels(self):
+        sample_rate, peaks = compute_peaks(io.BytesIO(make_wav(seconds=2, sample_rate=16000)), block_seconds=0.3)
+        self.assertEqual(sample_rate, 16000)
+        self.assertEqual(list(peaks), list(PEAK_LEVELS))
+        for samples_per_peak, data in peaks.items():
+            pairs = np.frombuffer(data, dtype=np.int8).reshape(-1, 2)
+            self.assertEqual(len(pairs), math.ceil(32000 / samples_per_peak))
+            self.assertTrue((pairs[:, 0] <= pairs[:, 1]).all())
+        coarse = np.frombuffer(peaks[16384], dtype=np.int8).reshape(-1, 2)
+        # 12000 / 32768 of full scale
+        self.assertEqual((coarse[0, 0], coarse[0, 1]), (-47, 47))
+
+    @patch('reflections.tasks.transcribe_audio.delay')
+    def test_upload_produces_peaks(self, mock_task):
+        response = self.client.post(
+            reverse('reflection-list'),
+            {'audio_file': SimpleUploadedFile('long.wav', make_wav(seconds=10, sample_rate=44100, channels=2))},
+            format='multipart'
+        )
+        url = reverse('reflection-peaks', args=[response.data['id']])
+        response = self.client.get(url, {'width': 200}, HTTP_ORIGIN='http://localhost:3000')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('X-Peaks-Samples-Per-Peak', response['Access-Control-Expose-Headers'])
+        self.assertEqual(response['X-Peaks-Sample-Rate'], '16000')
+        self.assertEqual(response['X-Peaks-Samples-Per-Peak'], '1024')
+        self.assertEqual(len(response.content), 2 * math.ceil(160000 / 1024))
+
+        response = self.client.get(url, {'samples_per_peak': 256})
+        self.assertEqual(len(response.content), 2 * 625)
+        response = self.client.get(url, {'samples_per_peak': 300})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_missing_peaks(self):
+        reflection = Reflection.objects.create(user=self.user)
+        response = self.client.get(reverse('reflection-peaks', args=[reflection.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(compute_waveform_peaks(reflection.id))
+
+
+class ReflectionAnalysisTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+
+    def test_summarize_prefers_distinctive_terms(self):
+        text = (
+            'Today I worked on the project. The garden needs watering and the tomatoes are ripe. '
+            'Then I worked on the project again.'
+        )
+        # Everything but the garden is in every reflection.
+        frequencies = {term: 10 for term in ('today', 'worked', 'project', 'needs', 'watering', 'ripe', 'again')}
+        frequencies.update(garden=1, tomatoes=1)
+        keywords, summary = summarize(text, frequencies, 10, max_keywords=3, summary_sentences=1)
+        self.assertEqual(keywords, ['garden', 'tomatoes', 'project'])
+        self.assertEqual(summary, 'The garden needs watering and the tomatoes are ripe.')
+
+    def analyze(self, text):
+        reflection = Reflection.objects.create(user=self.user, transcription=text)
+        analyze_reflection(reflection, text)
+        reflection.save()
+        return reflection
+
+    def frequencies(self):
+        return dict(TermFrequency.objects.filter(user=self.user).values_list('term', 'documents'))
+
+    def test_document_frequencies_are_incremental(self):
+        first = self.analyze('Morning run in the park. Felt strong.')
+        self.analyze('Evening run with a friend.')
+        self.assertEqual(self.frequencies()[''], 2)
+        self.assertEqual(self.frequencies()['run'], 2)
+        self.assertEqual(self.frequencies()['park'], 1)
+
+        analyze_reflection(first, 'Quiet morning reading.')
+        first.save()
+        self.assertEqual(self.frequencies()['run'], 1)
+        self.assertEqual(self.frequencies()['park'], 0)
+
+        first.delete()
+        self.assertEqual(self.frequencies()[''], 1)
+        self.assertEqual(self.frequencies()['morning'], 0)
+
+    def test_transcription_sets_keywords_and_summary(self):
+        reflection = Reflection.objects.create(
+            user=self.user, audio_file=SimpleUploadedFile('audio.wav', make_wav(seconds=3))
+        )
+        with override_settings(TRANSCRIPTION_WINDOW_SECONDS=1):
+            transcribe_audio(reflection.id)
+        reflection.refresh_from_db()
+        self.assertTrue(reflection.keywords)
+        self.assertNotIn('placeholder', reflection.keywords)
+        self.assertTrue(set(reflection.keywords) <= set(reflection.terms))
+        self.assertIn(reflection.ai_summary.split('.')[0], reflection.transcription)
+
+    def test_failed_transcription_has_no_keywords(self):
+        reflection = Reflection.objects.create(user=self.user)
+        transcribe_audio(reflection.id)
+        reflection.refresh_from_db()
+        self.assertEqual((reflection.keywords, reflection.terms), ([], []))
+        self.assertEqual(self.frequencies(), {})
+
+    def test_reanalyze_rebuilds_frequencies(self):
+        reflections = [self.analyze(text) for text in ('Run in the park.', 'Run to work.', 'Read a book.')]
+        TermFrequency.objects.filter(user=self.user).update(documents=99)
+        Reflection.objects.create(user=self.user, transcription=NO_AUDIO_MESSAGE)
+        out = io.StringIO()
+        call_command('reanalyze_reflections', stdout=out)
+        self.assertIn('Reanalyzed 4 reflections', out.getvalue())
+        self.assertEqual(self.frequencies(), {'': 3, 'run': 2, 'park': 1, 'work': 1, 'read': 1, 'book': 1})
+        reflections[2].refresh_from_db()
+        self.assertEqual(reflections[2].keywords, ['book', 'read'])
+
+    def test_reanalyze_clears_summary_and_index_of_skipped_reflections(self):
+        reflection = self.analyze('Run in the park. Felt strong.')
+        Reflection.objects.filter(pk=reflection.pk).update(transcription=NO_AUDIO_MESSAGE)
+        reanalyze_user(self.user, skip_transcriptions=(NO_AUDIO_MESSAGE,))
+        reflection.refresh_from_db()
+        self.assertEqual((reflection.keywords, reflection.terms, reflection.ai_summary), ([], [], ''))
+        self.assertFalse(ReflectionKeyword.objects.filter(reflection=reflection).exists())
+        self.assertFalse(ReflectionVector.objects.filter(reflection=reflection).exists())
+
+    def test_reanalyze_queries_do_not_grow_with_reflections(self):
+        def queries():
+            with CaptureQueriesContext(connection) as context:
+                reanalyze_user(self.user)
+            return len(context.captured_queries)
+
+        for text in ('Run in the park.', 'Run to work.'):
+            self.analyze(text)
+        few = queries()
+        for text in ('Read a book.', 'Swim in the lake.', 'Cook some dinner.', 'Walk the dog.'):
+            self.analyze(text)
+        self.assertEqual(queries(), few)
+        self.assertEqual(ReflectionKeyword.objects.filter(user=self.user).count(), 12)
+        self.assertEqual(ReflectionVector.objects.filter(user=self.user).count(), 6)
+        self.assertEqual(len(search_reflections(self.user, 'dog')), 1)
+
+
+class RelatedReflectionsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def create(self, text, user=None):
+        reflection = Reflection.objects.create(user=user or self.user, transcription=text)
+        update_vector(reflection, text)
+        return reflection
+
+    def test_embedding_is_normalized_int8(self):
+        vector = embed('Long morning run along the river before work.')
+        self.assertEqual((vector.dtype, vector.shape), (np.int8, (256,)))
+        self.assertAlmostEqual(np.linalg.norm(vector.astype(np.float32)) / 127, 1, delta=0.05)
+        self.assertIsNone(embed('and the of'))
+
+    def test_related_ranks_similar_entries_first(self):
+        anchor = self.create('Long morning run along the river, legs felt heavy after the run.')
+        similar = self.create('Another morning run along the river, legs felt great on this run.')
+        related = self.create('Evening run in the park.')
+        self.create('Cooked pasta for the family and planned the holiday budget.')
+        self.create('Morning run along the river.', user=User.objects.create_user(email='o@example.com', password='x'))
+
+        response = self.client.get(reverse('reflection-related', args=[anchor.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual([item['id'] for item in results], [similar.id, related.id])
+        self.assertGreater(results[0]['similarity'], results[1]['similarity'])
+
+    def test_cached_matrix_follows_changes(self):
+        anchor = self.create('Garden tomatoes and basil.')
+        self.assertEqual(related_ids(anchor), [])
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual(related_ids(anchor), [])
+            with self.captureOnCommitCallbacks(execute=True):
+                match = self.create('Picked tomatoes in the garden.')
+            self.assertEqual([pk for pk, _ in related_ids(anchor)], [match.id])
+
+    def test_transcription_stores_vector(self):
+        reflection = Reflection.objects.create(
+            user=self.user, audio_file=SimpleUploadedFile('audio.wav', make_wav())
+        )
+        transcribe_audio(reflection.id)
+        self.assertTrue(ReflectionVector.objects.filter(reflection=reflection).exists())
+
+
+class FakePubSub:
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.channels = []
+        self.closed = False
+
+    async def subscribe(self, channel):
+        self.channels.append(channel)
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=None):
+        return self.messages.pop(0) if self.messages else None
+
+    async def aclose(self):
+        self.closed = True
+
+
+@override_settings(REFLECTION_EVENTS_HEARTBEAT=0)
+class ReflectionEventsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.token = str(AccessToken.for_user(self.user))
+        self.url = reverse('reflection-events')
+
+    def connect(self, pubsub):
+        client = MagicMock()
+        client.pubsub.return_value = pubsub
+
+        async def aclose():
+            pass
+        client.aclose = aclose
+        return patch('reflections.events.connect', return_value=client)
+
+    async def read_events(self, response, count):
+        chunks = []
+        async for chunk in response.streaming_content:
+            chunks.append(chunk.decode())
+            if len(chunks) == count:
+                break
+        return chunks
+
+    def test_completed_transcription_is_published(self):
+        reflection = Reflection.objects.create(
+            user=self.user, audio_file=SimpleUploadedFile('audio.wav', make_wav())
+        )
+        with patch('reflections.events.get_redis_connection') as redis, \
+                self.captureOnCommitCallbacks(execute=True):
+            transcribe_audio(reflection.id)
+        channel, message = redis.return_value.publish.call_args.args
+        self.assertEqual(channel, channel_name(self.user.id))
+        payload = json.loads(message)
+        self.assertEqual(payload['event'], 'transcription')
+        self.assertEqual(payload['data']['id'], reflection.id)
+        self.assertEqual(payload['data']['reflection']['transcription'], Reflection.objects.get().transcription)
+
+    def test_nothing_is_published_on_rollback(self):
+        reflection = Reflection.objects.create(
+            user=self.user, audio_file=SimpleUploadedFile('audio.wav', make_wav())
+        )
+        with patch('reflections.events.get_redis_connection') as redis:
+            transcribe_audio(reflection.id)
+        redis.return_value.publish.assert_not_called()
+
+    async def test_requires_token(self):
+        response = await AsyncClient().get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = await AsyncClient().get(self.url, {'access_token': 'invalid'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_streams_published_events(self):
+        message = json.dumps({'event': 'transcription', 'data': {'id': 7, 'status': 'completed'}})
+        pubsub = FakePubSub([{'type': 'message', 'data': message.encode()}])
+        with self.connect(pubsub):
+            response = await AsyncClient().get(self.url, headers={'Authorization': f'Bearer {self.token}'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            chunks = await self.read_events(response, 3)
+        self.assertEqual(pubsub.channels, [channel_name(self.user.id)])
+        self.assertTrue(chunks[0].startswith('retry: '))
+        self.assertEqual(chunks[1], 'event: transcription\ndata: {"id": 7, "status": "completed"}\n\n')
+        self.assertEqual(chunks[2], ': keep-alive\n\n')
+
+    async def test_sends_pending_reflections_that_already_finished(self):
+        finished = await Reflection.objects.acreate(user=self.user, transcription='Done already.', status='done')
+        waiting = await Reflection.objects.acreate(user=self.user)
+        with self.connect(FakePubSub([])):
+            response = await AsyncClient().get(
+                self.url, {'access_token': self.token, 'reflection': f'{finished.id},{waiting.id}'}
+            )
+            chunks = await self.read_events(response, 3)
+        event, data = chunks[1].split('\n')[:2]
+        self.assertEqual(event, 'event: transcription')
+        self.assertEqual(json.loads(data[len('data: '):])['id'], finished.id)
+        self.assertEqual(chunks[2], ': keep-alive\n\n')
+
+    async def test_stream_ends_after_max_age(self):
+        finished = await Reflection.objects.acreate(user=self.user, transcription='Done already.', status='done')
+        pubsub = FakePubSub([])
+        with self.connect(pubsub), override_settings(REFLECTION_EVENTS_MAX_AGE=0):
+            response = await AsyncClient().get(self.url, {'access_token': self.token, 'reflection': finished.id})
+            chunks = await self.read_events(response, 10)
+        # The reconnect delay and the pending reflection, but no heartbeats
+        self.assertEqual(len(chunks), 2)
+        self.assertTrue(chunks[1].startswith('event: transcription'))
+        self.assertTrue(pubsub.closed)
+
+
+@override_settings(REFLECTION_RETRY_BACKOFF=60, REFLECTION_QUEUE_TIMEOUT=3600, REFLECTION_MAX_ATTEMPTS=3)
+class ReflectionProcessingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def create(self, **kwargs):
+        return Reflection.objects.create(user=self.user, audio_file=SimpleUploadedFile('audio.wav', make_wav()), **kwargs)
+
+    def test_pipeline_moves_through_statuses(self):
+        reflection = self.create()
+        self.assertEqual(reflection.status, 'queued')
+        self.assertIsNotNone(reflection.lease_expires_at)
+        self.assertTrue(normalize_audio(reflection.id))
+        reflection.refresh_from_db()
+        self.assertEqual((reflection.status, reflection.attempts, reflection.lease_expires_at), ('done', 1, None))
+
+    def test_status_changes_reach_sync_and_cached_lists(self):
+        reflection = self.create(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        Reflection.objects.filter(pk=reflection.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        with patch('reflections.tasks.bump_versions_on_commit') as bump:
+            self.assertTrue(claim_reflection(reflection.id))
+        bump.assert_called_once_with(self.user.id, ('reflections',))
+        claimed = Reflection.objects.get(pk=reflection.pk)
+        self.assertGreater(claimed.updated_at, timezone.now() - timedelta(minutes=1))
+
+        Reflection.objects.filter(pk=reflection.pk).update(
+            lease_expires_at=timezone.now() - timedelta(seconds=1), updated_at=timezone.now() - timedelta(hours=1)
+        )
+        with patch('reflections.tasks.normalize_audio.apply_async'), self.captureOnCommitCallbacks(execute=True):
+            sweep_stalled_reflections()
+        swept = Reflection.objects.get(pk=reflection.pk)
+        self.assertEqual(swept.status, 'queued')
+        self.assertGreater(swept.updated_at, claimed.updated_at)
+
+    def test_undecodable_audio_fails(self):
+        reflection = Reflection.objects.create(user=self.user, audio_file=SimpleUploadedFile('audio.wav', b'junk'))
+        normalize_audio(reflection.id)
+        reflection.refresh_from_db()
+        self.assertEqual(reflection.status, 'failed')
+
+    def test_reflection_without_audio_is_done(self):
+        response = self.client.post(reverse('reflection-list'), {}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['status'], 'done')
+
+    def test_duplicate_delivery_is_dropped(self):
+        reflection = self.create(status='processing', lease_expires_at=timezone.now() + timedelta(minutes=5))
+        self.assertFalse(normalize_audio(reflection.id))
+        done = self.create(status='done', lease_expires_at=None)
+        self.assertFalse(normalize_audio(done.id))
+        self.assertEqual(Reflection.objects.get(pk=reflection.pk).attempts, 0)
+
+    def test_sweeper_requeues_expired_leases_with_backoff(self):
+        expired = timezone.now() - timedelta(seconds=1)
+        crashed = self.create(status='processing', attempts=2, lease_expires_at=expired)
+        lost = self.create(lease_expires_at=expired)
+        running = self.create(status='processing', attempts=1, lease_expires_at=timezone.now() + timedelta(minutes=5))
+        with patch('reflections.tasks.normalize_audio.apply_async') as apply_async, \
+                self.captureOnCommitCallbacks(execute=True):
+            result = sweep_stalled_reflections(chunk_size=1)
+        self.assertEqual(result, {'retried': 2, 'failed': 0})
+        self.assertCountEqual(
+            [(call.args[0], call.kwargs['countdown']) for call in apply_async.call_args_list],
+            [((crashed.id,), 240), ((lost.id,), 60)]
+        )
+        self.assertEqual({call.kwargs['priority'] for call in apply_async.call_args_list}, {6})
+        crashed.refresh_from_db()
+        self.assertEqual(crashed.status, 'queued')
+        self.assertGreater(crashed.lease_expires_at, timezone.now() + timedelta(seconds=3600))
+        running.refresh_from_db()
+        self.assertEqual(running.status, 'processing')
+
+        self.assertTrue(normalize_audio(crashed.id))
+        crashed.refresh_from_db()
+        self.assertEqual((crashed.status, crashed.attempts), ('done', 3))
+
+    def test_sweeper_gives_up_after_max_attempts(self):
+        reflection = self.create(status='processing', attempts=3, lease_expires_at=timezone.now() - timedelta(seconds=1))
+        with patch('reflections.tasks.normalize_audio.apply_async') as apply_async, \
+                patch('reflections.events.get_redis_connection') as redis, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(sweep_stalled_reflections(), {'retried': 0, 'failed': 1})
+        apply_async.assert_not_called()
+        reflection.refresh_from_db()
+        self.assertEqual((reflection.status, reflection.lease_expires_at), ('failed', None))
+        self.assertEqual(json.loads(redis.return_value.publish.call_args.args[1])['data']['status'], 'failed')
+
+    def test_queue_health(self):
+        self.create()
+        self.create(status='processing', lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.create(status='failed', lease_expires_at=None)
+        self.create(status='done', lease_expires_at=None)
+        self.assertEqual(queue_health(), {'queued': 1, 'processing': 1, 'failed': 1, 'expired': 1})
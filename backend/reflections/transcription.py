@@ -0,0 +1,156 @@
+import hashlib
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from billiard.pool import Pool
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from . import audio
+
+
+class TranscriptionEngine:
+    """
+    Base class for speech-to-text engines.
+
+    Engines only need to implement ``transcribe_window``; decoding, fan-out
+    and stitching are handled by ``transcribe_file``. ``load`` is called once
+    per process before the first window, so model weights should be loaded
+    there rather than in ``__init__``.
+
+    ``executor`` picks how windows run in parallel. With ``'processes'`` (the
+    default) each pool process gets a pickled copy of the engine and loads
+    its own model, which scales with cores even for pure-Python engines.
+    Engines whose ``transcribe_window`` is thread-safe and releases the GIL
+    (as numpy and most inference runtimes do) can set ``'threads'`` to share
+    one loaded model instead. Engines returned by ``get_engine`` and their
+    pools are kept for the lifetime of the worker process.
+    """
+    name = 'base'
+    version = '1'
+    executor = 'processes'
+    _loaded = False
+
+    @property
+    def version_key(self):
+        return f'{self.name}:{self.version}'
+
+    def __getstate__(self):
+        # Pool processes load their own copy of the model; engines that keep
+        # it in an attribute should leave it out here too.
+        state = self.__dict__.copy()
+        state.pop('_loaded', None)
+        return state
+
+    def load(self):
+        pass
+
+    def ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+            self._loaded = True
+
+    def transcribe_window(self, window):
+        raise NotImplementedError
+
+    def join(self, texts):
+        return ' '.join(text for text in texts if text)
+
+
+class StubTranscriptionEngine(TranscriptionEngine):
+    """
+    Deterministic local engine for development and tests: every non-silent
+    window becomes one sentence of words chosen from a digest of its samples.
+    """
+    name = 'stub'
+    version = '1'
+    words_per_window = 8
+    vocabulary = (
+        'today', 'goal', 'progress', 'work', 'family', 'exercise', 'reading',
+        'sleep', 'focus', 'project', 'friend', 'walk', 'plan', 'week', 'habit',
+        'journal', 'morning', 'evening', 'learn', 'rest', 'write', 'health',
+        'music', 'team', 'call', 'cook', 'garden', 'run', 'meeting', 'idea',
+        'budget', 'travel',
+    )
+
+    def transcribe_window(self, window):
+        if not window.frames.strip(b'\x00'):
+            return ''
+        digest = hashlib.sha256(window.frames).digest()
+        words = [self.vocabulary[byte % len(self.vocabulary)] for byte in digest[:self.words_per_window]]
+        return ' '.join(words).capitalize() + '.'
+
+
+_engines = {}
+_pools = {}
+
+
+def get_engine():
+    """Return this process's engine instance, loading the model on first use."""
+    path = settings.TRANSCRIPTION_ENGINE
+    if path not in _engines:
+        engine = import_string(path)()
+        engine.ensure_loaded()
+        _engines[path] = engine
+    return _engines[path]
+
+
+# Pools belong to the process that started them, e.g. not to Celery's
+# prefork children or the pool's own processes.
+os.register_at_fork(after_in_child=_pools.clear)
+
+_worker_engine = None
+
+
+def _init_worker(engine):
+    global _worker_engine
+    engine.ensure_loaded()
+    _worker_engine = engine
+
+
+def _transcribe_window(window):
+    return _worker_engine.transcribe_window(window)
+
+
+def _get_pool(engine, workers):
+    key = (engine.executor, type(engine), engine.version_key, workers)
+    if key not in _pools:
+        if engine.executor == 'threads':
+            _pools[key] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='transcription')
+        else:
+            # billiard, unlike multiprocessing, lets Celery's daemonic
+            # prefork children start processes of their own.
+            _pools[key] = Pool(workers, initializer=_init_worker, initargs=(engine,))
+    return _pools[key]
+
+
+def _submit(pool, engine, window):
+    if isinstance(pool, ThreadPoolExecutor):
+        return pool.submit(engine.transcribe_window, window).result
+    return pool.apply_async(_transcribe_window, (window,)).get
+
+
+def _ordered_results(pool, engine, windows, max_pending):
+    # Keep a bounded number of windows in flight so memory stays flat for
+    # long recordings, while yielding results in their original order.
+    pending = deque()
+    for window in windows:
+        pending.append(_submit(pool, engine, window))
+        if len(pending) >= max_pending:
+            yield pending.popleft()()
+    while pending:
+        yield pending.popleft()()
+
+
+def transcribe_file(fileobj, engine=None, workers=None):
+    engine = engine or get_engine()
+    if workers is None:
+        workers = settings.TRANSCRIPTION_WORKERS
+    windows = audio.iter_windows(fileobj, settings.TRANSCRIPTION_WINDOW_SECONDS)
+    if workers <= 1:
+        engine.ensure_loaded()
+        return engine.join(engine.transcribe_window(window) for window in windows)
+    if engine.executor == 'threads':
+        engine.ensure_loaded()
+    return engine.join(list(_ordered_results(_get_pool(engine, workers), engine, windows, workers * 2)))
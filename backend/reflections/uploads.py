@@ -0,0 +1,129 @@
+import base64
+import hashlib
+import os
+from contextlib import nullcontext
+
+from django.core.files.uploadhandler import FileUploadHandler
+from django_redis import get_redis_connection
+
+CHUNK_SIZE = 64 * 1024
+# Seconds before an abandoned audio lock expires on its own
+AUDIO_LOCK_TIMEOUT = 300
+AUDIO_DIR = 'reflections/audio'
+NORMALIZED_AUDIO_DIR = 'reflections/audio/16k'
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+def parse_checksum_header(value):
+    """Parse a tus-style ``Upload-Checksum: sha256 <base64 digest>`` header."""
+    if not value:
+        return None
+    try:
+        algorithm, encoded = value.split(' ', 1)
+        digest = base64.b64decode(encoded.strip(), validate=True)
+    except ValueError:
+        raise ValueError('Malformed Upload-Checksum header.')
+    if algorithm.lower() != 'sha256' or len(digest) != hashlib.sha256().digest_size:
+        raise ValueError('Only sha256 chunk checksums are supported.')
+    return digest
+
+
+def create_partial(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+
+
+def remove_partial(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def append_chunk(path, stream, offset, length, expected_digest=None):
+    """
+    Copy up to ``length`` bytes from ``stream`` into the partial file at
+    ``offset`` and return the number of bytes written.
+
+    Anything past ``offset`` left over from an interrupted request is
+    discarded first, so a retried chunk always lands in the right place.
+    When a digest is given the chunk is rolled back unless it arrived
+    complete and matches.
+    """
+    digest = hashlib.sha256()
+    written = 0
+    with open(path, 'r+b') as fh:
+        fh.seek(offset)
+        fh.truncate()
+        while written < length:
+            block = stream.read(min(CHUNK_SIZE, length - written))
+            if not block:
+                break
+            fh.write(block)
+            digest.update(block)
+            written += len(block)
+        if expected_digest is not None and (written != length or digest.digest() != expected_digest):
+            fh.seek(offset)
+            fh.truncate()
+            raise ChecksumMismatch()
+    return written
+
+
+def file_sha256(fileobj):
+    digest = hashlib.sha256()
+    for block in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+class Sha256UploadHandler(FileUploadHandler):
+    """
+    Hash multipart uploads as they stream in, before the next handler spools
+    them. Digests are left on ``request.upload_sha256`` keyed by field name.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        if request is not None:
+            request.upload_sha256 = {}
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        self.request.upload_sha256[self.field_name] = self.digest.hexdigest()
+        return None
+
+
+def content_addressed_name(sha256, filename, directory=AUDIO_DIR):
+    extension = os.path.splitext(filename or '')[1].lower()[:10]
+    return f'{directory}/{sha256[:2]}/{sha256}{extension}'
+
+
+def store_audio(storage, fileobj, filename, sha256):
+    """Save audio under its content hash, reusing the stored copy of identical bytes."""
+    name = content_addressed_name(sha256, filename)
+    if storage.exists(name):
+        return name
+    return storage.save(name, fileobj)
+
+
+def audio_lock(sha256):
+    """
+    Serialize reusing and deleting the stored upload with this digest across
+    processes: reuse holds the lock until its row commits, deletion while it
+    checks for references and deletes. A no-op without a Redis cache.
+    """
+    try:
+        redis = get_redis_connection('default')
+    except NotImplementedError:
+        return nullcontext()
+    return redis.lock(f'reflections:audio-lock:{sha256}', timeout=AUDIO_LOCK_TIMEOUT)
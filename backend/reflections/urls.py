@@ -3,8 +3,10 @@ from rest_framework.routers import DefaultRouter
 from . import views
 
 router = DefaultRouter()
+router.register(r'uploads', views.AudioUploadViewSet, basename='reflection-upload')
 router.register(r'', views.ReflectionViewSet, basename='reflection')
 
 urlpatterns = [
+    path('events/', views.reflection_events, name='reflection-events'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
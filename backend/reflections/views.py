@@ -1,21 +1,82 @@
-from rest_framework import viewsets, permissions, status
+import time
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Count
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from rest_framework import viewsets, permissions, status, mixins
+from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
-from .models import Reflection
-from .serializers import ReflectionSerializer
-from .tasks import transcribe_audio
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from core.cache import CachedListMixin
+from core.pagination import CreatedAtKeysetPagination
+from users.authentication import CachedJWTAuthentication
+from . import uploads
+from .events import stream_events
+from .models import Reflection, AudioUpload, ReflectionKeyword, ReflectionPeaks, normalize_keyword, queue_deadline
+from .search import search_reflections
+from .serializers import ReflectionSerializer, AudioUploadSerializer
+from .similarity import related_ids
+from .streaming import audio_response, read_audio_token
+from .tasks import enqueue_audio_processing
 
 
-class ReflectionViewSet(viewsets.ModelViewSet):
+class ReflectionViewSet(CachedListMixin, viewsets.ModelViewSet):
+    cache_resource = 'reflections'
+    pagination_class = CreatedAtKeysetPagination
     serializer_class = ReflectionSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def cache_epoch(self):
+        # Signed audio URLs expire; never serve one past half its lifetime.
+        return int(time.time() // max(settings.AUDIO_URL_MAX_AGE // 2, 1))
+
     def get_queryset(self):
-        return Reflection.objects.filter(user=self.request.user)
+        queryset = Reflection.objects.filter(user=self.request.user)
+        keyword = self.request.query_params.get('keyword')
+        if keyword and self.action == 'list':
+            queryset = queryset.filter(keyword_index__keyword=normalize_keyword(keyword))
+        return queryset
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in ('POST', 'PUT', 'PATCH'):
+            request.upload_handlers.insert(0, uploads.Sha256UploadHandler(request._request))
+
+    def save_with_audio(self, serializer, **kwargs):
+        audio_file = serializer.validated_data.get('audio_file')
+        if not audio_file:
+            return serializer.save(**kwargs)
+        sha256 = getattr(self.request, 'upload_sha256', {}).get('audio_file')
+        if sha256 is None:
+            sha256 = uploads.file_sha256(audio_file)
+            audio_file.seek(0)
+        storage = Reflection._meta.get_field('audio_file').storage
+        # Keep normalization from deleting a reused file before this row commits.
+        with uploads.audio_lock(sha256), transaction.atomic():
+            serializer.validated_data['audio_file'] = uploads.store_audio(storage, audio_file, audio_file.name, sha256)
+            serializer.validated_data['audio_sha256'] = sha256
+            instance = serializer.instance
+            if instance is not None and instance.audio_sha256 != sha256:
+                # New audio on an existing reflection: process it from scratch.
+                kwargs.update(status='queued', attempts=0, lease_expires_at=queue_deadline(), normalized_audio=None)
+                ReflectionPeaks.objects.filter(reflection=instance).delete()
+                transaction.on_commit(partial(enqueue_audio_processing, instance.pk))
+            return serializer.save(**kwargs)
 
     def perform_create(self, serializer):
-        reflection = serializer.save(user=self.request.user)
+        # Without audio there is nothing to process.
+        extra = {} if serializer.validated_data.get('audio_file') else {'status': 'done', 'lease_expires_at': None}
+        reflection = self.save_with_audio(serializer, user=self.request.user, **extra)
         if reflection.audio_file:
-            transcribe_audio.delay(reflection.id)
+            enqueue_audio_processing(reflection.id)
+
+    def perform_update(self, serializer):
+        self.save_with_audio(serializer)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -30,3 +91,279 @@ class ReflectionViewSet(viewsets.ModelViewSet):
             status=status.HTTP_201_CREATED,
             headers=headers
         )
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'detail': 'A search query is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 20)), 50))
+        except ValueError:
+            limit = 20
+        results = search_reflections(request.user, query, limit=limit)
+        data = self.get_serializer(results, many=True).data
+        for item, reflection in zip(data, results):
+            item['rank'] = reflection.rank
+        return Response({'results': data})
+
+    @action(detail=False, methods=['get'])
+    def keywords(self, request):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 50)), 200))
+        except ValueError:
+            limit = 50
+        facets = (
+            ReflectionKeyword.objects.filter(user=request.user)
+            .values('keyword')
+            .annotate(count=Count('id'))
+            .order_by('-count', 'keyword')[:limit]
+        )
+        return Response({'results': list(facets)})
+
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        """The user's reflections most similar to this one, best match first."""
+        reflection = self.get_object()
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 5)), 50))
+        except ValueError:
+            limit = 5
+        matches = related_ids(reflection, limit=limit)
+        reflections = Reflection.objects.filter(user=request.user).in_bulk([pk for pk, _ in matches])
+        results = []
+        for pk, score in matches:
+            if pk in reflections:
+                item = self.get_serializer(reflections[pk]).data
+                item['similarity'] = score
+                results.append(item)
+        return Response({'results': results})
+
+    @action(detail=True, methods=['get'], permission_classes=[permissions.AllowAny])
+    def audio(self, request, pk=None):
+        """
+        Stream the reflection's audio with Range support. Besides the usual
+        authentication, accepts the signed ``?token=`` from ``audio_url`` so
+        media elements can load it directly.
+        """
+        token = request.query_params.get('token')
+        user_id = read_audio_token(token, pk) if token else None
+        if user_id is None and not request.user.is_authenticated:
+            self.permission_denied(request)
+        if user_id is None:
+            user_id = request.user.pk
+        reflection = get_object_or_404(Reflection.objects.filter(user_id=user_id), pk=pk)
+        source = reflection.audio_file if request.query_params.get('source') == 'original' else reflection.current_audio
+        if not source:
+            return Response({'detail': 'This reflection has no audio.'}, status=status.HTTP_404_NOT_FOUND)
+        return audio_response(request, source)
+
+    @action(detail=True, methods=['get'])
+    def peaks(self, request, pk=None):
+        """
+        Waveform peaks as int8 ``min, max`` pairs. Picks the finest zoom level
+        with at most ``?width=`` pairs (default 2000), or the exact level asked
+        for with ``?samples_per_peak=``.
+        """
+        reflection = self.get_object()
+        try:
+            peaks = reflection.peaks
+        except ReflectionPeaks.DoesNotExist:
+            return Response({'detail': 'Waveform peaks are not available yet.'}, status=status.HTTP_404_NOT_FOUND)
+        available = [level['samples_per_peak'] for level in peaks.levels]
+        try:
+            requested = int(request.query_params.get('samples_per_peak', 0))
+            width = max(1, int(request.query_params.get('width', 2000)))
+        except ValueError:
+            requested, width = 0, 2000
+        if requested:
+            if requested not in available:
+                return Response(
+                    {'detail': f'samples_per_peak must be one of: {", ".join(map(str, available))}.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            samples_per_peak = requested
+        else:
+            fitting = [level['samples_per_peak'] for level in peaks.levels if level['length'] // 2 <= width]
+            samples_per_peak = min(fitting) if fitting else max(available)
+        response = HttpResponse(peaks.level(samples_per_peak), content_type='application/octet-stream')
+        response['X-Peaks-Sample-Rate'] = str(peaks.sample_rate)
+        response['X-Peaks-Samples-Per-Peak'] = str(samples_per_peak)
+        response['X-Peaks-Levels'] = ','.join(map(str, available))
+        response['Cache-Control'] = 'private, max-age=3600'
+        return response
+
+    def perform_content_negotiation(self, request, force=False):
+        # Media elements ask for audio/* types no renderer offers; the binary
+        # actions answer with plain HttpResponses anyway.
+        return super().perform_content_negotiation(request, force=force or self.action in ('audio', 'peaks'))
+
+
+class AudioUploadViewSet(mixins.CreateModelMixin,
+                         mixins.RetrieveModelMixin,
+                         mixins.DestroyModelMixin,
+                         viewsets.GenericViewSet):
+    """
+    Resumable upload of a reflection's audio.
+
+    POST creates an upload with the total ``size`` and the SHA-256
+    ``checksum`` of the recording. Each PATCH appends the raw request body
+    (``application/offset+octet-stream``) at the ``Upload-Offset`` header;
+    GET/HEAD report the offset to resume from. POST to ``complete/`` once all
+    bytes are in to create the reflection and queue its transcription.
+    """
+    serializer_class = AudioUploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    chunk_content_type = 'application/offset+octet-stream'
+
+    def get_queryset(self):
+        return AudioUpload.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        upload = serializer.save(user=self.request.user)
+        uploads.create_partial(upload.partial_path)
+
+    def perform_destroy(self, instance):
+        uploads.remove_partial(instance.partial_path)
+        instance.delete()
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        response['Upload-Offset'] = str(response.data['offset'])
+        return response
+
+    def partial_update(self, request, *args, **kwargs):
+        if request.content_type.split(';')[0].strip() != self.chunk_content_type:
+            return Response(
+                {'detail': f'Chunks must be sent as {self.chunk_content_type}.'},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        try:
+            offset = int(request.headers['Upload-Offset'])
+        except (KeyError, ValueError):
+            return Response(
+                {'detail': 'A numeric Upload-Offset header is required.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            expected_digest = uploads.parse_checksum_header(request.headers.get('Upload-Checksum'))
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+
+        with transaction.atomic():
+            upload = get_object_or_404(self.get_queryset().select_for_update(), pk=self.kwargs['pk'])
+            if upload.status != 'pending':
+                return Response(
+                    {'detail': 'Upload is already complete.', 'offset': upload.offset},
+                    status=status.HTTP_409_CONFLICT
+                )
+            if offset != upload.offset:
+                return Response(
+                    {'detail': 'Upload-Offset does not match the current offset.', 'offset': upload.offset},
+                    status=status.HTTP_409_CONFLICT
+                )
+            if offset + length > upload.size:
+                return Response(
+                    {'detail': 'Chunk extends past the declared upload size.', 'offset': upload.offset},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            try:
+                written = uploads.append_chunk(
+                    upload.partial_path, request.stream, offset, length, expected_digest
+                )
+            except uploads.ChecksumMismatch:
+                return Response(
+                    {'detail': 'Chunk checksum mismatch.', 'offset': upload.offset},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            upload.offset = offset + written
+            upload.save(update_fields=['offset', 'updated_at'])
+        response = Response(self.get_serializer(upload).data)
+        response['Upload-Offset'] = str(upload.offset)
+        return response
+
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        # The checksum never changes; read it first to take the audio lock,
+        # which is held until the new reflection commits.
+        checksum = get_object_or_404(self.get_queryset(), pk=self.kwargs['pk']).checksum
+        with uploads.audio_lock(checksum), transaction.atomic():
+            upload = get_object_or_404(self.get_queryset().select_for_update(), pk=self.kwargs['pk'])
+            if upload.status == 'complete':
+                return Response(ReflectionSerializer(upload.reflection, context=self.get_serializer_context()).data)
+            if upload.offset != upload.size:
+                return Response(
+                    {'detail': 'Upload is incomplete.', 'offset': upload.offset},
+                    status=status.HTTP_409_CONFLICT
+                )
+            with open(upload.partial_path, 'rb') as fh:
+                if uploads.file_sha256(fh) != upload.checksum:
+                    # Some chunk was corrupted; start over so the client can resend.
+                    uploads.create_partial(upload.partial_path)
+                    upload.offset = 0
+                    upload.save(update_fields=['offset', 'updated_at'])
+                    return Response(
+                        {'detail': 'Upload checksum mismatch.', 'offset': upload.offset},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                fh.seek(0)
+                storage = Reflection._meta.get_field('audio_file').storage
+                reflection = Reflection.objects.create(
+                    user=request.user,
+                    audio_file=uploads.store_audio(storage, File(fh), upload.filename, upload.checksum),
+                    audio_sha256=upload.checksum
+                )
+            upload.status = 'complete'
+            upload.reflection = reflection
+            upload.save(update_fields=['status', 'reflection', 'updated_at'])
+            transaction.on_commit(lambda: enqueue_audio_processing(reflection.id))
+        uploads.remove_partial(upload.partial_path)
+        data = ReflectionSerializer(reflection, context=self.get_serializer_context()).data
+        return Response(
+            {
+                **data,
+                'message': 'Reflection created. Audio transcription is being processed.'
+            },
+            status=status.HTTP_201_CREATED
+        )
+
+
+def event_stream_user_id(request):
+    """
+    The user id for an event stream request. EventSource cannot set headers,
+    so the access token may also be passed as ``?access_token=``.
+    """
+    authentication = CachedJWTAuthentication()
+    raw_token = request.GET.get('access_token')
+    if not raw_token:
+        header = authentication.get_header(request)
+        raw_token = authentication.get_raw_token(header) if header else None
+    if not raw_token:
+        return None
+    try:
+        user = authentication.get_user(authentication.get_validated_token(raw_token))
+    except (AuthenticationFailed, InvalidToken):
+        return None
+    return user.pk if user.is_active else None
+
+
+async def reflection_events(request):
+    """
+    Server-sent events announcing finished transcriptions, in place of
+    polling each reflection. Pass ``?reflection=<id>,<id>`` to also receive
+    events for reflections that finished before the stream connected.
+    Needs an ASGI server to hold many streams open.
+    """
+    user_id = await sync_to_async(event_stream_user_id)(request)
+    if user_id is None:
+        return JsonResponse(
+            {'detail': 'Authentication credentials were not provided or are invalid.'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+    pending_ids = [int(value) for value in request.GET.get('reflection', '').split(',') if value.isdigit()]
+    response = StreamingHttpResponse(stream_events(user_id, pending_ids), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,98 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from core.metrics import record_cache_lookup
+
+
+def _user_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+class UserCache:
+    """
+    Users resolved from access tokens, in a small per-process LRU in front of
+    the shared cache. Entries are dropped when the user is saved or deleted
+    (see ``users.signals``); other processes notice within
+    ``AUTH_USER_LOCAL_TTL`` seconds.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(user_id)
+                user = entry[1]
+            else:
+                user = None
+        if user is None:
+            user = cache.get(_user_key(user_id))
+            record_cache_lookup(user is not None)
+            if user is None:
+                return None
+            self.remember(user)
+        else:
+            record_cache_lookup(True)
+        # Requests may change their user; keep those edits out of the cache.
+        return copy.copy(user)
+
+    def remember(self, user):
+        with self.lock:
+            self.entries[user.pk] = (time.monotonic() + settings.AUTH_USER_LOCAL_TTL, user)
+            self.entries.move_to_end(user.pk)
+            while len(self.entries) > settings.AUTH_USER_LOCAL_SIZE:
+                self.entries.popitem(last=False)
+
+    def set(self, user):
+        cache.set(_user_key(user.pk), user, settings.AUTH_USER_CACHE_TIMEOUT)
+        self.remember(user)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+        cache.delete(_user_key(user_id))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` that reads the user from ``user_cache`` instead of the database."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        user = user_cache.get(user_id)
+        if user is None:
+            # Raises for unknown and inactive users, which are not cached.
+            user = super().get_user(validated_token)
+            user_cache.set(user)
+            return user
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
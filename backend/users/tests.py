@@ -1,7 +1,13 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from unittest.mock import patch
+from .authentication import user_cache
 import json
 
 User = get_user_model()
@@ -88,3 +94,59 @@ class UserAPITests(TestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(User.objects.filter(email=payload['email']).count(), 1)
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(email='test@example.com', password='testpass123')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.url = reverse('goal-list')
+
+    def user_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        return response, [query['sql'] for query in queries if 'users_user' in query['sql']]
+
+    def test_user_is_loaded_once(self):
+        response, queries = self.user_queries()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+        response, queries = self.user_queries()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(queries, [])
+
+    def test_deactivation_takes_effect(self):
+        self.user_queries()
+        self.user.is_active = False
+        self.user.save()
+        response, _ = self.user_queries()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_user_is_rejected(self):
+        self.user_queries()
+        self.user.delete()
+        response, _ = self.user_queries()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_local_entries_expire(self):
+        self.user_queries()
+        with patch('users.authentication.time.monotonic', return_value=10 ** 9):
+            _, queries = self.user_queries()
+        self.assertEqual(len(queries), 1)
+
+    @override_settings(AUTH_USER_LOCAL_SIZE=1)
+    def test_local_cache_is_bounded(self):
+        other = User.objects.create_user(email='other@example.com', password='testpass123')
+        self.user_queries()
+        APIClient().get(self.url, HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(other)}')
+        self.assertEqual(list(user_cache.entries), [other.pk])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_shared_cache_serves_other_processes(self):
+        self.user_queries()
+        user_cache.clear()
+        response, queries = self.user_queries()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(queries, [])
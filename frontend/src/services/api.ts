@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { LoginCredentials, RegisterCredentials, Goal, Reflection } from '../types';
+import { LoginCredentials, RegisterCredentials, Goal, Reflection, Paginated } from '../types';
 
 const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000/api';
 
@@ -28,7 +28,8 @@ export const authAPI = {
 };
 
 export const goalsAPI = {
-  getAll: () => api.get<Goal[]>('/goals/'),
+  getAll: (cursor?: string) =>
+    api.get<Paginated<Goal>>('/goals/', { params: { cursor } }),
   getById: (id: number) => api.get<Goal>(`/goals/${id}/`),
   create: (goal: Partial<Goal>) => api.post<Goal>('/goals/', goal),
   update: (id: number, goal: Partial<Goal>) =>
@@ -37,7 +38,8 @@ export const goalsAPI = {
 };
 
 export const reflectionsAPI = {
-  getAll: () => api.get<Reflection[]>('/reflections/'),
+  getAll: (cursor?: string) =>
+    api.get<Paginated<Reflection>>('/reflections/', { params: { cursor } }),
   getById: (id: number) => api.get<Reflection>(`/reflections/${id}/`),
   create: (formData: FormData) =>
     api.post<Reflection>('/reflections/', formData, {
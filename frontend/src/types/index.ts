@@ -11,20 +11,29 @@ export interface Goal {
   target_date?: string;
   category?: string;
   recurring: boolean;
+  recurrence: 'daily' | 'weekly' | 'monthly';
+  previous?: number | null;
   created_at: string;
   updated_at: string;
 }
 
 export interface Reflection {
   id: number;
-  audio_file?: string;
+  audio_url?: string | null;
   transcription: string;
   ai_summary: string;
   keywords: string[];
+  status: 'queued' | 'processing' | 'done' | 'failed';
+  attempts: number;
   created_at: string;
   updated_at: string;
 }
 
+export interface Paginated<T> {
+  next: string | null;
+  results: T[];
+}
+
 export interface AuthState {
   user: User | null;
   token: string | null;